@@ -0,0 +1,124 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+
+class _PendingRequest:
+    def __init__(self, waveforms):
+        self.waveforms = waveforms
+        self.future = Future()
+
+
+class BatchScheduler:
+    def __init__(self, infer_fn, max_batch_size=16, max_wait_ms=10.0):
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be at least 1")
+
+        self.infer_fn = infer_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+
+        self._queue = queue.Queue()
+        self._worker = None
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+
+        self.batches_run = 0
+        self.rows_run = 0
+
+    def start(self):
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._stopped.clear()
+                self._worker = threading.Thread(target=self._run, name="batch-scheduler", daemon=True)
+                self._worker.start()
+
+    def stop(self, timeout=None):
+        self._stopped.set()
+        self._queue.put(None)
+        if self._worker is not None:
+            self._worker.join(timeout)
+
+    def submit(self, waveforms):
+        # waveforms: (n, samples) rows that belong to a single caller
+        waveforms = np.asarray(waveforms, dtype=np.float32)
+        if waveforms.ndim == 1:
+            waveforms = waveforms[np.newaxis, :]
+
+        if self._stopped.is_set():
+            raise RuntimeError("Batch scheduler has been stopped")
+
+        self.start()
+        request = _PendingRequest(waveforms)
+        self._queue.put(request)
+        return request.future
+
+    def infer(self, waveforms, timeout=None):
+        return self.submit(waveforms).result(timeout)
+
+    def _collect_batch(self):
+        first = self._queue.get()
+        if first is None:
+            return None
+
+        batch = [first]
+        rows = len(first.waveforms)
+        deadline = time.monotonic() + self.max_wait
+
+        while rows < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                request = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if request is None:
+                # Put the sentinel back so the loop exits after this batch
+                self._queue.put(None)
+                break
+            batch.append(request)
+            rows += len(request.waveforms)
+
+        return batch
+
+    def _run(self):
+        while not self._stopped.is_set():
+            batch = self._collect_batch()
+            if batch is None:
+                break
+            self._run_batch(batch)
+
+        # Fail whatever is still waiting so callers don't hang forever
+        while True:
+            try:
+                request = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if request is not None:
+                request.future.set_exception(RuntimeError("Batch scheduler has been stopped"))
+
+    def _run_batch(self, batch):
+        try:
+            if len(batch) == 1:
+                stacked = batch[0].waveforms
+            else:
+                stacked = np.concatenate([request.waveforms for request in batch], axis=0)
+
+            outputs = self.infer_fn(stacked)
+        except Exception as e:
+            for request in batch:
+                request.future.set_exception(e)
+            return
+
+        self.batches_run += 1
+        self.rows_run += len(stacked)
+
+        start = 0
+        for request in batch:
+            end = start + len(request.waveforms)
+            request.future.set_result({name: values[start:end] for name, values in outputs.items()})
+            start = end
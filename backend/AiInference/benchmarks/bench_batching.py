@@ -0,0 +1,84 @@
+"""Throughput of the batch scheduler at 1/4/16/64 concurrent clients.
+
+Run from backend/AiInference so the model and label paths resolve:
+
+    python benchmarks/bench_batching.py                # real Perch model
+    python benchmarks/bench_batching.py --stub         # synthetic model, no TensorFlow
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from batching import BatchScheduler
+
+WINDOW_SAMPLES = 5 * 32000
+
+
+def make_stub_model(call_overhead_ms, per_row_ms):
+    # Fixed cost per call plus a smaller cost per row, like a CPU forward pass
+    def infer(waveform_batch):
+        time.sleep((call_overhead_ms + per_row_ms * len(waveform_batch)) / 1000.0)
+        return {"label": np.zeros((len(waveform_batch), 10932), dtype=np.float32)}
+    return infer
+
+
+def run_clients(scheduler, clients, duration):
+    waveform = np.random.default_rng(0).standard_normal(WINDOW_SAMPLES).astype(np.float32)
+    done = [0] * clients
+    deadline = time.monotonic() + duration
+
+    def client(index):
+        while time.monotonic() < deadline:
+            scheduler.infer(waveform)
+            done[index] += 1
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    start = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - start
+    return sum(done) / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 4, 16, 64])
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per measurement")
+    parser.add_argument("--max-batch-size", type=int, default=16)
+    parser.add_argument("--max-wait-ms", type=float, default=10.0)
+    parser.add_argument("--stub", action="store_true", help="use a synthetic model instead of Perch")
+    parser.add_argument("--stub-call-ms", type=float, default=40.0)
+    parser.add_argument("--stub-row-ms", type=float, default=5.0)
+    args = parser.parse_args()
+
+    if args.stub:
+        infer_fn = make_stub_model(args.stub_call_ms, args.stub_row_ms)
+    else:
+        from identifier import run_model, startup
+        startup()
+        infer_fn = run_model
+
+    print(f"{'clients':>8} {'unbatched req/s':>16} {'batched req/s':>14} {'speedup':>8} {'avg batch':>10}")
+    for clients in args.clients:
+        unbatched = BatchScheduler(infer_fn, max_batch_size=1, max_wait_ms=0)
+        baseline = run_clients(unbatched, clients, args.duration)
+        unbatched.stop()
+
+        batched = BatchScheduler(infer_fn, max_batch_size=args.max_batch_size, max_wait_ms=args.max_wait_ms)
+        throughput = run_clients(batched, clients, args.duration)
+        avg_batch = batched.rows_run / max(batched.batches_run, 1)
+        batched.stop()
+
+        print(f"{clients:>8} {baseline:>16.1f} {throughput:>14.1f} {throughput / baseline:>7.2f}x {avg_batch:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""Model compute saved by energy/flatness gating of sliding windows.
+
+Run from backend/AiInference so the model and label paths resolve:
+
+    python benchmarks/bench_gating.py recordings/*.mp3               # real Perch model
+    MODEL_BACKEND=stub python benchmarks/bench_gating.py recordings/*.wav
+    MODEL_BACKEND=stub python benchmarks/bench_gating.py --synthetic 120   # 2 minutes, birds in a third of it
+
+For every recording the windows go through the model twice, all of them and only the gated ones, and
+the top-1 species of both runs is compared.
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import identifier
+from gating import GATE_MAX_FLATNESS, GATE_MIN_ACTIVE_FRAMES, GATE_MIN_DB
+
+
+def synthetic_recording(seconds, seed=0):
+    # Wind-like low rumble and hiss throughout, with frequency-swept chirps in a third of the 5 s blocks
+    rng = np.random.default_rng(seed)
+    rate = identifier.SAMPLE_RATE
+    samples = int(seconds * rate)
+    rumble = np.cumsum(rng.standard_normal(samples)).astype(np.float32)
+    rumble = 0.02 * rumble / np.abs(rumble).max()
+    waveform = rumble + 0.0005 * rng.standard_normal(samples).astype(np.float32)
+
+    t = np.arange(int(0.3 * rate)) / rate
+    for block in range(0, samples // (5 * rate)):
+        if block % 3:
+            continue
+        for offset in rng.uniform(0, 4.5, 4):
+            start = block * 5 * rate + int(offset * rate)
+            chirp = 0.2 * np.sin(2 * np.pi * (3000 * t + 4000 * t ** 2)) * np.hanning(len(t))
+            waveform[start:start + len(t)] += chirp[:samples - start]
+    return waveform
+
+
+def time_model(windows, repeats):
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        outputs = [identifier.run_model(windows[i:i + identifier.MAX_WINDOWS_PER_CALL])
+                   for i in range(0, len(windows), identifier.MAX_WINDOWS_PER_CALL)]
+        best = min(best, time.perf_counter() - start)
+    labels = np.concatenate([output["label"] for output in outputs], axis=0)
+    return best * 1000, int(labels.max(axis=0).argmax())
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("recordings", nargs="*")
+    parser.add_argument("--synthetic", type=float, help="seconds of generated audio instead of files")
+    parser.add_argument("--hop-seconds", type=float, default=identifier.WINDOW_HOP_SECONDS)
+    parser.add_argument("--min-db", type=float, default=GATE_MIN_DB)
+    parser.add_argument("--max-flatness", type=float, default=GATE_MAX_FLATNESS)
+    parser.add_argument("--min-active-frames", type=int, default=GATE_MIN_ACTIVE_FRAMES)
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+    if not args.recordings and not args.synthetic:
+        parser.error("give recordings or --synthetic SECONDS")
+
+    identifier.startup(warm=True)
+    gate = {"min_db": args.min_db, "max_flatness": args.max_flatness, "min_active_frames": args.min_active_frames}
+    hop_samples = int(args.hop_seconds * identifier.SAMPLE_RATE)
+
+    recordings = [(path, lambda path=path: identifier.decode_audio(open(path, "rb").read()))
+                  for path in args.recordings]
+    if args.synthetic:
+        recordings.append((f"synthetic {args.synthetic:g}s", lambda: synthetic_recording(args.synthetic)))
+
+    print(f"{'recording':<32} {'windows':>8} {'kept':>6} {'gate ms':>8} {'all ms':>9} {'gated ms':>9} "
+          f"{'saved':>6} {'same top-1':>10}")
+    totals = np.zeros(3)
+    for name, load in recordings:
+        waveform = load()
+        windows = identifier.frame_waveform(waveform, hop_samples)
+        indices, report = identifier.gate_windows(waveform, windows, hop_samples, gate)
+
+        all_ms, all_top = time_model(windows, args.repeats)
+        gated_ms, gated_top = time_model(np.ascontiguousarray(windows[indices]), args.repeats)
+        totals += (all_ms, gated_ms + report["ms"], 1)
+
+        saved = 1 - (gated_ms + report["ms"]) / all_ms
+        print(f"{os.path.basename(name)[:32]:<32} {len(windows):>8} {len(indices):>6} {report['ms']:>8.1f} "
+              f"{all_ms:>9.1f} {gated_ms:>9.1f} {saved:>6.0%} {str(all_top == gated_top):>10}")
+
+    print(f"\nTotal: {totals[0]:.0f} ms without gating, {totals[1]:.0f} ms with it "
+          f"({1 - totals[1] / totals[0]:.0%} saved over {int(totals[2])} recordings)")
+
+
+if __name__ == "__main__":
+    main()
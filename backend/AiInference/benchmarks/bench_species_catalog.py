@@ -0,0 +1,88 @@
+"""Load time, memory and lookup cost of the species catalog over every code in label.csv.
+
+Run from backend/AiInference. Uses bird_data.json if present, otherwise a synthetic
+catalog with one realistic-sized entry per label:
+
+    python benchmarks/bench_species_catalog.py
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from web_scraping.species_catalog import SpeciesCatalog
+
+
+def synthetic_catalog(codes):
+    rng = random.Random(0)
+    words = ["small", "brown", "bird", "with", "streaked", "breast", "pale", "wing", "bars", "and", "short", "bill"]
+    return {
+        code: {
+            "common_name": f"Common {code.title()}",
+            "scientific_name": f"Genus {code}",
+            "identification_text": " ".join(rng.choice(words) for _ in range(60)),
+            "image_url": f"https://cdn.download.ams.birds.cornell.edu/api/v1/asset/{rng.randrange(10 ** 9)}/1200",
+        }
+        for code in codes
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--catalog", default="bird_data.json")
+    parser.add_argument("--labels", default="label.csv")
+    parser.add_argument("--lookups", type=int, default=10000)
+    parser.add_argument("--legacy-lookups", type=int, default=50)
+    args = parser.parse_args()
+
+    with open(args.labels) as f:
+        codes = [line.strip() for line in f if line.strip()]
+
+    path = args.catalog
+    if not os.path.exists(path):
+        path = os.path.join(tempfile.mkdtemp(), "bird_data.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(synthetic_catalog(codes), f)
+        print(f"No {args.catalog}, using a synthetic catalog for {len(codes)} labels")
+    print(f"Catalog file: {os.path.getsize(path) / 1024 / 1024:.1f} MB")
+
+    def no_scrape(code):
+        return "Error, Status Code: 404)"
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    catalog = SpeciesCatalog(path=path, scrape=no_scrape).load()
+    load_ms = (time.perf_counter() - start) * 1000
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"Load: {load_ms:.1f} ms, {len(catalog.species)} entries, "
+          f"{current / 1024 / 1024:.1f} MB resident, {peak / 1024 / 1024:.1f} MB peak while parsing")
+
+    rng = random.Random(1)
+    sample = [rng.choice(codes) for _ in range(args.lookups)]
+    start = time.perf_counter()
+    for code in sample:
+        catalog.get(code)
+    lookup_us = (time.perf_counter() - start) / len(sample) * 1e6
+    print(f"Catalog lookup: {lookup_us:.2f} µs per request")
+
+    # What every classification used to do: parse the whole file again
+    start = time.perf_counter()
+    for code in sample[:args.legacy_lookups]:
+        with open(path, "r", encoding="utf-8") as f:
+            json.load(f).get(code)
+    legacy_ms = (time.perf_counter() - start) / args.legacy_lookups * 1000
+    print(f"Per-request json.load lookup: {legacy_ms:.2f} ms per request "
+          f"({legacy_ms * 1000 / lookup_us:.0f}x slower)")
+
+    print(json.dumps(catalog.stats(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""Cold start of the AI service: time to listen, time to ready, and first vs. steady-state request latency.
+
+Starts socket_server.py once without warm-up (the old behaviour) and once with it. Run from
+backend/AiInference:
+
+    python benchmarks/bench_startup.py                 # real Perch model
+    python benchmarks/bench_startup.py --stub          # stub model, no TensorFlow
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from protocol import ERROR, REQUEST, encode_frame, recv_frame
+
+AI_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def request(sock, request_id, metadata, payload=b""):
+    sock.sendall(b"".join(bytes(part) for part in encode_frame(REQUEST, request_id, metadata, payload)))
+    message_type, _, metadata, payload = recv_frame(sock)
+    return message_type, metadata, payload
+
+
+def measure(args, warm_up):
+    port = free_port()
+    env = dict(os.environ, PORT=str(port), WARMUP="1" if warm_up else "0", SPECIES_LIVE_SCRAPE="0")
+    if args.stub:
+        env["MODEL_BACKEND"] = "stub"
+
+    started = time.monotonic()
+    process = subprocess.Popen([sys.executable, "socket_server.py"], cwd=AI_DIR, env=env,
+                               stdout=subprocess.DEVNULL)
+    try:
+        while True:
+            if process.poll() is not None:
+                raise RuntimeError(f"AI server exited with code {process.returncode}")
+            try:
+                sock = socket.create_connection(("127.0.0.1", port), timeout=args.timeout)
+                break
+            except OSError:
+                time.sleep(0.05)
+        listening = time.monotonic() - started
+
+        with sock:
+            request_id = 0
+            while True:
+                request_id += 1
+                _, _, payload = request(sock, request_id, {"op": "ready"})
+                status = json.loads(payload)
+                if status["ready"]:
+                    break
+                time.sleep(0.05)
+            ready = time.monotonic() - started
+
+            waveform = np.random.default_rng(0).uniform(-0.5, 0.5, int(args.seconds * 32000)).astype("<f4")
+            metadata = {"op": "classify", "content_type": "audio/pcm", "dtype": "<f4", "sample_rate": 32000}
+            latencies = []
+            for _ in range(args.requests):
+                request_id += 1
+                start = time.perf_counter()
+                message_type, reply, _ = request(sock, request_id, metadata, waveform)
+                latencies.append((time.perf_counter() - start) * 1000)
+                if message_type == ERROR:
+                    raise RuntimeError(reply.get("error"))
+    finally:
+        process.terminate()
+        process.wait()
+
+    return {
+        "listening_s": listening,
+        "ready_s": ready,
+        "first_ms": latencies[0],
+        "steady_ms": statistics.median(latencies[1:]) if len(latencies) > 1 else latencies[0],
+        "startup": status["startup"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--stub", action="store_true", help="use the stub model instead of Perch")
+    parser.add_argument("--seconds", type=float, default=5.0, help="clip length of the timed requests")
+    parser.add_argument("--requests", type=int, default=10)
+    parser.add_argument("--timeout", type=float, default=120.0)
+    args = parser.parse_args()
+
+    print(f"{'warm-up':>8} {'listen s':>9} {'ready s':>8} {'first ms':>9} {'steady ms':>10}")
+    for warm_up in (False, True):
+        result = measure(args, warm_up)
+        print(f"{'on' if warm_up else 'off':>8} {result['listening_s']:>9.2f} {result['ready_s']:>8.2f} "
+              f"{result['first_ms']:>9.1f} {result['steady_ms']:>10.1f}")
+        print(f"         startup breakdown: {result['startup']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+import os
+
+import numpy as np
+from scipy import fft
+
+# Windows with no bird-like sound are dropped before the forward pass
+GATE_WINDOWS = os.getenv("GATE_WINDOWS", "1") == "1"
+# Band-limited level a frame needs to count as active, in dB relative to full scale
+GATE_MIN_DB = float(os.getenv("GATE_MIN_DB", "-60"))
+# Spectral flatness above this is noise-like (white noise sits near 0.56, a whistle near 0)
+GATE_MAX_FLATNESS = float(os.getenv("GATE_MAX_FLATNESS", "0.45"))
+# Where most bird vocalisations live; wind and handling rumble sit below it
+GATE_BAND_HZ = tuple(float(edge) for edge in os.getenv("GATE_BAND_HZ", "1000,10000").split(","))
+# Active frames a window needs to be sent to the model (a frame is 32 ms at 32 kHz)
+GATE_MIN_ACTIVE_FRAMES = int(os.getenv("GATE_MIN_ACTIVE_FRAMES", "3"))
+
+FRAME_SAMPLES = 1024
+# Frames transformed per FFT call, bounds the spectrum buffer on long recordings
+FRAMES_PER_BLOCK = 2048
+
+
+def gate_settings(options):
+    # Per-request overrides from the frame metadata; None means gating is off for this request
+    if not options.get("gate", GATE_WINDOWS):
+        return None
+    return {
+        "min_db": float(options.get("gate_min_db", GATE_MIN_DB)),
+        "max_flatness": float(options.get("gate_max_flatness", GATE_MAX_FLATNESS)),
+        "min_active_frames": int(options.get("gate_min_active_frames", GATE_MIN_ACTIVE_FRAMES)),
+    }
+
+
+def frame_features(waveform, sample_rate, band=GATE_BAND_HZ):
+    # Per-frame band level (dBFS) and spectral flatness over non-overlapping Hann frames
+    frame_count = len(waveform) // FRAME_SAMPLES
+    frames = np.asarray(waveform[:frame_count * FRAME_SAMPLES], dtype=np.float32).reshape(frame_count, FRAME_SAMPLES)
+
+    taper = np.hanning(FRAME_SAMPLES).astype(np.float32)
+    frequencies = np.fft.rfftfreq(FRAME_SAMPLES, 1.0 / sample_rate)
+    low, high = np.searchsorted(frequencies, band)
+    # Parseval with the window's energy, so a full-scale sine inside the band reads about -3 dBFS
+    scale = 2.0 / (FRAME_SAMPLES * np.square(taper).sum())
+
+    level_db = np.empty(frame_count, dtype=np.float32)
+    flatness = np.empty(frame_count, dtype=np.float32)
+    for start in range(0, frame_count, FRAMES_PER_BLOCK):
+        block = frames[start:start + FRAMES_PER_BLOCK] * taper
+        power = np.square(np.abs(fft.rfft(block, axis=1)[:, low:high])) + 1e-12
+        mean_power = power.mean(axis=1)
+        level_db[start:start + len(block)] = 10.0 * np.log10(power.sum(axis=1) * scale)
+        flatness[start:start + len(block)] = np.exp(np.log(power).mean(axis=1)) / mean_power
+    return level_db, flatness
+
+
+def active_windows(waveform, window_count, hop_samples, window_samples, sample_rate,
+                   min_db=GATE_MIN_DB, max_flatness=GATE_MAX_FLATNESS, min_active_frames=GATE_MIN_ACTIVE_FRAMES):
+    # Boolean mask over the sliding windows, plus how much in-band energy each window holds
+    level_db, flatness = frame_features(waveform, sample_rate)
+    active = (level_db >= min_db) & (flatness <= max_flatness)
+
+    # Frames each window covers; windows past the end of the recording only cover its padding
+    starts = np.arange(window_count) * hop_samples // FRAME_SAMPLES
+    ends = (np.arange(window_count) * hop_samples + window_samples) // FRAME_SAMPLES
+    starts, ends = np.minimum(starts, len(active)), np.minimum(ends, len(active))
+
+    active_counts = np.concatenate(([0], np.cumsum(active)))
+    keep = active_counts[ends] - active_counts[starts] >= min_active_frames
+
+    # Mean in-band power per window, so the caller can still pick the most promising one when none pass
+    power_sums = np.concatenate(([0.0], np.cumsum(np.power(10.0, level_db.astype(np.float64) / 10.0))))
+    mean_power = (power_sums[ends] - power_sums[starts]) / np.maximum(ends - starts, 1)
+    return keep, mean_power
@@ -0,0 +1,30 @@
+"""Readiness probe for the AI service: exits 0 once the model is loaded and warmed up.
+
+    python healthcheck.py [host] [port]
+"""
+import json
+import socket
+import sys
+
+from protocol import ERROR, REQUEST, encode_frame, recv_frame
+
+
+def check_ready(host="127.0.0.1", port=9000, timeout=5.0):
+    with socket.create_connection((host, port), timeout=timeout) as sock:
+        sock.sendall(b"".join(bytes(part) for part in encode_frame(REQUEST, 1, {"op": "ready"})))
+        message_type, _, metadata, payload = recv_frame(sock)
+    if message_type == ERROR:
+        raise RuntimeError(metadata.get("error", "AI service error"))
+    return json.loads(payload)
+
+
+if __name__ == "__main__":
+    host = sys.argv[1] if len(sys.argv) > 1 else "127.0.0.1"
+    port = int(sys.argv[2]) if len(sys.argv) > 2 else 9000
+    try:
+        status = check_ready(host, port)
+    except (OSError, RuntimeError) as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+    print(json.dumps(status))
+    sys.exit(0 if status["ready"] else 1)
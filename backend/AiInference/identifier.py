@@ -1,69 +1,358 @@
 from io import BytesIO
+import hashlib
 
-import tensorflow as tf
 import numpy as np
 import librosa
 import os
+import time
 
-def load_labels(labels_path):
-    bird_labels = {}
-    with open(labels_path, 'r') as f:
-        for idx, line in enumerate(f.readlines()):
-            bird_labels[idx] = line.strip()
-    return bird_labels
+from batching import BatchScheduler
+from gating import active_windows
+from postprocessing import PredictionHead, load_label_array, log_softmax
+
+SAMPLE_RATE = 32000
+WINDOW_SAMPLES = 5 * SAMPLE_RATE
+OUTPUT_HEADS = ("label", "genus", "family", "order")
+# Perch also returns a clip embedding next to the classifier heads
+EMBEDDING_OUTPUT = "embedding"
+
+# Micro-batching of concurrent requests in front of the model
+BATCH_MAX_SIZE = int(os.getenv("BATCH_MAX_SIZE", "16"))
+BATCH_MAX_WAIT_MS = float(os.getenv("BATCH_MAX_WAIT_MS", "10"))
+
+# Ranked predictions returned per head (species, genus, family, order)
+TOP_K = int(os.getenv("TOP_K", "5"))
+
+# Sliding-window classification over the whole recording
+WINDOW_HOP_SECONDS = float(os.getenv("WINDOW_HOP_SECONDS", "2.5"))
+WINDOW_POOLING = os.getenv("WINDOW_POOLING", "max")
+MAX_WINDOWS_PER_CALL = int(os.getenv("MAX_WINDOWS_PER_CALL", "64"))
+
+# "stub" swaps Perch for a deterministic model with the same heads (benchmarks, no TensorFlow needed)
+MODEL_BACKEND = os.getenv("MODEL_BACKEND", "tf")
+
+# Batch sizes run once at startup so graph tracing never lands on a live request
+WARMUP = os.getenv("WARMUP", "1") == "1"
+WARMUP_BATCH_SIZES = [
+    int(size) for size in os.getenv("WARMUP_BATCH_SIZES", f"1,{BATCH_MAX_SIZE},{MAX_WINDOWS_PER_CALL}").split(",")
+]
+
+def model_fingerprint(paths):
+    # Changes whenever the graph or the label files change, so cached results go stale with the model
+    digest = hashlib.sha256()
+    for path in paths:
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                for block in iter(lambda: f.read(1 << 20), b""):
+                    digest.update(block)
+    return digest.hexdigest()[:16]
 
-# Load the model
 SAVE_PATH = "saved_model/"
-if os.path.exists(SAVE_PATH):
-    print(f"✅ Loading model from {SAVE_PATH}...")
-    model = tf.saved_model.load(SAVE_PATH)
-    print(f"✅ Model loaded successfully!")
-else:
-    print(f"❌ Model not found at {SAVE_PATH}. Please ensure the model is copied to this location.")
 
-# Load bird labels
-bird_labels = load_labels("label.csv")
-genus_labels = load_labels("genus.csv")
-family_labels = load_labels("family.csv")
-order_labels = load_labels("order.csv")
+MODEL_VERSION = os.getenv("MODEL_VERSION") or ("stub" if MODEL_BACKEND == "stub" else model_fingerprint([
+    os.path.join(SAVE_PATH, "saved_model.pb"),
+    os.path.join(SAVE_PATH, "variables", "variables.index"),
+    "label.csv", "genus.csv", "family.csv", "order.csv",
+]))
 
+# Filled in by startup(), which the server runs before it reports itself ready
+model = None
+prediction_head = None
+bird_labels = genus_labels = family_labels = order_labels = None
 
 
-def classify_bird(audio_data):
+def load_labels():
+    global bird_labels, genus_labels, family_labels, order_labels, prediction_head
+    # Load bird labels into arrays indexed by class id
+    bird_labels = load_label_array("label.csv")
+    genus_labels = load_label_array("genus.csv")
+    family_labels = load_label_array("family.csv")
+    order_labels = load_label_array("order.csv")
+
+    prediction_head = PredictionHead({
+        "label": bird_labels,
+        "genus": genus_labels,
+        "family": family_labels,
+        "order": order_labels,
+    })
+
+
+def load_model():
+    global model
+    if MODEL_BACKEND == "stub":
+        from stub_model import StubModel
+        model = StubModel({
+            "label": len(bird_labels),
+            "genus": len(genus_labels),
+            "family": len(family_labels),
+            "order": len(order_labels),
+        })
+        print(f"⚠️ Using the stub model, predictions are not real")
+    elif os.path.exists(SAVE_PATH):
+        import tensorflow as tf
+        print(f"✅ Loading model from {SAVE_PATH}...")
+        model = tf.saved_model.load(SAVE_PATH)
+        print(f"✅ Model loaded successfully!")
+    else:
+        raise FileNotFoundError(f"Model not found at {SAVE_PATH}. Please ensure the model is copied to this location.")
+
+
+def run_model(waveform_batch):
+    model_outputs = model.infer_tf(waveform_batch)
+    outputs = {head: np.asarray(model_outputs[head]) for head in OUTPUT_HEADS}
+    if EMBEDDING_OUTPUT in model_outputs:
+        outputs[EMBEDDING_OUTPUT] = np.asarray(model_outputs[EMBEDDING_OUTPUT])
+    return outputs
+
+
+def head_outputs(model_outputs):
+    return {head: model_outputs[head] for head in OUTPUT_HEADS}
+
+
+def warm_up(batch_sizes=None):
+    # First calls pay for graph tracing, kernel selection and allocator growth; do it before taking traffic
+    timings = {}
+    for batch_size in sorted(set(batch_sizes or WARMUP_BATCH_SIZES)):
+        start = time.perf_counter()
+        run_model(np.zeros((batch_size, WINDOW_SAMPLES), dtype=np.float32))
+        timings[batch_size] = round((time.perf_counter() - start) * 1000, 1)
+        print(f"🔥 Warm-up at batch size {batch_size}: {timings[batch_size]} ms")
+    return timings
+
+
+def startup(warm=None):
+    warm = WARMUP if warm is None else warm
+    report = {}
+
+    start = time.perf_counter()
+    load_labels()
+    report["labels_ms"] = round((time.perf_counter() - start) * 1000, 1)
+
+    start = time.perf_counter()
+    load_model()
+    report["model_ms"] = round((time.perf_counter() - start) * 1000, 1)
+
+    report["warmup_ms"] = warm_up() if warm else {}
+    return report
+
+
+scheduler = BatchScheduler(run_model, max_batch_size=BATCH_MAX_SIZE, max_wait_ms=BATCH_MAX_WAIT_MS)
+
+
+def frame_waveform(waveform, hop_samples, window_samples=WINDOW_SAMPLES):
+    # Pad the tail so the last window still covers the end of the recording
+    if len(waveform) <= window_samples:
+        padded_length = window_samples
+    else:
+        hops = -(-(len(waveform) - window_samples) // hop_samples)
+        padded_length = window_samples + hops * hop_samples
+
+    if padded_length > len(waveform):
+        waveform = np.pad(waveform, (0, padded_length - len(waveform)), mode='constant')
+
+    # Strided view over the padded waveform: no per-window copies
+    return np.lib.stride_tricks.sliding_window_view(waveform, window_samples)[::hop_samples]
+
+
+def submit_windows(windows):
+    return [
+        scheduler.submit(windows[start:start + MAX_WINDOWS_PER_CALL])
+        for start in range(0, len(windows), MAX_WINDOWS_PER_CALL)
+    ]
+
+
+def collect_windows(futures):
+    results = [future.result() for future in futures]
+    if len(results) == 1:
+        return results[0]
+    return {name: np.concatenate([result[name] for result in results], axis=0) for name in results[0]}
+
+
+def infer_windows(windows):
+    return collect_windows(submit_windows(windows))
+
+
+def decode_audio(audio_data):
     # Load audio directly from raw bytes
-    waveform, sr = librosa.load(BytesIO(audio_data), sr=32000, mono=True)
+    waveform, sr = librosa.load(BytesIO(audio_data), sr=SAMPLE_RATE, mono=True)
+    return waveform
+
+
+def waveform_from_pcm(buffer, dtype="<f4", sample_rate=SAMPLE_RATE, channels=1, rows=1):
+    dtype = np.dtype(dtype)
+    if dtype.kind not in ("f", "i"):
+        raise ValueError(f"Unsupported PCM dtype: {dtype.str}")
+
+    # Wraps the received buffer in place, no copy for mono float32 at 32 kHz
+    waveform = np.frombuffer(buffer, dtype=dtype)
+    if channels > 1:
+        waveform = waveform.reshape(-1, channels).mean(axis=1)
+    if dtype.kind == "i":
+        waveform = waveform.astype(np.float32) / float(np.iinfo(dtype).max + 1)
+    elif dtype != np.float32:
+        waveform = waveform.astype(np.float32)
+
+    if rows > 1:
+        # Several equal-length signals back to back, one per row
+        waveform = waveform.reshape(rows, -1)
+
+    if sample_rate != SAMPLE_RATE:
+        waveform = librosa.resample(waveform, orig_sr=sample_rate, target_sr=SAMPLE_RATE, axis=-1)
+    return waveform
+
+
+def summarize(predictions):
+    # Top-1 fields keep the original response shape; the ranked lists ride along under top_k
+    return {
+        "label": predictions["species"][0]["label"],
+        "probability": predictions["species"][0]["probability"],
+        "genus": predictions["genus"][0]["label"],
+        "family": predictions["family"][0]["label"],
+        "order": predictions["order"][0]["label"],
+        "top_k": predictions,
+    }
+
 
-    target_length = 5 * 32000
+def gate_windows(waveform, windows, hop_samples, gate):
+    # Indices of the windows worth a forward pass, and a report of what was dropped
+    start = time.perf_counter()
+    if gate is None:
+        return np.arange(len(windows)), {"enabled": False, "windows": len(windows), "skipped": 0}
+
+    keep, energy = active_windows(waveform, len(windows), hop_samples, WINDOW_SAMPLES, SAMPLE_RATE, **gate)
+    indices = np.flatnonzero(keep)
+    if len(indices) == 0:
+        # Nothing passed: still classify the window with the most in-band energy, so there is an answer
+        indices = np.array([int(np.argmax(energy))])
+
+    return indices, {
+        "enabled": True,
+        "windows": len(windows),
+        "skipped": len(windows) - len(indices),
+        "ms": round((time.perf_counter() - start) * 1000, 3),
+    }
+
+
+def classify_windows(audio_data, hop_seconds=None, top_k=None, pooling=None, temperature=1.0, min_score=0.0,
+                     gate=None):
+    return classify_waveform_windows(decode_audio(audio_data), hop_seconds, top_k, pooling, temperature, min_score,
+                                     gate)
+
+
+def check_pooling(pooling):
+    pooling = pooling or WINDOW_POOLING
+    if pooling not in ("max", "mean"):
+        raise ValueError(f"Unsupported pooling: {pooling}. Choose from 'max' or 'mean'")
+    return pooling
+
+
+def pool_windows(model_outputs, indices, hop_samples, top_k, pooling, temperature, min_score, with_timeline=True):
+    # Clip-level prediction from the window outputs, plus the best species per window.
+    # Per-window log-probabilities for every head, shape (windows, classes)
+    log_probs = {head: log_softmax(values, temperature) for head, values in head_outputs(model_outputs).items()}
+    if pooling == "max":
+        clip_log_probs = {head: values.max(axis=0, keepdims=True) for head, values in log_probs.items()}
+    else:
+        clip_log_probs = {
+            head: np.log(np.exp(values).mean(axis=0, keepdims=True)) for head, values in log_probs.items()
+        }
+
+    predictions = prediction_head.format(prediction_head.top_k(clip_log_probs, top_k), min_score)[0]
+    result = summarize(predictions)
+    if not with_timeline:
+        return result
+
+    window_best = log_probs['label'].argmax(axis=1)
+    window_best_probs = np.exp(log_probs['label'][np.arange(len(indices)), window_best])
+    timeline = [
+        {
+            "start": round(i * hop_samples / SAMPLE_RATE, 3),
+            "end": round((i * hop_samples + WINDOW_SAMPLES) / SAMPLE_RATE, 3),
+            "label": prediction_head.label('label', int(index)),
+            "probability": float(prob),
+        }
+        for i, index, prob in zip(indices.tolist(), window_best, window_best_probs)
+    ]
+    result["timeline"] = timeline
+    return result
+
+
+def classify_waveform_windows(waveform, hop_seconds=None, top_k=None, pooling=None, temperature=1.0, min_score=0.0,
+                              gate=None):
+    hop_seconds = hop_seconds or WINDOW_HOP_SECONDS
+    top_k = top_k or TOP_K
+    pooling = check_pooling(pooling)
+
+    hop_samples = max(1, int(hop_seconds * SAMPLE_RATE))
+    windows = frame_waveform(waveform, hop_samples)
+    # Silent and noise-only windows never reach the model
+    indices, gating = gate_windows(waveform, windows, hop_samples, gate)
+    if len(indices) < len(windows):
+        windows = windows[indices]
+
+    model_outputs = infer_windows(windows)
+    result = pool_windows(model_outputs, indices, hop_samples, top_k, pooling, temperature, min_score)
+    result["gating"] = gating
+    print(f"🦜 {result['label']} - probability: {result['probability']:.4f} over {len(windows)} windows "
+          f"({gating['skipped']} skipped)")
+    return result
+
+
+def classify_waveform_batch(waveforms, hop_seconds=None, top_k=None, pooling=None, temperature=1.0, min_score=0.0,
+                            gate=None):
+    # One result per row (e.g. noisy or filtered variants of one recording, or a batch of recordings). Every
+    # row's windows are queued before any is awaited, so the scheduler runs them as full batches. Gating is
+    # off by default so variants are judged on the same windows
+    hop_samples = max(1, int((hop_seconds or WINDOW_HOP_SECONDS) * SAMPLE_RATE))
+    top_k = top_k or TOP_K
+    pooling = check_pooling(pooling)
+
+    framed, kept = [], []
+    for waveform in waveforms:
+        windows = frame_waveform(waveform, hop_samples)
+        indices, _ = gate_windows(waveform, windows, hop_samples, gate)
+        framed.append(windows[indices] if len(indices) < len(windows) else windows)
+        kept.append(indices)
+    pending = [submit_windows(windows) for windows in framed]
+
+    results = []
+    for indices, futures in zip(kept, pending):
+        results.append(pool_windows(collect_windows(futures), indices, hop_samples, top_k, pooling,
+                                    temperature, min_score, with_timeline=False))
+    print(f"🦜 Classified {len(results)} rows, {sum(len(windows) for windows in framed)} windows")
+    return results
+
+
+def classify_bird(audio_data):
+    result = classify_waveform(decode_audio(audio_data))
+    return result["label"], result["probability"], result["genus"], result["family"], result["order"]
+
+
+def classify_waveform(waveform, top_k=None, temperature=1.0, min_score=0.0):
+    target_length = WINDOW_SAMPLES
     if len(waveform) < target_length:
         waveform = np.pad(waveform, (0, target_length - len(waveform)), mode='constant')
     else:
         waveform = waveform[:target_length]
 
-    # Run inference
-    waveform_batch = np.expand_dims(waveform, axis=0)
-    model_outputs = model.infer_tf(waveform_batch)
-
-    # Extract raw logits
-    label_logits = model_outputs['label'].numpy()[0]
-    label_probs = tf.nn.softmax(label_logits).numpy()
-    top_1_index_label = np.argmax(label_probs)
-
-    order_logits = model_outputs['order'].numpy()[0]
-    order_probs = tf.nn.softmax(order_logits).numpy()
-    top_1_index_order = np.argmax(order_probs)
+    # Run inference, batched together with any other requests in flight
+    model_outputs = scheduler.infer(waveform)
 
-    family_logits = model_outputs['family'].numpy()[0]
-    family_probs = tf.nn.softmax(family_logits).numpy()
-    top_1_index_family = np.argmax(family_probs)
+    predictions = prediction_head.predict(head_outputs(model_outputs), top_k or TOP_K, temperature, min_score)[0]
+    result = summarize(predictions)
+    print(f"🦜 {result['label']} - probability: {result['probability']:.4f}")
+    return result
 
-    genus_logits = model_outputs['genus'].numpy()[0]
-    genus_probs = tf.nn.softmax(genus_logits).numpy()
-    top_1_index_genus = np.argmax(genus_probs)
 
-    bird_genus = genus_labels.get(top_1_index_genus, "Unknown Bird")
-    bird_family = family_labels.get(top_1_index_family, "Unknown Bird")
-    bird_order = order_labels.get(top_1_index_order, "Unknown Bird")
+def embed_waveform(waveform, hop_seconds=None):
+    # One vector per recording: mean of the window embeddings, unit length so a dot product is cosine similarity
+    hop_samples = max(1, int((hop_seconds or WINDOW_HOP_SECONDS) * SAMPLE_RATE))
+    model_outputs = infer_windows(frame_waveform(waveform, hop_samples))
+    if EMBEDDING_OUTPUT not in model_outputs:
+        raise ValueError("The loaded model has no embedding output")
 
-    bird_name = bird_labels.get(top_1_index_label, "Unknown Bird")
-    print(f"🦜 {bird_name} - probability: {label_probs[top_1_index_label]:.4f}")
-    return bird_name, label_probs[top_1_index_label], bird_genus, bird_family, bird_order
+    embedding = model_outputs[EMBEDDING_OUTPUT].mean(axis=0)
+    norm = np.linalg.norm(embedding)
+    if norm > 0:
+        embedding = embedding / norm
+    return embedding.astype(np.float16)
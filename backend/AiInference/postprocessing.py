@@ -0,0 +1,70 @@
+import numpy as np
+
+UNKNOWN_LABEL = "Unknown Bird"
+
+# Model output head -> key in the response
+HEAD_NAMES = {"label": "species", "genus": "genus", "family": "family", "order": "order"}
+
+DEFAULT_TOP_K = 5
+
+
+def load_label_array(labels_path):
+    with open(labels_path, 'r') as f:
+        return np.array([line.strip() for line in f])
+
+
+def log_softmax(logits, temperature=1.0):
+    # Numerically stable: shift by the row max before exponentiating
+    logits = np.asarray(logits, dtype=np.float32)
+    if temperature != 1.0:
+        logits = logits / np.float32(temperature)
+    shifted = logits - logits.max(axis=-1, keepdims=True)
+    return shifted - np.log(np.exp(shifted).sum(axis=-1, keepdims=True))
+
+
+def top_k(scores, k):
+    # argpartition finds the k best in O(n) per row; only those k get sorted
+    k = min(k, scores.shape[-1])
+    indices = np.argpartition(scores, -k, axis=-1)[..., -k:]
+    values = np.take_along_axis(scores, indices, axis=-1)
+    order = np.argsort(-values, axis=-1)
+    return np.take_along_axis(indices, order, axis=-1), np.take_along_axis(values, order, axis=-1)
+
+
+class PredictionHead:
+    def __init__(self, labels):
+        # Model head -> NumPy array of label names, indexed by class id
+        self.labels = labels
+
+    def label(self, head, index):
+        names = self.labels[head]
+        return str(names[index]) if 0 <= index < len(names) else UNKNOWN_LABEL
+
+    def top_k(self, log_probs, k=DEFAULT_TOP_K):
+        # log_probs: head -> (rows, classes). Returns head -> (indices, probabilities), each (rows, k)
+        results = {}
+        for head, scores in log_probs.items():
+            indices, values = top_k(scores, k)
+            results[head] = (indices, np.exp(values))
+        return results
+
+    def format(self, top, min_score=0.0):
+        # One dict per row with a ranked list per head; the best class is always kept
+        rows = len(next(iter(top.values()))[0])
+        formatted = [{} for _ in range(rows)]
+        for head, (indices, probs) in top.items():
+            names = self.labels[head]
+            in_range = indices < len(names)
+            label_names = np.where(in_range, names[np.minimum(indices, len(names) - 1)], UNKNOWN_LABEL)
+            keep = probs >= min_score
+            keep[:, 0] = True
+            for row in range(rows):
+                formatted[row][HEAD_NAMES[head]] = [
+                    {"label": str(name), "probability": float(prob)}
+                    for name, prob in zip(label_names[row][keep[row]], probs[row][keep[row]])
+                ]
+        return formatted
+
+    def predict(self, logits, k=DEFAULT_TOP_K, temperature=1.0, min_score=0.0):
+        log_probs = {head: log_softmax(values, temperature) for head, values in logits.items()}
+        return self.format(self.top_k(log_probs, k), min_score)
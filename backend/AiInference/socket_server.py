@@ -1,70 +1,471 @@
+import asyncio
 import json
-import socket
+import os
+import signal
+import time
+
+# Taken before the heavy imports below, so the startup report covers them too
+PROCESS_STARTED = time.monotonic()
+
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from io import BytesIO
+import numpy as np
 from pydub import AudioSegment
-from web_scraping.ebird_scraper import scrape_ebird_species, get_species_info
-from identifier import classify_bird
+from web_scraping.species_catalog import species_catalog
+from protocol import (
+    ERROR, HEADER, LEGACY_SIZE_BYTES, MAGIC, REQUEST, RESPONSE, VERSION,
+    ProtocolError, decode_header, decode_metadata, encode_frame,
+)
+from gating import gate_settings
+from identifier import (
+    MODEL_VERSION, TOP_K, classify_waveform, classify_waveform_batch, classify_waveform_windows, decode_audio,
+    embed_waveform, scheduler, startup, waveform_from_pcm,
+)
 
-HOST = "0.0.0.0"    
-PORT = 9000
+HOST = "0.0.0.0"
+PORT = int(os.getenv("PORT", "9000"))
 
-def start_server():
-    server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-    server_socket.bind((HOST, PORT))
-    server_socket.listen(5)
+# Classify the whole recording in sliding windows instead of only the first 5 seconds
+WINDOWED_CLASSIFICATION = os.getenv("WINDOWED_CLASSIFICATION", "1") == "1"
+
+# Requests that may be decoding, inferring or looking up species at the same time
+MAX_CONCURRENT_REQUESTS = int(os.getenv("MAX_CONCURRENT_REQUESTS", "32"))
+DECODE_WORKERS = int(os.getenv("DECODE_WORKERS", "4"))
+INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", "16"))
+LOOKUP_WORKERS = int(os.getenv("LOOKUP_WORKERS", "8"))
+MAX_PAYLOAD_BYTES = int(os.getenv("MAX_PAYLOAD_BYTES", str(256 * 1024 * 1024)))
+# Requests one connection may have accepted but not yet answered; beyond this its socket is not read,
+# so a client pipelining frames can't make the server hold an unbounded number of payloads
+MAX_IN_FLIGHT_PER_CONNECTION = int(os.getenv("MAX_IN_FLIGHT_PER_CONNECTION", "16"))
+SHUTDOWN_GRACE_SECONDS = float(os.getenv("SHUTDOWN_GRACE_SECONDS", "30"))
+
+# One pool per stage so a slow eBird lookup or a long decode never holds up inference
+decode_executor = ThreadPoolExecutor(max_workers=DECODE_WORKERS, thread_name_prefix="decode")
+inference_executor = ThreadPoolExecutor(max_workers=INFERENCE_WORKERS, thread_name_prefix="inference")
+lookup_executor = ThreadPoolExecutor(max_workers=LOOKUP_WORKERS, thread_name_prefix="lookup")
+
+
+def run_classification(waveform, options):
+    # Per-request options from the frame metadata; anything missing uses the server defaults
+    top_k = int(options.get("top_k") or TOP_K)
+    temperature = float(options.get("temperature", 1.0))
+    min_score = float(options.get("min_score", 0.0))
+    if temperature <= 0:
+        raise ValueError("temperature must be positive")
+
+    if options.get("windowed", WINDOWED_CLASSIFICATION):
+        return classify_waveform_windows(
+            waveform,
+            hop_seconds=options.get("hop_seconds"),
+            top_k=top_k,
+            pooling=options.get("pooling"),
+            temperature=temperature,
+            min_score=min_score,
+            gate=gate_settings(options),
+        )
+    return classify_waveform(waveform, top_k=top_k, temperature=temperature, min_score=min_score)
+
+
+def build_response(result, scraped_bird):
+    if not isinstance(scraped_bird, dict):
+        # The scraper reports failures as a plain string
+        scraped_bird = {"error": scraped_bird}
+    else:
+        scraped_bird = dict(scraped_bird)
+
+    # Add probability and taxonomy to the scraped bird
+    scraped_bird['label'] = result['label']
+    scraped_bird['probability'] = float(result['probability'])
+    scraped_bird['genus'] = result['genus']
+    scraped_bird['family'] = result['family']
+    scraped_bird['order'] = result['order']
+
+    if 'top_k' in result:
+        scraped_bird['top_k'] = result['top_k']
+    if 'timeline' in result:
+        scraped_bird['timeline'] = result['timeline']
+    if 'gating' in result:
+        scraped_bird['gating'] = result['gating']
+
+    return scraped_bird
+
+
+async def process_request(metadata, payload, timings=None):
+    op = metadata.get("op", "classify")
+    if op == "classify":
+        return await process_audio(payload, metadata, timings)
+    if op == "embed":
+        return await process_embedding(payload, metadata, timings)
+    if op == "classify_batch":
+        return await process_batch(payload, metadata, timings)
+    if op == "model_info":
+        return {"model_version": MODEL_VERSION}
+    if op == "stats":
+        return {
+            "species_catalog": species_catalog.stats(),
+            "batches_run": scheduler.batches_run,
+            "rows_run": scheduler.rows_run,
+        }
+    raise ValueError(f"Unsupported op: {op}")
+
+
+async def load_waveform(audio_data, metadata):
+    loop = asyncio.get_running_loop()
+
+    if metadata.get("content_type") == "audio/pcm":
+        # Already decoded by the API: raw samples with dtype and sample rate in the header
+        return await loop.run_in_executor(decode_executor, partial(
+            waveform_from_pcm,
+            audio_data,
+            dtype=metadata.get("dtype", "<f4"),
+            sample_rate=int(metadata.get("sample_rate", 32000)),
+            channels=int(metadata.get("channels", 1)),
+            rows=int(metadata.get("rows", 1)),
+        ))
+
+    # Encoded audio (MP3 from older clients)
+    return await loop.run_in_executor(decode_executor, decode_audio, audio_data)
+
+
+def elapsed_ms(start):
+    return round((time.perf_counter() - start) * 1000, 3)
+
+
+async def process_audio(audio_data, metadata=None, timings=None):
+    loop = asyncio.get_running_loop()
+    # Milliseconds per stage, returned to the caller in the response metadata
+    timings = {} if timings is None else timings
+
+    start = time.perf_counter()
+    waveform = await load_waveform(audio_data, metadata or {})
+    timings["decode"] = elapsed_ms(start)
+
+    start = time.perf_counter()
+    result = await loop.run_in_executor(inference_executor, run_classification, waveform, metadata or {})
+    timings["inference"] = elapsed_ms(start)
+
+    start = time.perf_counter()
+    scraped_bird = await loop.run_in_executor(lookup_executor, species_catalog.get, result['label'])
+    timings["lookup"] = elapsed_ms(start)
+    print(scraped_bird)
+
+    return build_response(result, scraped_bird)
+
+
+async def process_embedding(audio_data, metadata, timings=None):
+    loop = asyncio.get_running_loop()
+    timings = {} if timings is None else timings
+
+    start = time.perf_counter()
+    waveform = await load_waveform(audio_data, metadata)
+    timings["decode"] = elapsed_ms(start)
+
+    start = time.perf_counter()
+    embedding = await loop.run_in_executor(inference_executor, embed_waveform, waveform, metadata.get("hop_seconds"))
+    timings["inference"] = elapsed_ms(start)
+    return embedding
+
+
+async def process_batch(audio_data, metadata, timings=None):
+    # Many signals in a single request: variants of one recording (equal-length rows), or separate
+    # recordings of different lengths described by "lengths". Gating is off unless the request turns it on,
+    # and species are only looked up when asked for
+    loop = asyncio.get_running_loop()
+    timings = {} if timings is None else timings
+    if metadata.get("content_type") != "audio/pcm":
+        raise ValueError("classify_batch takes raw PCM rows")
+
+    start = time.perf_counter()
+    if metadata.get("lengths") is not None:
+        waveforms = await loop.run_in_executor(decode_executor, split_rows, audio_data, metadata)
+    else:
+        waveforms = np.atleast_2d(await load_waveform(audio_data, metadata))
+    timings["decode"] = elapsed_ms(start)
 
-    print(f"🎙 AI Service listening on {HOST}:{PORT}")
+    temperature = float(metadata.get("temperature", 1.0))
+    if temperature <= 0:
+        raise ValueError("temperature must be positive")
 
-    while True:
-        client_socket, addr = server_socket.accept()
-        print(f"🔗 Connection from {addr}")
+    start = time.perf_counter()
+    results = await loop.run_in_executor(inference_executor, partial(
+        classify_waveform_batch,
+        waveforms,
+        hop_seconds=metadata.get("hop_seconds"),
+        top_k=int(metadata.get("top_k") or TOP_K),
+        pooling=metadata.get("pooling"),
+        temperature=temperature,
+        min_score=float(metadata.get("min_score", 0.0)),
+        gate=gate_settings({"gate": False, **metadata}),
+    ))
+    timings["inference"] = elapsed_ms(start)
 
-        data_size_bytes = client_socket.recv(10)
-        if not data_size_bytes:
-            print("No size received!")
-            client_socket.close()
-            continue
+    if metadata.get("lookup"):
+        start = time.perf_counter()
+        labels = list({result["label"] for result in results})
+        scraped = await asyncio.gather(*(
+            loop.run_in_executor(lookup_executor, species_catalog.get, label) for label in labels
+        ))
+        species = dict(zip(labels, scraped))
+        results = [build_response(result, species[result["label"]]) for result in results]
+        timings["lookup"] = elapsed_ms(start)
+    return results
 
-        data_size = int(data_size_bytes.decode().strip())
-        print(f"Expecting {data_size} bytes")
 
-        audio_data = b""
-        while len(audio_data) < data_size:
-            chunk = client_socket.recv(data_size)
-            if not chunk:
-                break
-            audio_data += chunk
-            print(f"📦 Received {len(chunk)} bytes (Total: {len(audio_data)}/{data_size})")
+def split_rows(audio_data, metadata):
+    # Back-to-back signals of the given sample counts, each converted (and resampled) on its own
+    lengths = [int(length) for length in metadata["lengths"]]
+    channels = int(metadata.get("channels", 1))
+    frame_bytes = np.dtype(metadata.get("dtype", "<f4")).itemsize * channels
+    if min(lengths, default=0) <= 0 or sum(lengths) * frame_bytes != len(audio_data):
+        raise ValueError("lengths do not match the payload")
 
-        print(f"Finished receiving {len(audio_data)} bytes")
+    view = memoryview(audio_data)
+    waveforms, offset = [], 0
+    for length in lengths:
+        end = offset + length * frame_bytes
+        waveforms.append(waveform_from_pcm(
+            view[offset:end],
+            dtype=metadata.get("dtype", "<f4"),
+            sample_rate=int(metadata.get("sample_rate", 32000)),
+            channels=channels,
+        ))
+        offset = end
+    return waveforms
 
-        if len(audio_data) == data_size:
-            print("✅ Data fully received!")
+
+class FrameProtocol(asyncio.BufferedProtocol):
+    def __init__(self, server):
+        self.server = server
+        self.transport = None
+        self.peer = None
+        self.buffer = None
+        self.view = None
+        self.filled = 0
+        self.on_complete = None
+        self.in_flight = 0
+        self.reading_paused = False
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self.peer = transport.get_extra_info("peername")
+        self.server.protocols.add(self)
+        print(f"🔗 Connection from {self.peer}")
+        self._expect(len(MAGIC), self._on_magic)
+
+    def connection_lost(self, exc):
+        self.server.protocols.discard(self)
+
+    # The socket is read straight into a preallocated buffer of the exact size expected next
+    def get_buffer(self, sizehint):
+        return self.view[self.filled:]
+
+    def buffer_updated(self, nbytes):
+        self.filled += nbytes
+        if self.filled < len(self.buffer):
+            return
+
+        completed, on_complete = self.buffer, self.on_complete
+        try:
+            on_complete(completed)
+        except (ProtocolError, ValueError) as e:
+            print(f"❌ Protocol error from {self.peer}: {e}")
+            self.transport.close()
+
+    def _expect(self, size, on_complete):
+        if size == 0:
+            on_complete(bytearray())
+            return
+        self.buffer = bytearray(size)
+        self.view = memoryview(self.buffer)
+        self.filled = 0
+        self.on_complete = on_complete
+
+    def _on_magic(self, start):
+        start = bytes(start)
+        if start == MAGIC:
+            self._expect(HEADER.size - len(MAGIC), lambda rest: self._on_header(start + rest))
+        elif start.isdigit():
+            self._expect(LEGACY_SIZE_BYTES - len(MAGIC), lambda rest: self._on_legacy_size(start + rest))
         else:
-            print(f"Data incomplete! Received {len(audio_data)} bytes out of {data_size}")
+            raise ProtocolError(f"Unexpected frame start {start!r}")
+
+    def _on_header(self, header):
+        message_type, request_id, metadata_length, payload_length = decode_header(header)
+        if message_type != REQUEST:
+            raise ProtocolError(f"Unexpected message type {message_type}")
+        if payload_length > MAX_PAYLOAD_BYTES:
+            raise ProtocolError(f"Payload too large: {payload_length} bytes")
+        self._expect(metadata_length, lambda metadata: self._on_metadata(request_id, metadata, payload_length))
+
+    def _on_metadata(self, request_id, metadata, payload_length):
+        metadata = decode_metadata(metadata)
+        self._expect(payload_length, lambda payload: self._on_payload(request_id, metadata, payload))
+
+    def _on_payload(self, request_id, metadata, payload):
+        task = self.server.spawn(self.server.handle_request(self, request_id, metadata, payload))
+        self.in_flight += 1
+        task.add_done_callback(self._on_request_done)
+        if self.in_flight >= MAX_IN_FLIGHT_PER_CONNECTION and not self.reading_paused:
+            self.transport.pause_reading()
+            self.reading_paused = True
+        self._expect(len(MAGIC), self._on_magic)
+
+    def _on_request_done(self, task):
+        self.in_flight -= 1
+        if self.reading_paused and self.in_flight < MAX_IN_FLIGHT_PER_CONNECTION and not self.transport.is_closing():
+            self.transport.resume_reading()
+            self.reading_paused = False
+
+    def _on_legacy_size(self, size_bytes):
+        data_size = int(bytes(size_bytes).decode().strip())
+        if data_size > MAX_PAYLOAD_BYTES:
+            raise ProtocolError(f"Payload too large: {data_size} bytes")
+        print(f"Expecting {data_size} bytes (legacy client)")
+        self._expect(data_size, self._on_legacy_payload)
+
+    def _on_legacy_payload(self, audio_data):
+        # Old clients send a single request per connection
+        self.transport.pause_reading()
+        self.server.spawn(self.server.handle_legacy_request(self, audio_data))
+
+    def send(self, message_type, request_id, metadata, payload=b""):
+        if not self.transport.is_closing():
+            self.transport.writelines(encode_frame(message_type, request_id, metadata, payload))
+
+
+class InferenceServer:
+    def __init__(self, host=HOST, port=PORT, max_concurrent_requests=MAX_CONCURRENT_REQUESTS):
+        self.host = host
+        self.port = port
+        self.slots = asyncio.Semaphore(max_concurrent_requests)
+        self.server = None
+        self.protocols = set()
+        self.tasks = set()
+        # Set once the model is loaded and warmed up; until then only readiness probes are answered
+        self.ready = asyncio.Event()
+        self.startup_report = {}
 
-        #result = classify_bird(convert_bytes_to_MP3(audio_data))
+    async def start(self):
+        loop = asyncio.get_running_loop()
+        self.server = await loop.create_server(lambda: FrameProtocol(self), self.host, self.port)
+        print(f"🎙 AI Service listening on {self.host}:{self.port} (protocol v{VERSION})")
 
-        bird_name, probability, bird_genus, bird_family, bird_order = classify_bird(audio_data)
+    async def warm_up(self):
+        loop = asyncio.get_running_loop()
+        self.startup_report["listening_ms"] = round((time.monotonic() - PROCESS_STARTED) * 1000, 1)
 
-        scraped_bird = get_species_info(bird_name)
-        print(scraped_bird)
+        await loop.run_in_executor(lookup_executor, species_catalog.load)
+        self.startup_report.update(await loop.run_in_executor(inference_executor, startup))
 
-        # Add probability to the scraped bird
-        scraped_bird['probability'] = float(probability)
+        self.startup_report["ready_ms"] = round((time.monotonic() - PROCESS_STARTED) * 1000, 1)
+        self.ready.set()
+        print(f"✅ Ready to classify after {self.startup_report['ready_ms'] / 1000:.1f} s")
 
-        # Add taxonomy
+    def readiness(self):
+        return {
+            "ready": self.ready.is_set(),
+            "model_version": MODEL_VERSION,
+            "startup": self.startup_report,
+        }
 
-        scraped_bird['probability'] = float(probability)
-        scraped_bird['genus'] = bird_genus
-        scraped_bird['family'] = bird_family
-        scraped_bird['order'] = bird_order
+    def spawn(self, coroutine):
+        task = asyncio.ensure_future(coroutine)
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+        return task
 
-        scraped_bird_json = json.dumps(scraped_bird)
+    async def handle_request(self, protocol, request_id, metadata, payload):
+        op = metadata.get("op", "classify")
+        if op == "ready":
+            protocol.send(RESPONSE, request_id, {"status": "ok"}, json.dumps(self.readiness()).encode('utf-8'))
+            return
+        if op in ("classify", "classify_batch", "embed") and not self.ready.is_set():
+            protocol.send(ERROR, request_id, {"status": "error", "error": "AI service is still starting up"})
+            return
 
-        # Send identified bird back
-        client_socket.sendall(scraped_bird_json.encode('utf-8'))
-        client_socket.close()
+        timings = {}
+        try:
+            start = time.perf_counter()
+            async with self.slots:
+                timings["queue"] = elapsed_ms(start)
+                response = await process_request(metadata, payload, timings)
+
+            reply = {"status": "ok", "model_version": MODEL_VERSION, "timings": timings}
+            start = time.perf_counter()
+            if isinstance(response, np.ndarray):
+                # Vectors go back as raw bytes, described in the metadata
+                reply.update(dtype=response.dtype.str, shape=list(response.shape))
+                body = response
+            else:
+                body = json.dumps(response).encode('utf-8')
+            timings["serialize"] = elapsed_ms(start)
+            protocol.send(RESPONSE, request_id, reply, body)
+        except Exception as e:
+            print(f"❌ Failed to process request {request_id} from {protocol.peer}: {e}")
+            protocol.send(ERROR, request_id, {"status": "error", "error": str(e)})
+
+    async def handle_legacy_request(self, protocol, audio_data):
+        # Old clients can't probe readiness, so they just wait for the warm-up
+        await self.ready.wait()
+        try:
+            async with self.slots:
+                response = await process_audio(audio_data)
+        except Exception as e:
+            print(f"❌ Failed to process request from {protocol.peer}: {e}")
+            response = {"error": str(e)}
+
+        # Send identified bird back and close, as old clients read until EOF
+        protocol.transport.write(json.dumps(response).encode('utf-8'))
+        protocol.transport.close()
+
+    async def shutdown(self):
+        print("🛑 Shutting down, no longer accepting connections")
+        self.server.close()
+
+        if self.tasks:
+            print(f"Waiting for {len(self.tasks)} in-flight requests")
+            _, pending = await asyncio.wait(set(self.tasks), timeout=SHUTDOWN_GRACE_SECONDS)
+            for task in pending:
+                task.cancel()
+
+        for protocol in list(self.protocols):
+            protocol.transport.close()
+        await self.server.wait_closed()
+
+        scheduler.stop()
+        species_catalog.flush()
+        for executor in (decode_executor, inference_executor, lookup_executor):
+            executor.shutdown(wait=False)
+
+
+async def serve():
+    # Listen first so readiness probes get an answer while the model loads
+    server = InferenceServer()
+    await server.start()
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    def on_warm_up_done(task):
+        if not task.cancelled() and task.exception() is not None:
+            print(f"❌ Startup failed: {task.exception()}")
+            stop.set()
+
+    warm_up = asyncio.ensure_future(server.warm_up())
+    warm_up.add_done_callback(on_warm_up_done)
+
+    await stop.wait()
+    warm_up.cancel()
+    await server.shutdown()
+    if not server.ready.is_set():
+        raise SystemExit(1)
+
+
+def start_server():
+    asyncio.run(serve())
 
 def convert_bytes_to_MP3(audio_data):
     audio_file = BytesIO(audio_data)
@@ -78,4 +479,5 @@ def convert_bytes_to_MP3(audio_data):
     # Return MP3 data
     return output.read()
 
-start_server()
+if __name__ == "__main__":
+    start_server()
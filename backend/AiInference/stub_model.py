@@ -0,0 +1,43 @@
+import os
+import time
+
+import numpy as np
+
+# Simulated forward pass cost, so benchmarks see a model-shaped latency without TensorFlow
+STUB_MODEL_CALL_MS = float(os.getenv("STUB_MODEL_CALL_MS", "0"))
+STUB_MODEL_ROW_MS = float(os.getenv("STUB_MODEL_ROW_MS", "0"))
+
+FEATURE_BANDS = 32
+EMBEDDING_SIZE = 1280
+
+
+class StubModel:
+    # Drop-in for the Perch SavedModel: same infer_tf signature and output heads, deterministic logits
+    def __init__(self, head_sizes, seed=0, call_ms=STUB_MODEL_CALL_MS, row_ms=STUB_MODEL_ROW_MS):
+        rng = np.random.default_rng(seed)
+        self.projections = {
+            head: rng.standard_normal((FEATURE_BANDS, size)).astype(np.float32)
+            for head, size in head_sizes.items()
+        }
+        self.embedding_projection = rng.standard_normal((FEATURE_BANDS, EMBEDDING_SIZE)).astype(np.float32)
+        self.call_ms = call_ms
+        self.row_ms = row_ms
+
+    def features(self, waveform_batch):
+        # Log energy in equal slices of each window: cheap, and different clips give different classes
+        batch = np.asarray(waveform_batch, dtype=np.float32)
+        usable = batch.shape[1] - batch.shape[1] % FEATURE_BANDS
+        bands = batch[:, :usable].reshape(len(batch), FEATURE_BANDS, -1)
+        energy = np.log1p(np.square(bands).mean(axis=2) * 1000.0)
+        return energy - energy.mean(axis=1, keepdims=True)
+
+    def infer_tf(self, waveform_batch):
+        start = time.perf_counter()
+        features = self.features(waveform_batch)
+        outputs = {head: features @ projection * 4.0 for head, projection in self.projections.items()}
+        outputs["embedding"] = np.tanh(features @ self.embedding_projection)
+
+        delay = (self.call_ms + self.row_ms * len(features)) / 1000.0 - (time.perf_counter() - start)
+        if delay > 0:
+            time.sleep(delay)
+        return outputs
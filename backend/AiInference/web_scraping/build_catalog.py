@@ -0,0 +1,176 @@
+"""Build the species catalog offline for every eBird code in label.csv.
+
+Run from backend/AiInference:
+
+    python -m web_scraping.build_catalog                        # fetch from ebird.org
+    python -m web_scraping.build_catalog --save-html pages/     # ...and keep the pages
+    python -m web_scraping.build_catalog --html-dir pages/      # rebuild from saved pages, no network
+
+Codes already in the output catalog are skipped, so an interrupted build resumes where it stopped.
+"""
+import argparse
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from web_scraping.ebird_scraper import EBIRD_SPECIES_URL, HEADERS, REQUEST_TIMEOUT_SECONDS, parse_species_page
+
+
+class RateLimiter:
+    def __init__(self, requests_per_second):
+        self.interval = 1.0 / requests_per_second if requests_per_second > 0 else 0.0
+        self.next_slot = time.monotonic()
+        self.lock = threading.Lock()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_slot)
+            self.next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+def load_codes(labels_path):
+    with open(labels_path, 'r') as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+def load_existing(catalog_path):
+    try:
+        with open(catalog_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def write_catalog(catalog, catalog_path):
+    temp_path = f"{catalog_path}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(catalog, f, ensure_ascii=False, separators=(",", ":"), sort_keys=True)
+    os.replace(temp_path, catalog_path)
+
+
+def make_session(pool_size):
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=2)
+    session.mount("https://", adapter)
+    session.headers.update(HEADERS)
+    return session
+
+
+def fetch_page(code, session, rate_limiter, save_html_dir=None):
+    rate_limiter.wait()
+    response = session.get(EBIRD_SPECIES_URL.format(code), timeout=REQUEST_TIMEOUT_SECONDS)
+    if response.status_code != 200:
+        raise RuntimeError(f"Status Code: {response.status_code}")
+
+    if save_html_dir:
+        with open(os.path.join(save_html_dir, f"{code}.html"), 'w', encoding='utf-8') as f:
+            f.write(response.text)
+    return response.text
+
+
+def read_page(code, html_dir):
+    path = os.path.join(html_dir, f"{code}.html")
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"No saved page {path}")
+    with open(path, 'r', encoding='utf-8') as f:
+        return f.read()
+
+
+def build_catalog(
+        labels_path="label.csv",
+        catalog_path="bird_data.json",
+        html_dir=None,
+        save_html_dir=None,
+        workers=8,
+        requests_per_second=4.0,
+        checkpoint_every=100,
+        limit=None
+):
+    codes = load_codes(labels_path)
+    catalog = load_existing(catalog_path)
+    todo = [code for code in codes if code not in catalog]
+    if limit:
+        todo = todo[:limit]
+    print(f"📚 {len(catalog)} species already in {catalog_path}, {len(todo)} to go")
+
+    if save_html_dir:
+        os.makedirs(save_html_dir, exist_ok=True)
+
+    session = make_session(workers) if html_dir is None else None
+    rate_limiter = RateLimiter(requests_per_second)
+
+    def load(code):
+        if html_dir is not None:
+            html = read_page(code, html_dir)
+        else:
+            html = fetch_page(code, session, rate_limiter, save_html_dir)
+        return parse_species_page(html)
+
+    failures = {}
+    done_since_checkpoint = 0
+    start = time.monotonic()
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(load, code): code for code in todo}
+        for future in as_completed(futures):
+            code = futures[future]
+            try:
+                catalog[code] = future.result()
+            except Exception as e:
+                failures[code] = str(e)
+                continue
+
+            done_since_checkpoint += 1
+            if done_since_checkpoint >= checkpoint_every:
+                write_catalog(catalog, catalog_path)
+                done_since_checkpoint = 0
+                elapsed = time.monotonic() - start
+                print(f"💾 {len(catalog)} species saved ({len(failures)} failed, {elapsed:.0f} s)")
+
+    write_catalog(catalog, catalog_path)
+    if failures:
+        failures_path = f"{catalog_path}.failures.json"
+        with open(failures_path, 'w', encoding='utf-8') as f:
+            json.dump(failures, f, indent=2)
+        print(f"❌ {len(failures)} species failed, see {failures_path}")
+
+    print(f"✅ Catalog has {len(catalog)} species in {time.monotonic() - start:.0f} s")
+    return catalog, failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build bird_data.json for every code in label.csv")
+    parser.add_argument("--labels", default="label.csv")
+    parser.add_argument("--output", default="bird_data.json")
+    parser.add_argument("--html-dir", help="parse saved <code>.html pages instead of fetching")
+    parser.add_argument("--save-html", help="also store fetched pages here for offline rebuilds")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--rate", type=float, default=4.0, help="max requests per second to ebird.org")
+    parser.add_argument("--checkpoint-every", type=int, default=100)
+    parser.add_argument("--limit", type=int, help="only process this many missing codes")
+    args = parser.parse_args()
+
+    build_catalog(
+        labels_path=args.labels,
+        catalog_path=args.output,
+        html_dir=args.html_dir,
+        save_html_dir=args.save_html,
+        workers=args.workers,
+        requests_per_second=args.rate,
+        checkpoint_every=args.checkpoint_every,
+        limit=args.limit,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -3,15 +3,21 @@ import json
 import requests
 from bs4 import BeautifulSoup
 
-def scrape_ebird_species(ebird_species_id):
-    url = f"https://ebird.org/species/{ebird_species_id}"
-    headers = {'User-Agent': 'Mozilla/5.0'}
-    response = requests.get(url, headers=headers)
+EBIRD_SPECIES_URL = "https://ebird.org/species/{}"
+HEADERS = {'User-Agent': 'Mozilla/5.0'}
+REQUEST_TIMEOUT_SECONDS = 10
+
+def scrape_ebird_species(ebird_species_id, session=None):
+    url = EBIRD_SPECIES_URL.format(ebird_species_id)
+    response = (session or requests).get(url, headers=HEADERS, timeout=REQUEST_TIMEOUT_SECONDS)
 
     if response.status_code != 200:
         return f"Error, Status Code: {response.status_code})"
 
-    soup = BeautifulSoup(response.text, 'html.parser')
+    return parse_species_page(response.text)
+
+def parse_species_page(html):
+    soup = BeautifulSoup(html, 'html.parser')
 
     # Extract common name and scientific name
     species_header = soup.find('h1', {'id': 'content'})
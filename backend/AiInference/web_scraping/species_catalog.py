@@ -0,0 +1,165 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from web_scraping.ebird_scraper import scrape_ebird_species
+
+CATALOG_PATH = os.getenv("SPECIES_CATALOG_PATH", "bird_data.json")
+CACHE_SIZE = int(os.getenv("SPECIES_CACHE_SIZE", "2048"))
+CACHE_TTL_SECONDS = float(os.getenv("SPECIES_CACHE_TTL_SECONDS", str(24 * 3600)))
+NEGATIVE_TTL_SECONDS = float(os.getenv("SPECIES_NEGATIVE_TTL_SECONDS", "600"))
+FLUSH_BATCH_SIZE = int(os.getenv("SPECIES_FLUSH_BATCH_SIZE", "25"))
+FLUSH_INTERVAL_SECONDS = float(os.getenv("SPECIES_FLUSH_INTERVAL_SECONDS", "300"))
+# With a catalog built offline (web_scraping/build_catalog.py) the request path never needs to scrape
+LIVE_SCRAPE = os.getenv("SPECIES_LIVE_SCRAPE", "1") == "1"
+
+
+class SpeciesCatalog:
+    def __init__(
+            self,
+            path=CATALOG_PATH,
+            scrape=scrape_ebird_species,
+            cache_size=CACHE_SIZE,
+            ttl=CACHE_TTL_SECONDS,
+            negative_ttl=NEGATIVE_TTL_SECONDS,
+            flush_batch_size=FLUSH_BATCH_SIZE,
+            flush_interval=FLUSH_INTERVAL_SECONDS,
+            live_scrape=LIVE_SCRAPE
+    ):
+        self.path = path
+        self.scrape = scrape
+        self.cache_size = cache_size
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.flush_batch_size = flush_batch_size
+        self.flush_interval = flush_interval
+        self.live_scrape = live_scrape
+
+        # eBird code -> species info, loaded from disk once
+        self.species = {}
+        self.loaded = False
+        # Live scrape results: eBird code -> (expires_at, info, ok), in LRU order
+        self.cache = OrderedDict()
+        # Scraped entries not yet written back to the catalog file
+        self.unsaved = {}
+        self.last_flush = time.monotonic()
+
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+
+        self.catalog_hits = 0
+        self.cache_hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.scrape_failures = 0
+
+    def load(self):
+        start = time.perf_counter()
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                species = json.load(f)
+        except FileNotFoundError:
+            species = {}
+
+        with self.lock:
+            self.species = species
+            self.loaded = True
+
+        elapsed = (time.perf_counter() - start) * 1000
+        print(f"✅ Loaded {len(species)} species from {self.path} in {elapsed:.1f} ms")
+        return self
+
+    def get(self, ebird_species_id):
+        if not self.loaded:
+            self.load()
+
+        now = time.monotonic()
+        with self.lock:
+            info = self.species.get(ebird_species_id)
+            if info is not None:
+                self.catalog_hits += 1
+                return info
+
+            cached = self.cache.get(ebird_species_id)
+            if cached is not None:
+                expires_at, info, ok = cached
+                if expires_at > now:
+                    self.cache.move_to_end(ebird_species_id)
+                    if ok:
+                        self.cache_hits += 1
+                    else:
+                        self.negative_hits += 1
+                    return info
+                del self.cache[ebird_species_id]
+
+            self.misses += 1
+            if not self.live_scrape:
+                return f"Error, {ebird_species_id} is not in the species catalog"
+
+        # Scrape outside the lock so other lookups are not held up by the network
+        try:
+            info = self.scrape(ebird_species_id)
+        except Exception as e:
+            info = f"Error: {e}"
+        ok = isinstance(info, dict)
+
+        with self.lock:
+            ttl = self.ttl if ok else self.negative_ttl
+            self.cache[ebird_species_id] = (now + ttl, info, ok)
+            self.cache.move_to_end(ebird_species_id)
+            while len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+
+            if ok:
+                self.unsaved[ebird_species_id] = info
+            else:
+                self.scrape_failures += 1
+
+            should_flush = len(self.unsaved) >= self.flush_batch_size or (
+                    self.unsaved and now - self.last_flush >= self.flush_interval
+            )
+
+        if should_flush:
+            self.flush()
+        return info
+
+    def flush(self):
+        # One writer at a time; the file is replaced atomically so readers never see half a catalog
+        with self.flush_lock:
+            with self.lock:
+                if not self.unsaved:
+                    return 0
+                batch, self.unsaved = self.unsaved, {}
+                self.species.update(batch)
+                snapshot = dict(self.species)
+                self.last_flush = time.monotonic()
+
+            temp_path = f"{self.path}.tmp"
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(snapshot, f, ensure_ascii=False, separators=(",", ":"))
+            os.replace(temp_path, self.path)
+
+        print(f"💾 Saved {len(batch)} new species to {self.path}")
+        return len(batch)
+
+    def stats(self):
+        with self.lock:
+            lookups = self.catalog_hits + self.cache_hits + self.negative_hits + self.misses
+            hits = self.catalog_hits + self.cache_hits + self.negative_hits
+            return {
+                "species": len(self.species),
+                "cached": len(self.cache),
+                "unsaved": len(self.unsaved),
+                "lookups": lookups,
+                "catalog_hits": self.catalog_hits,
+                "cache_hits": self.cache_hits,
+                "negative_hits": self.negative_hits,
+                "misses": self.misses,
+                "scrape_failures": self.scrape_failures,
+                "hit_rate": hits / lookups if lookups else 0.0,
+            }
+
+
+species_catalog = SpeciesCatalog()
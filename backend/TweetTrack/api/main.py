@@ -1,12 +1,36 @@
+import asyncio
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 
-from routers import birds, locations, classify, auth, observations
+from audio.decoding import shutdown_decoders
+from db import async_engine
+from db_pool import PoolRouteMiddleware
+from imaging.renditions import shutdown_image_workers
+from inference.ai_client import ai_client
+from routers import birds, locations, classify, classify_stream, auth, observations, database
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Classification requests wait on this; the rest of the API serves right away
+    readiness = asyncio.ensure_future(ai_client.wait_until_ready(timeout=None))
+    yield
+    readiness.cancel()
+    await ai_client.close()
+    shutdown_decoders()
+    shutdown_image_workers()
+    await async_engine.dispose()
 
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
+# Lets slow database pool checkouts name the route that waited
+app.add_middleware(PoolRouteMiddleware)
 
 app.include_router(birds.router)
 app.include_router(locations.router)
 app.include_router(classify.router)
+app.include_router(classify_stream.router)
 app.include_router(auth.router)
 app.include_router(observations.router)
+app.include_router(database.router)
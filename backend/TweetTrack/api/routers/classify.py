@@ -1,154 +1,128 @@
-from fastapi import APIRouter, UploadFile, File
-from pydub import AudioSegment
-import json
-import socket
+from fastapi import APIRouter, UploadFile, File, HTTPException, Query, Response
+from typing import List, Optional
 import asyncio
-import tempfile
 import os
 import io
-import librosa
-from scipy import signal
+import time
 import soundfile as sf
 import numpy as np
 
-router = APIRouter()
-
-AI_HOST = "model-inference"
-AI_PORT = 9000
-
-
-@router.post("/classify")
-async def upload_sound_file(file: UploadFile = File(...)):
-    try:
-        audio_bytes = await file.read()
-        file_extension = os.path.splitext(file.filename)[1].lower()
-
-        supported_formats = {".m4a": "m4a", ".wav": "wav", ".flac": "flac", ".ogg": "ogg", ".mp3": "mp3"}
+from audio.augment import NOISE_TYPES, highpass_rows, noise_rows, sweep_variants
+from audio.decoding import PCM_SAMPLE_RATE, decode_to_pcm_async, encode_mp3
+from cache.result_cache import pcm_digest, result_cache, upload_digest
+from inference.ai_client import ai_client
 
-        if file_extension in supported_formats:
-            with tempfile.NamedTemporaryFile(delete=False, suffix=file_extension) as temp_file:
-                temp_file.write(audio_bytes)
-                temp_path = temp_file.name
+router = APIRouter()
 
-            try:
-                audio = AudioSegment.from_file(temp_path, format=supported_formats[file_extension])
-                mp3_buffer = io.BytesIO()
-                audio.export(mp3_buffer, format="mp3")
-                mp3_buffer.seek(0)
-                audio_bytes = mp3_buffer.read()
-            except Exception as e:
-                print(f"❌ Conversion error: {str(e)}")
-                raise
-            finally:
-                if os.path.exists(temp_path):
-                    os.remove(temp_path)
+# "pcm" ships the decoded samples; "mp3" re-encodes them for AI services that only take MP3
+CLASSIFY_PIPELINE = os.getenv("CLASSIFY_PIPELINE", "pcm")
 
-        data_size = len(audio_bytes)
-        client_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        client_socket.connect((AI_HOST, AI_PORT))
+# Robustness sweeps: every variant is held in memory and classified in one batch, so both are bounded
+SWEEP_MAX_VARIANTS = int(os.getenv("SWEEP_MAX_VARIANTS", "64"))
+SWEEP_MAX_SECONDS = float(os.getenv("SWEEP_MAX_SECONDS", "30"))
 
-        client_socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 65536)
-        client_socket.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 65536)
 
-        print("📡 sending")
-        client_socket.sendall(f"{data_size:010}".encode())
+def elapsed_ms(start):
+    return round((time.perf_counter() - start) * 1000, 3)
 
-        await send_data(client_socket, audio_bytes)
 
-        response = client_socket.recv(1024).decode("utf-8")
-        client_socket.close()
+def server_timing(timings: dict) -> str:
+    # Standard Server-Timing header, so per-stage latency shows up in browser dev tools and benchmarks
+    return ", ".join(f"{stage};dur={ms}" for stage, ms in timings.items())
 
-        bird_data = json.loads(response)
 
+@router.post("/classify")
+async def upload_sound_file(
+        response: Response,
+        file: UploadFile = File(...),
+        top_k: int = Query(5, ge=1, le=50),
+        temperature: float = Query(1.0, gt=0),
+        min_score: float = Query(0.0, ge=0, le=1),
+        gate: Optional[bool] = Query(None, description="Skip silent and noise-only windows (server default if unset)"),
+        gate_min_db: Optional[float] = Query(None, le=0),
+        gate_max_flatness: Optional[float] = Query(None, gt=0, le=1)
+):
+    timings = {}
+    try:
+        start = time.perf_counter()
+        audio_bytes = await file.read()
+        file_extension = os.path.splitext(file.filename)[1].lower()
+        options = {"top_k": top_k, "temperature": temperature, "min_score": min_score}
+        # Gating settings only go out when given, so the AI service defaults apply otherwise
+        gating = {"gate": gate, "gate_min_db": gate_min_db, "gate_max_flatness": gate_max_flatness}
+        options.update({key: value for key, value in gating.items() if value is not None})
+        cache_options = {**options, "pipeline": CLASSIFY_PIPELINE}
+        timings["read"] = elapsed_ms(start)
+
+        # The same upload is served from the cache before it is even decoded
+        start = time.perf_counter()
+        model_version = await ai_client.get_model_version()
+        upload_key = result_cache.key("upload", upload_digest(audio_bytes), model_version,
+                                      {**cache_options, "format": file_extension})
+        bird_data = await result_cache.get("upload", upload_key)
+        timings["cache"] = elapsed_ms(start)
+        if bird_data is not None:
+            return bird_data
+
+        # Decode and resample once, in memory and off the event loop
+        start = time.perf_counter()
+        waveform = await decode_to_pcm_async(audio_bytes, file_extension)
+        timings["decode"] = elapsed_ms(start)
+
+        # A re-encoded or renamed copy of a known recording decodes to the same samples
+        start = time.perf_counter()
+        pcm_key = result_cache.key("pcm", pcm_digest(waveform), model_version, cache_options)
+        bird_data = await result_cache.get("pcm", pcm_key)
+        timings["cache"] += elapsed_ms(start)
+        if bird_data is not None:
+            await result_cache.put([upload_key], bird_data)
+            return bird_data
+
+        start = time.perf_counter()
+        if CLASSIFY_PIPELINE == "pcm":
+            bird_data = await ai_client.classify_pcm(waveform, PCM_SAMPLE_RATE, options, timings)
+        else:
+            mp3_bytes = encode_mp3(waveform)
+            timings["encode"] = elapsed_ms(start)
+            start = time.perf_counter()
+            bird_data = await ai_client.classify(mp3_bytes, content_type="audio/mpeg", options=options,
+                                                timings=timings)
+        timings["ai"] = elapsed_ms(start)
+
+        # Species lookup failures can be transient, so only complete results are kept
+        if "error" not in bird_data and ai_client.model_version == model_version:
+            await result_cache.put([upload_key, pcm_key], bird_data)
         return bird_data
     except Exception as e:
         return {"error": str(e), "detail": "Failed to process audio file"}
+    finally:
+        response.headers["Server-Timing"] = server_timing(timings)
 
 
-async def send_data(client_socket, data):
-    loop = asyncio.get_running_loop()
-    await loop.sock_sendall(client_socket, data)
+@router.get("/classify/ready")
+async def classify_ready(response: Response):
+    try:
+        info = await ai_client.readiness()
+    except Exception as e:
+        info = {"ready": False, "error": str(e)}
+    if not info.get("ready"):
+        response.status_code = 503
+    return info
 
 
-def apply_highpass_filter(mp3_buffer, cutoff_freq=1000, sample_rate=None, order=4):
-    y, sr = librosa.load(mp3_buffer, sr=sample_rate, mono=True)
-    nyquist = 0.5 * sr
-    normalized_cutoff = cutoff_freq / nyquist
-    b, a = signal.butter(order, normalized_cutoff, btype='high')
-    filtered_audio = signal.filtfilt(b, a, y)
+@router.get("/classify/cache")
+async def classify_cache_stats():
+    return {"model_version": ai_client.model_version, **result_cache.stats()}
+
+
+def apply_highpass_filter(y, sr, cutoff_freq=1000, order=4):
+    filtered_audio = highpass_rows(y, sr, cutoff_freq, order)
     return filtered_audio, sr
 
 
-def add_noise(audio_buffer, noise_level=0.005, noise_type='white', sample_rate=None):
-    # Load the audio
-    y, sr = librosa.load(audio_buffer, sr=sample_rate, mono=True)
-
-    if noise_type == 'white':
-        # White noise: equal energy across all frequencies
-        noise = np.random.normal(0, noise_level, len(y))
-
-    elif noise_type == 'pink':
-        # Pink noise: decreasing energy with increasing frequency (1/f)
-        # Generate white noise first
-        white_noise = np.random.normal(0, noise_level, len(y))
-
-        # Apply 1/f filter to create pink noise
-        # Use FFT to convert to frequency domain
-        X = np.fft.rfft(white_noise)
-        S = np.arange(1, len(X) + 1)
-        S = np.sqrt(1 / S)  # 1/f spectrum
-        # Apply filter and inverse FFT
-        noise = np.fft.irfft(X * S, len(y))
-
-        # Normalize to have the same energy as specified by noise_level
-        noise = noise / np.std(noise) * noise_level
-
-    elif noise_type == 'brown':
-        # Brown noise: decreasing energy with increasing frequency (1/f²)
-        # Generate white noise first
-        white_noise = np.random.normal(0, noise_level, len(y))
-
-        # Apply 1/f² filter
-        X = np.fft.rfft(white_noise)
-        S = np.arange(1, len(X) + 1)
-        S = 1 / S  # 1/f² spectrum (actually 1/f when squared in power)
-        # Apply filter and inverse FFT
-        noise = np.fft.irfft(X * S, len(y))
-
-        # Normalize
-        noise = noise / np.std(noise) * noise_level
-
-    elif noise_type == 'blue':
-        # Blue noise: increasing energy with increasing frequency (f)
-        white_noise = np.random.normal(0, noise_level, len(y))
-        X = np.fft.rfft(white_noise)
-        S = np.arange(1, len(X) + 1)
-        S = np.sqrt(S) / np.mean(np.sqrt(S))  # f spectrum, normalized
-        noise = np.fft.irfft(X * S, len(y))
-        noise = noise / np.std(noise) * noise_level
-
-    elif noise_type == 'violet':
-        # Violet noise: increasing energy with increasing frequency (f²)
-        white_noise = np.random.normal(0, noise_level, len(y))
-        X = np.fft.rfft(white_noise)
-        S = np.arange(1, len(X) + 1)
-        S = S / np.mean(S)  # f² spectrum
-        noise = np.fft.irfft(X * S, len(y))
-        noise = noise / np.std(noise) * noise_level
-
-    elif noise_type == 'impulse':
-        # Impulse noise: random spikes
-        noise = np.zeros(len(y))
-        # Add random impulses (adjust density as needed)
-        impulse_density = 0.01  # Percentage of samples with impulses
-        impulse_count = int(len(y) * impulse_density)
-        impulse_positions = np.random.choice(len(y), impulse_count, replace=False)
-        impulse_values = np.random.uniform(-noise_level * 10, noise_level * 10, impulse_count)
-        noise[impulse_positions] = impulse_values
-
-    else:
-        raise ValueError(
-            f"Unsupported noise type: {noise_type}. Choose from 'white', 'pink', 'brown', 'blue', 'violet', or 'impulse'")
+def add_noise(y, sr, noise_level=0.005, noise_type='white'):
+    # Single-row case of the sweep's noise generator (white, pink, brown, blue, violet or impulse)
+    noise = noise_rows(len(y), [(noise_type, noise_level)], np.random.default_rng())[0]
 
     noisy_audio = y + noise
 
@@ -168,27 +142,12 @@ async def test_highpass_filter(
         file_extension = os.path.splitext(file.filename)[1].lower()
         original_filename = os.path.splitext(file.filename)[0]
 
-        if file_extension == ".m4a":
-            with tempfile.NamedTemporaryFile(delete=False, suffix=".m4a") as temp_file:
-                temp_file.write(audio_bytes)
-                temp_path = temp_file.name
-
-            try:
-                audio = AudioSegment.from_file(temp_path, format="m4a")
-                mp3_buffer = io.BytesIO()
-                audio.export(mp3_buffer, format="mp3")
-                mp3_buffer.seek(0)
-                audio_bytes = mp3_buffer.read()
-            except Exception as e:
-                print(f"❌ Conversion error: {str(e)}")
-                raise
-            finally:
-                if os.path.exists(temp_path):
-                    os.remove(temp_path)
+        y = await decode_to_pcm_async(audio_bytes, file_extension)
+        sr = PCM_SAMPLE_RATE
 
         # Apply high-pass filter
         filtered_audio, sr = apply_highpass_filter(
-            io.BytesIO(audio_bytes), cutoff_freq=cutoff_freq, order=order
+            y, sr, cutoff_freq=cutoff_freq, order=order
         )
 
         # Convert filtered audio back to bytes
@@ -210,21 +169,7 @@ async def test_highpass_filter(
 
         print(f"✅ Saved filtered audio to {output_path}")
 
-        data_size = len(filtered_bytes)
-        client_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        client_socket.connect((AI_HOST, AI_PORT))
-        client_socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 65536)
-        client_socket.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 65536)
-
-        print("📡 sending")
-        client_socket.sendall(f"{data_size:010}".encode())
-
-        await send_data(client_socket, filtered_bytes)
-
-        response = client_socket.recv(1024).decode("utf-8")
-        client_socket.close()
-
-        bird_data = json.loads(response)
+        bird_data = await ai_client.classify_pcm(filtered_audio.astype(np.float32), sr)
 
         return bird_data
     except Exception as e:
@@ -242,28 +187,12 @@ async def test_add_noise(
         file_extension = os.path.splitext(file.filename)[1].lower()
         original_filename = os.path.splitext(file.filename)[0]
 
-        # Convert M4A to MP3 if needed
-        if file_extension == ".m4a":
-            with tempfile.NamedTemporaryFile(delete=False, suffix=".m4a") as temp_file:
-                temp_file.write(audio_bytes)
-                temp_path = temp_file.name
-
-            try:
-                audio = AudioSegment.from_file(temp_path, format="m4a")
-                mp3_buffer = io.BytesIO()
-                audio.export(mp3_buffer, format="mp3")
-                mp3_buffer.seek(0)
-                audio_bytes = mp3_buffer.read()
-            except Exception as e:
-                print(f"❌ Conversion error: {str(e)}")
-                raise
-            finally:
-                if os.path.exists(temp_path):
-                    os.remove(temp_path)
+        y = await decode_to_pcm_async(audio_bytes, file_extension)
+        sr = PCM_SAMPLE_RATE
 
         # Apply noise to the audio
         noisy_audio, sr = add_noise(
-            io.BytesIO(audio_bytes),
+            y, sr,
             noise_level=noise_level,
             noise_type=noise_type
         )
@@ -288,22 +217,102 @@ async def test_add_noise(
         print(f"✅ Saved noisy audio to {output_path}")
 
         # Send to AI service
-        data_size = len(noisy_bytes)
-        client_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        client_socket.connect((AI_HOST, AI_PORT))
-        client_socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 65536)
-        client_socket.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 65536)
+        bird_data = await ai_client.classify_pcm(noisy_audio.astype(np.float32), sr)
 
-        print("📡 sending")
-        client_socket.sendall(f"{data_size:010}".encode())
+        return bird_data
+    except Exception as e:
+        return {"error": str(e), "detail": "Failed to process audio file"}
 
-        await send_data(client_socket, noisy_bytes)
 
-        response = client_socket.recv(1024).decode("utf-8")
-        client_socket.close()
+def save_sweep_audio(grid: np.ndarray, noise_labels: List[str], filter_labels: List[str], name: str) -> List[str]:
+    output_dir = os.path.join("sweep_audio", name)
+    os.makedirs(output_dir, exist_ok=True)
+    paths = []
+    for row, noise_label in enumerate(noise_labels):
+        for column, filter_label in enumerate(filter_labels):
+            path = os.path.join(output_dir, f"{name}_{noise_label}_{filter_label}.mp3")
+            with open(path, "wb") as f:
+                f.write(encode_mp3(grid[row, column]))
+            paths.append(path)
+    return paths
 
-        bird_data = json.loads(response)
 
-        return bird_data
+@router.post("/test-sweep/")
+async def test_robustness_sweep(
+        response: Response,
+        file: UploadFile = File(...),
+        noise_types: List[str] = Query([], description=f"Any of {', '.join(NOISE_TYPES)}"),
+        noise_levels: List[float] = Query([0.005]),
+        cutoff_freqs: List[int] = Query([]),
+        orders: List[int] = Query([4]),
+        seed: int = 0,
+        save: bool = False
+):
+    # Rows are noise settings (clean first), columns are high-pass settings (unfiltered first);
+    # the file is decoded once and every cell is classified in one batched call
+    # Query() constraints don't apply to list items, so the grid is checked here
+    for noise_type in noise_types:
+        if noise_type not in NOISE_TYPES:
+            raise HTTPException(status_code=400, detail=f"Unsupported noise type: {noise_type}")
+    if any(level <= 0 for level in noise_levels):
+        raise HTTPException(status_code=400, detail="Noise levels must be positive")
+    if any(not 0 < cutoff < PCM_SAMPLE_RATE // 2 for cutoff in cutoff_freqs):
+        raise HTTPException(status_code=400, detail=f"Cutoffs must be between 0 and {PCM_SAMPLE_RATE // 2} Hz")
+    if any(not 1 <= order <= 12 for order in orders):
+        raise HTTPException(status_code=400, detail="Filter orders must be between 1 and 12")
+    noise = [(noise_type, level) for noise_type in noise_types for level in noise_levels]
+    filters = [(cutoff, order) for cutoff in cutoff_freqs for order in orders]
+    variants = (len(noise) + 1) * (len(filters) + 1)
+    if variants > SWEEP_MAX_VARIANTS:
+        raise HTTPException(status_code=400,
+                            detail=f"{variants} variants requested, at most {SWEEP_MAX_VARIANTS} allowed")
+
+    timings = {}
+    try:
+        start = time.perf_counter()
+        audio_bytes = await file.read()
+        file_extension = os.path.splitext(file.filename)[1].lower()
+        waveform = await decode_to_pcm_async(audio_bytes, file_extension)
+        waveform = waveform[:int(SWEEP_MAX_SECONDS * PCM_SAMPLE_RATE)]
+        timings["decode"] = elapsed_ms(start)
+
+        start = time.perf_counter()
+        grid = await asyncio.to_thread(sweep_variants, waveform, PCM_SAMPLE_RATE, noise, filters, seed)
+        timings["augment"] = elapsed_ms(start)
+
+        start = time.perf_counter()
+        # Gating off so every variant is scored on the same windows
+        results = await ai_client.classify_pcm_batch(
+            grid.reshape(variants, -1), PCM_SAMPLE_RATE, {"top_k": 3, "gate": False}, timings
+        )
+        timings["ai"] = elapsed_ms(start)
+
+        noise_labels = ["clean"] + [f"{noise_type}_{level:g}" for noise_type, level in noise]
+        filter_labels = ["unfiltered"] + [f"highpass_{cutoff}Hz_order{order}" for cutoff, order in filters]
+        columns = len(filter_labels)
+        sweep = {
+            "seconds": round(len(waveform) / PCM_SAMPLE_RATE, 3),
+            "noise": noise_labels,
+            "filters": filter_labels,
+            # predictions[noise row][filter column]
+            "predictions": [
+                [
+                    {key: result[key] for key in ("label", "probability", "genus", "family", "order", "top_k")}
+                    for result in results[row * columns:(row + 1) * columns]
+                ]
+                for row in range(len(noise_labels))
+            ],
+        }
+
+        if save:
+            start = time.perf_counter()
+            name = os.path.splitext(os.path.basename(file.filename))[0]
+            sweep["files"] = await asyncio.to_thread(save_sweep_audio, grid, noise_labels, filter_labels, name)
+            timings["save"] = elapsed_ms(start)
+            print(f"✅ Saved {len(sweep['files'])} sweep variants to sweep_audio/{name}")
+
+        return sweep
     except Exception as e:
-        return {"error": str(e), "detail": "Failed to process audio file"}
\ No newline at end of file
+        return {"error": str(e), "detail": "Failed to process audio file"}
+    finally:
+        response.headers["Server-Timing"] = server_timing(timings)
@@ -0,0 +1,88 @@
+import asyncio
+import json
+import os
+
+from fastapi import APIRouter, Query, WebSocket, WebSocketDisconnect
+
+from audio.decoding import PCM_SAMPLE_RATE
+from inference.streaming import STREAM_HOP_SECONDS, ClassificationStream, StreamError
+
+router = APIRouter()
+
+# Each open stream holds a ring buffer and may have one inference in flight
+STREAM_MAX_STREAMS = int(os.getenv("STREAM_MAX_STREAMS", "64"))
+active_streams = 0
+
+
+@router.websocket("/classify/stream")
+async def classify_stream(
+        websocket: WebSocket,
+        sample_rate: int = Query(PCM_SAMPLE_RATE, ge=8000, le=192000),
+        dtype: str = Query("<f4"),
+        top_k: int = Query(5, ge=1, le=50),
+        hop_seconds: float = Query(STREAM_HOP_SECONDS, ge=0.5, le=5.0),
+        min_score: float = Query(0.0, ge=0, le=1)
+):
+    # Binary messages are raw mono PCM chunks; a {"type": "stop"} text message ends the stream with the final result
+    global active_streams
+    if active_streams >= STREAM_MAX_STREAMS:
+        await websocket.close(code=1013, reason="Too many streams, try again later")
+        return
+
+    await websocket.accept()
+    active_streams += 1
+    worker = None
+    try:
+        stream = ClassificationStream(sample_rate, dtype, top_k, hop_seconds, min_score)
+
+        audio_arrived = asyncio.Event()
+        stopping = False
+
+        async def classify_loop():
+            # Runs next to the receive loop so recording never waits for the model
+            while not stopping:
+                await audio_arrived.wait()
+                audio_arrived.clear()
+                while stream.window_due():
+                    await websocket.send_json(await stream.classify_latest())
+
+        worker = asyncio.ensure_future(classify_loop())
+
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                return
+            if worker.done():
+                # Surface inference failures instead of silently dropping predictions
+                worker.result()
+
+            if message.get("bytes") is not None:
+                stream.feed(message["bytes"])
+                audio_arrived.set()
+            elif message.get("text") is not None:
+                command = json.loads(message["text"])
+                if command.get("type") == "stop":
+                    break
+
+        # Let the window in flight finish, then cover whatever arrived after it
+        stream.finish()
+        stopping = True
+        audio_arrived.set()
+        await worker
+        if stream.tail_pending():
+            await websocket.send_json(await stream.classify_latest())
+
+        await websocket.send_json(stream.final())
+        await websocket.close()
+    except WebSocketDisconnect:
+        pass
+    except (StreamError, ValueError) as e:
+        await websocket.send_json({"type": "error", "error": str(e)})
+        await websocket.close(code=1003)
+    except Exception as e:
+        await websocket.send_json({"type": "error", "error": str(e), "detail": "Failed to classify stream"})
+        await websocket.close(code=1011)
+    finally:
+        active_streams -= 1
+        if worker is not None and not worker.done():
+            worker.cancel()
@@ -0,0 +1,12 @@
+from fastapi import APIRouter, Depends
+
+from auth.auth_utils import get_current_user
+from db_pool import async_pool_metrics, sync_pool_metrics
+
+# Pool sizes and per-route timings are operational details, only for signed-in users
+router = APIRouter(dependencies=[Depends(get_current_user)])
+
+
+@router.get("/db/pool")
+async def database_pool_stats():
+    return {"sync": sync_pool_metrics.stats(), "async": async_pool_metrics.stats()}
@@ -1,18 +1,18 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
 import uuid
 
-from db import get_db
-from models.birdLocationDTO import BirdLocationDTO
-from repositories.bird_location_repository import BirdLocationRepository
-from services.bird_location_service import BirdLocationService
+from db import get_async_db
+from models.birdLocationDTO import BirdLocationAreaDTO, BirdLocationDTO
+from repositories.bird_location_repository import AsyncBirdLocationRepository
+from services.bird_location_service import LOCATION_AREA_MAX_RESULTS, BirdLocationService
 
 router = APIRouter()
 
 
-def get_bird_location_service(db: Session = Depends(get_db)) -> BirdLocationService:
-    location_repo = BirdLocationRepository(db)
+def get_bird_location_service(db: AsyncSession = Depends(get_async_db)) -> BirdLocationService:
+    location_repo = AsyncBirdLocationRepository(db)
     return BirdLocationService(location_repo=location_repo)
 
 
@@ -22,7 +22,7 @@ async def get_locations(
     offset: int = Query(0, ge=0),
     service: BirdLocationService = Depends(get_bird_location_service)
 ):
-    return service.get_all_locations(limit=limit, offset=offset)
+    return await service.get_all_locations(limit=limit, offset=offset)
 
 
 @router.get("/location/bird/{bird_id}", response_model=List[BirdLocationDTO])
@@ -30,26 +30,31 @@ async def get_locations_by_bird_id(
     bird_id: uuid.UUID,
     service: BirdLocationService = Depends(get_bird_location_service)
 ):
-    return service.get_locations_by_bird_id(bird_id)
+    return await service.get_locations_by_bird_id(bird_id)
 
 
-@router.get("/location/{location_id}", response_model=BirdLocationDTO)
-async def get_location_by_id(
-    location_id: uuid.UUID,
+# Declared before /location/{location_id}, which would otherwise take "area" as an id
+@router.get("/location/area", response_model=BirdLocationAreaDTO)
+async def get_locations_in_area(
+    min_lat: float = Query(..., ge=-90, le=90, description="Minimum latitude"),
+    max_lat: float = Query(..., ge=-90, le=90, description="Maximum latitude"),
+    min_lng: float = Query(..., ge=-180, le=180, description="Minimum longitude (west edge)"),
+    max_lng: float = Query(..., ge=-180, le=180, description="Maximum longitude (east edge, below min_lng across 180°)"),
+    limit: int = Query(LOCATION_AREA_MAX_RESULTS, ge=1, le=LOCATION_AREA_MAX_RESULTS),
     service: BirdLocationService = Depends(get_bird_location_service)
 ):
     try:
-        return service.get_location_by_id(location_id)
+        return await service.get_locations_in_area(min_lat, max_lat, min_lng, max_lng, limit)
     except ValueError as e:
-        raise HTTPException(status_code=404, detail=str(e))
+        raise HTTPException(status_code=400, detail=str(e))
 
 
-@router.get("/location/area", response_model=List[BirdLocationDTO])
-async def get_locations_in_area(
-    min_lat: float = Query(..., description="Minimum latitude"),
-    max_lat: float = Query(..., description="Maximum latitude"),
-    min_lng: float = Query(..., description="Minimum longitude"),
-    max_lng: float = Query(..., description="Maximum longitude"),
+@router.get("/location/{location_id}", response_model=BirdLocationDTO)
+async def get_location_by_id(
+    location_id: uuid.UUID,
     service: BirdLocationService = Depends(get_bird_location_service)
 ):
-    return service.get_locations_in_area(min_lat, max_lat, min_lng, max_lng)
\ No newline at end of file
+    try:
+        return await service.get_location_by_id(location_id)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
@@ -1,6 +1,7 @@
-from fastapi import APIRouter, Depends, status, UploadFile, File, Form
+from fastapi import APIRouter, BackgroundTasks, Depends, Header, Query, Request, Response, status, UploadFile, File
+from starlette.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
-from typing import List, Optional
+from typing import List, Literal, Optional
 import uuid
 
 from db_tables import User
@@ -11,7 +12,10 @@ from repositories.bird_image_repository import BirdImageRepository
 
 from repositories.bird_repository import BirdRepository
 from repositories.bird_sound_repository import BirdSoundRepository
+from repositories.sound_embedding_repository import SoundEmbeddingRepository
 from services.observation_service import BirdObservationService, BirdImageService, BirdSoundService
+from services.similarity_service import SoundSimilarityService, embed_recording
+from storage.uploads import multipart_body_schema
 
 router = APIRouter()
 
@@ -47,6 +51,16 @@ def get_bird_sound_service(
     return BirdSoundService(bird_repo, sound_repo)
 
 
+def get_sound_embedding_repository(db: Session = Depends(get_db)) -> SoundEmbeddingRepository:
+    return SoundEmbeddingRepository(db)
+
+
+def get_sound_similarity_service(
+    embedding_repo: SoundEmbeddingRepository = Depends(get_sound_embedding_repository)
+) -> SoundSimilarityService:
+    return SoundSimilarityService(embedding_repo)
+
+
 # Bird Observations
 @router.post("/observations", response_model=BirdObservationResponse, status_code=status.HTTP_201_CREATED)
 def create_bird_observation(
@@ -57,22 +71,34 @@ def create_bird_observation(
     return service.create_bird_observation(observation, current_user)
 
 
+# Newest first. The body stays a plain list; X-Next-Cursor carries the cursor for the next page, if any.
+# skip still works but is slow on deep pages, cursor is the way to page through everything
 @router.get("/observations", response_model=List[BirdObservationResponse])
 def get_user_bird_observations(
-    skip: int = 0,
-    limit: int = 100,
+    response: Response,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
     service: BirdObservationService = Depends(get_bird_observation_service)
 ):
-    return service.get_user_bird_observations(skip, limit)
+    observations, next_cursor = service.get_user_bird_observations(skip, limit, cursor)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return observations
 
 @router.get("/myobservations", response_model=List[BirdObservationResponse])
 def get_user_bird_observations(
-    skip: int = 0,
-    limit: int = 100,
+    response: Response,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
     current_user: User = Depends(get_current_user),
     service: BirdObservationService = Depends(get_bird_observation_service)
 ):
-    return service.get_user_observations(skip, limit, current_user)
+    observations, next_cursor = service.get_user_observations(skip, limit, current_user, cursor)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return observations
 
 
 
@@ -86,35 +112,49 @@ def get_bird_observation(
 
 
 # Image Endpoints
-@router.post("/observations/{user_bird_id}/images", status_code=201)
-def upload_image_for_observation(
+@router.post("/observations/{user_bird_id}/images", status_code=201,
+             openapi_extra=multipart_body_schema({"caption": "string"}))
+async def upload_image_for_observation(
     user_bird_id: uuid.UUID,
-    file: UploadFile = File(...),
+    request: Request,
+    background_tasks: BackgroundTasks,
     caption: Optional[str] = None,
     current_user: User = Depends(get_current_user),
     service: BirdImageService = Depends(get_bird_image_service)
 ):
-    return service.upload_image_for_observation(user_bird_id, file, caption, current_user)
+    return await service.upload_image_for_observation(user_bird_id, request, caption, current_user, background_tasks)
 
 
 @router.get("/images/{ebird_id}")
 def list_images_for_bird(
     ebird_id: str,
+    limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[str] = None,
     service: BirdImageService = Depends(get_bird_image_service)
 ):
-    return service.list_images_for_bird(ebird_id)
+    return service.list_images_for_bird(ebird_id, limit, cursor)
+
+
+@router.get("/images/{image_id}/file")
+def get_image_file(
+    image_id: uuid.UUID,
+    size: Optional[Literal["display", "medium", "small", "original"]] = None,
+    service: BirdImageService = Depends(get_bird_image_service)
+):
+    return service.serve_image(image_id, size)
 
 
 # Sound Endpoints
-@router.post("/observations/{user_bird_id}/sounds", status_code=201)
-def upload_sound_for_observation(
+@router.post("/observations/{user_bird_id}/sounds", status_code=201,
+             openapi_extra=multipart_body_schema({"identified": "boolean"}))
+async def upload_sound_for_observation(
     user_bird_id: uuid.UUID,
-    file: UploadFile = File(...),
-    identified: bool = Form(default=False),
+    request: Request,
+    background_tasks: BackgroundTasks,
     current_user: User = Depends(get_current_user),
     service: BirdSoundService = Depends(get_bird_sound_service)
 ):
-    return service.upload_sound_for_observation(user_bird_id, file, identified, current_user)
+    return await service.upload_sound_for_observation(user_bird_id, request, current_user, background_tasks)
 
 
 @router.get("/observations/{user_bird_id}/sounds")
@@ -129,6 +169,36 @@ def list_sounds_for_observation(
 @router.get("/sounds/{ebird_id}")
 def list_sounds_for_bird(
     ebird_id: str,
+    limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[str] = None,
     service: BirdSoundService = Depends(get_bird_sound_service)
 ):
-    return service.list_sounds_for_bird(ebird_id)
\ No newline at end of file
+    return service.list_sounds_for_bird(ebird_id, limit, cursor)
+
+
+@router.get("/sounds/{sound_id}/audio")
+def stream_sound(
+    sound_id: uuid.UUID,
+    range_header: Optional[str] = Header(None, alias="Range"),
+    service: BirdSoundService = Depends(get_bird_sound_service)
+):
+    return service.stream_sound(sound_id, range_header)
+
+
+@router.post("/sounds/similar")
+async def find_similar_to_recording(
+    file: UploadFile = File(...),
+    k: int = Query(10, ge=1, le=100),
+    service: SoundSimilarityService = Depends(get_sound_similarity_service)
+):
+    embedding = await embed_recording(await file.read(), file.filename)
+    return await run_in_threadpool(service.similar_to_vector, embedding, k)
+
+
+@router.get("/sounds/{sound_id}/similar")
+def find_similar_sounds(
+    sound_id: uuid.UUID,
+    k: int = Query(10, ge=1, le=100),
+    service: SoundSimilarityService = Depends(get_sound_similarity_service)
+):
+    return service.similar_to_sound(sound_id, k)
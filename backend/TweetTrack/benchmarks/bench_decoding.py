@@ -0,0 +1,87 @@
+"""Per-format decode latency: in-memory decoder vs. the old temp-file + pydub path.
+
+Needs ffmpeg on PATH. Run from backend/TweetTrack:
+
+    python benchmarks/bench_decoding.py --seconds 10 30 60 --runs 20
+"""
+import argparse
+import io
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from pydub import AudioSegment
+
+from audio.decoding import SUPPORTED_FORMATS, decode_to_pcm
+
+# Container/codec per extension, roughly what phones and recorders produce
+ENCODERS = {
+    ".wav": ["-c:a", "pcm_s16le"],
+    ".flac": ["-c:a", "flac"],
+    ".ogg": ["-c:a", "libvorbis"],
+    ".mp3": ["-c:a", "libmp3lame", "-b:a", "128k"],
+    ".m4a": ["-c:a", "aac", "-b:a", "128k"],
+}
+
+
+def make_clip(file_extension, seconds, sample_rate=44100):
+    # Chirp plus noise so the encoders have something realistic to chew on
+    source = f"aevalsrc='0.3*sin(2*PI*(2000+1500*sin(2*PI*0.5*t))*t)+0.05*(random(0)-0.5)':s={sample_rate}:d={seconds}"
+    with tempfile.NamedTemporaryFile(suffix=file_extension) as output:
+        subprocess.run(
+            ["ffmpeg", "-hide_banner", "-loglevel", "error", "-y", "-f", "lavfi", "-i", source,
+             *ENCODERS[file_extension], output.name],
+            check=True
+        )
+        with open(output.name, "rb") as f:
+            return f.read()
+
+
+def decode_with_temp_file(audio_bytes, file_extension):
+    # What /classify did before: write to disk, pydub/ffmpeg on the path, re-encode to MP3
+    with tempfile.NamedTemporaryFile(delete=False, suffix=file_extension) as temp_file:
+        temp_file.write(audio_bytes)
+        temp_path = temp_file.name
+    try:
+        audio = AudioSegment.from_file(temp_path, format=SUPPORTED_FORMATS[file_extension])
+        mp3_buffer = io.BytesIO()
+        audio.export(mp3_buffer, format="mp3")
+        return mp3_buffer.getvalue()
+    finally:
+        os.remove(temp_path)
+
+
+def measure(fn, runs):
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return statistics.median(timings), timings[int(0.95 * (len(timings) - 1))]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--formats", nargs="+", default=list(ENCODERS))
+    parser.add_argument("--seconds", type=float, nargs="+", default=[10, 60])
+    parser.add_argument("--runs", type=int, default=10)
+    args = parser.parse_args()
+
+    print(f"{'format':>6} {'clip s':>7} {'size KB':>8} {'temp-file p50/p95 ms':>22} {'in-memory p50/p95 ms':>22} {'speedup':>8}")
+    for seconds in args.seconds:
+        for file_extension in args.formats:
+            audio_bytes = make_clip(file_extension, seconds)
+            old_p50, old_p95 = measure(lambda: decode_with_temp_file(audio_bytes, file_extension), args.runs)
+            new_p50, new_p95 = measure(lambda: decode_to_pcm(audio_bytes, file_extension), args.runs)
+            print(f"{file_extension:>6} {seconds:>7.0f} {len(audio_bytes) / 1024:>8.0f} "
+                  f"{old_p50:>11.1f}/{old_p95:<10.1f} {new_p50:>11.1f}/{new_p95:<10.1f} {old_p50 / new_p50:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
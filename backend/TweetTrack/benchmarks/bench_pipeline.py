@@ -0,0 +1,221 @@
+"""End-to-end /classify latency and throughput against the real AI socket server running a stub model.
+
+Starts backend/AiInference/socket_server.py with MODEL_BACKEND=stub (same output heads as Perch,
+deterministic logits, no TensorFlow) and drives the real classify router in-process. Per-stage
+times come from the Server-Timing header. Run from backend/TweetTrack:
+
+    python benchmarks/bench_pipeline.py --concurrency 1 8 32 --seconds 5 30 --requests 200
+    python benchmarks/bench_pipeline.py --stub-call-ms 40 --stub-row-ms 5 --output results.json
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+import soundfile as sf
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+AI_DIR = os.path.join(BACKEND_DIR, "AiInference")
+
+sys.path.insert(0, os.path.join(BACKEND_DIR, "TweetTrack", "src"))
+sys.path.insert(0, os.path.join(BACKEND_DIR, "TweetTrack", "api"))
+
+PERCENTILES = (50, 95, 99)
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_ai_server(port, args):
+    env = dict(
+        os.environ,
+        PORT=str(port),
+        MODEL_BACKEND="stub",
+        STUB_MODEL_CALL_MS=str(args.stub_call_ms),
+        STUB_MODEL_ROW_MS=str(args.stub_row_ms),
+        # Only catalog entries, a benchmark must not hit ebird.org
+        SPECIES_LIVE_SCRAPE="0",
+        WINDOWED_CLASSIFICATION="1" if args.windowed else "0",
+    )
+    process = subprocess.Popen(
+        [sys.executable, "socket_server.py"], cwd=AI_DIR, env=env,
+        stdout=subprocess.DEVNULL if not args.verbose else None,
+    )
+
+    deadline = time.monotonic() + args.startup_timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"AI server exited with code {process.returncode}")
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+            return process
+        except OSError:
+            time.sleep(0.1)
+    process.terminate()
+    raise RuntimeError("AI server did not start in time")
+
+
+def make_clips(seconds, count, file_format, sample_rate=44100):
+    # Chirps with different noise per clip, so decoding and the result cache can't shortcut anything
+    t = np.arange(int(seconds * sample_rate)) / sample_rate
+    clips = []
+    for seed in range(count):
+        rng = np.random.default_rng(seed)
+        samples = 0.3 * np.sin(2 * np.pi * (2000 + 1500 * np.sin(2 * np.pi * 0.5 * t)) * t)
+        samples += 0.05 * rng.standard_normal(len(t))
+        buffer = io.BytesIO()
+        sf.write(buffer, samples.astype(np.float32), sample_rate, format=file_format)
+        clips.append(buffer.getvalue())
+    return clips
+
+
+def parse_server_timing(header):
+    timings = {}
+    for entry in filter(None, (part.strip() for part in header.split(","))):
+        name, _, duration = entry.partition(";dur=")
+        if duration:
+            timings[name] = float(duration)
+    return timings
+
+
+def summarize(values):
+    values = np.asarray(values, dtype=np.float64)
+    summary = {"mean": round(float(values.mean()), 3)}
+    for percentile, value in zip(PERCENTILES, np.percentile(values, PERCENTILES)):
+        summary[f"p{percentile}"] = round(float(value), 3)
+    return summary
+
+
+async def run_load(client, clips, file_format, concurrency, total_requests):
+    latencies, stages, errors = [], {}, 0
+    next_request = iter(range(total_requests))
+
+    async def worker():
+        nonlocal errors
+        for index in next_request:
+            clip = clips[index % len(clips)]
+            start = time.perf_counter()
+            response = await client.post(
+                "/classify", files={"file": (f"clip{index}.{file_format.lower()}", clip)}
+            )
+            latencies.append((time.perf_counter() - start) * 1000)
+
+            # A missing catalog entry still returns a classification; only failed requests count as errors
+            if response.status_code != 200 or "detail" in response.json():
+                errors += 1
+                continue
+            timings = parse_server_timing(response.headers.get("server-timing", ""))
+            # Socket transfer and framing: the AI round trip minus the time spent inside the AI service
+            ai_stages = sum(ms for stage, ms in timings.items() if stage.startswith("ai_"))
+            if "ai" in timings:
+                timings["transfer"] = timings["ai"] - ai_stages
+            for stage, ms in timings.items():
+                stages.setdefault(stage, []).append(ms)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    return {
+        "requests": total_requests,
+        "errors": errors,
+        "throughput_rps": round(total_requests / elapsed, 2),
+        "latency_ms": summarize(latencies),
+        "stages_ms": {stage: summarize(values) for stage, values in stages.items()},
+    }
+
+
+async def run(args, port):
+    # Environment must be set before the client, cache and router modules read it
+    os.environ.update(AI_HOST="127.0.0.1", AI_PORT=str(port), RESULT_CACHE_MAX_BYTES="0")
+    os.environ.pop("RESULT_CACHE_DIR", None)
+    os.environ["CLASSIFY_PIPELINE"] = args.pipeline
+
+    import httpx
+    from fastapi import FastAPI
+
+    from audio.decoding import shutdown_decoders
+    from inference.ai_client import ai_client
+    from routers import classify
+
+    app = FastAPI()
+    app.include_router(classify.router)
+
+    results = []
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=300) as client:
+        for seconds in args.seconds:
+            clips = make_clips(seconds, args.distinct_clips, args.format)
+            await run_load(client, clips, args.format, 1, args.warmup)
+
+            for concurrency in args.concurrency:
+                result = await run_load(client, clips, args.format, concurrency, args.requests)
+                result.update({"clip_seconds": seconds, "concurrency": concurrency})
+                results.append(result)
+
+                latency = result["latency_ms"]
+                print(f"{seconds:>8.1f} {concurrency:>6} {result['throughput_rps']:>9.1f} "
+                      f"{latency['p50']:>9.1f} {latency['p95']:>9.1f} {latency['p99']:>9.1f} {result['errors']:>7}")
+
+    await ai_client.close()
+    shutdown_decoders()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--seconds", type=float, nargs="+", default=[5, 30], help="clip lengths")
+    parser.add_argument("--requests", type=int, default=100, help="requests per measurement")
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--distinct-clips", type=int, default=8)
+    parser.add_argument("--format", default="WAV", choices=["WAV", "FLAC", "OGG", "MP3"])
+    parser.add_argument("--pipeline", default="pcm", choices=["pcm", "mp3"])
+    parser.add_argument("--windowed", action=argparse.BooleanOptionalAction, default=True)
+    parser.add_argument("--stub-call-ms", type=float, default=40.0)
+    parser.add_argument("--stub-row-ms", type=float, default=5.0)
+    parser.add_argument("--startup-timeout", type=float, default=60.0)
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--verbose", action="store_true", help="show the AI server's output")
+    args = parser.parse_args()
+
+    port = free_port()
+    ai_server = start_ai_server(port, args)
+    try:
+        print(f"{'clip s':>8} {'conc':>6} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7}")
+        results = asyncio.run(run(args, port))
+    finally:
+        ai_server.terminate()
+        ai_server.wait()
+
+    for result in results:
+        stages = ", ".join(f"{stage} {summary['p50']:.1f}" for stage, summary in result["stages_ms"].items())
+        print(f"p50 per stage at {result['clip_seconds']} s x {result['concurrency']}: {stages}")
+
+    if args.output:
+        report = {
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "cpus": os.cpu_count(),
+            "config": vars(args),
+            "results": results,
+        }
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"💾 Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""Search latency of the sound embedding index for growing collections.
+
+Run from backend/TweetTrack:
+
+    python benchmarks/bench_similarity.py --sizes 1000 10000 50000 --queries 50
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from similarity.embedding_index import EmbeddingIndex
+
+DIMENSIONS = 1280
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 50000])
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--k", type=int, default=10)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(f"{'sounds':>8} {'disk MB':>8} {'in RAM':>7} {'build s':>8} {'append ms':>10} {'p50 ms':>8} {'p95 ms':>8}")
+    for size in args.sizes:
+        with tempfile.TemporaryDirectory() as directory:
+            index = EmbeddingIndex(directory)
+            vectors = rng.standard_normal((size, DIMENSIONS)).astype(np.float16)
+
+            start = time.perf_counter()
+            index.rebuild([uuid.uuid4() for _ in range(size)], vectors, "bench", DIMENSIONS)
+            build = time.perf_counter() - start
+
+            start = time.perf_counter()
+            for _ in range(10):
+                index.add(uuid.uuid4(), rng.standard_normal(DIMENSIONS), "bench")
+            append_ms = (time.perf_counter() - start) * 100
+
+            latencies = []
+            for row in rng.integers(0, size, args.queries):
+                start = time.perf_counter()
+                index.search(vectors[row], args.k)
+                latencies.append((time.perf_counter() - start) * 1000)
+
+            disk_mb = os.path.getsize(index.vectors_path) / 1024 / 1024
+            p95 = np.percentile(latencies, 95)
+            print(f"{size:>8} {disk_mb:>8.1f} {str(index.dense is not None):>7} {build:>8.2f} {append_ms:>10.2f} "
+                  f"{statistics.median(latencies):>8.2f} {p95:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""Peak memory of one upload: buffering the whole file (the previous path) vs. streaming it into the blob store.
+
+Every (mode, size) runs in a fresh process and reports how far its peak RSS rose above the RSS it had
+after imports. The multipart body is generated chunk by chunk, so the client side holds no copy of the
+file. Needs no database; blobs go to a temporary directory. Run from backend/TweetTrack:
+
+    python benchmarks/bench_upload_memory.py --sizes 1 10 100
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+
+SRC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+BOUNDARY = "benchboundary"
+CLIENT_CHUNK_BYTES = 64 * 1024
+
+
+def multipart_chunks(size):
+    # A WAV-looking file of the requested size inside a multipart body, in client-sized chunks
+    yield (f"--{BOUNDARY}\r\nContent-Disposition: form-data; name=\"file\"; filename=\"bench.wav\"\r\n"
+           f"Content-Type: audio/wav\r\n\r\n").encode()
+    first = b"RIFF\x00\x00\x00\x00WAVE" + os.urandom(CLIENT_CHUNK_BYTES - 12)
+    block = os.urandom(CLIENT_CHUNK_BYTES)
+    sent = 0
+    while sent < size:
+        chunk = (block if sent else first)[:min(CLIENT_CHUNK_BYTES, size - sent)]
+        yield chunk
+        sent += len(chunk)
+    yield f"\r\n--{BOUNDARY}\r\nContent-Disposition: form-data; name=\"identified\"\r\n\r\ntrue\r\n--{BOUNDARY}--\r\n".encode()
+
+
+def make_request(size):
+    from starlette.requests import Request
+
+    chunks = multipart_chunks(size)
+
+    async def receive():
+        chunk = next(chunks, None)
+        return {"type": "http.request", "body": chunk or b"", "more_body": chunk is not None}
+
+    return Request({
+        "type": "http", "method": "POST", "path": "/", "query_string": b"",
+        "headers": [(b"content-type", f"multipart/form-data; boundary={BOUNDARY}".encode())],
+    }, receive)
+
+
+async def buffered(request):
+    # What upload_sound_for_observation did before: parse the form, read the file, base64 it for the row
+    import base64
+
+    form = await request.form()
+    contents = form["file"].file.read()
+    encoded = base64.b64encode(contents)
+    return len(contents), len(encoded)
+
+
+async def streaming(request):
+    from storage.uploads import SOUND_UPLOAD_TYPES, receive_upload, sniff_audio_type
+
+    upload = await receive_upload(request, 1 << 40, SOUND_UPLOAD_TYPES, sniff_audio_type)
+    return upload.size, upload.blob_hash
+
+
+def run(mode, size, results):
+    sys.path.insert(0, SRC)
+    os.environ["BLOB_STORE_DIR"] = tempfile.mkdtemp(prefix="bench_upload_")
+    import storage.uploads  # noqa: F401  (imports count towards the baseline, not the upload)
+    import starlette.formparsers  # noqa: F401
+
+    baseline = int(open("/proc/self/statm").read().split()[1]) * resource.getpagesize() / 1024
+    start = time.perf_counter()
+    asyncio.run({"buffered": buffered, "streaming": streaming}[mode](make_request(size)))
+    elapsed = time.perf_counter() - start
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    results.put((max(peak - baseline, 0) / 1024, elapsed))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 10, 100], help="file sizes in MB")
+    parser.add_argument("--modes", nargs="+", default=["buffered", "streaming"])
+    args = parser.parse_args()
+
+    context = multiprocessing.get_context("spawn")
+    print(f"{'mode':<10} {'file MB':>8} {'peak RSS +MB':>13} {'s':>7} {'MB/s':>8}")
+    for mode in args.modes:
+        for size_mb in args.sizes:
+            results = context.Queue()
+            process = context.Process(target=run, args=(mode, size_mb * 1024 * 1024, results))
+            process.start()
+            rss_mb, elapsed = results.get()
+            process.join()
+            print(f"{mode:<10} {size_mb:>8} {rss_mb:>13.1f} {elapsed:>7.2f} {size_mb / elapsed:>8.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+from scipy import fft, signal
+
+NOISE_TYPES = ("white", "pink", "brown", "blue", "violet", "impulse")
+# Share of samples hit by a spike in impulse noise
+IMPULSE_DENSITY = 0.01
+
+
+def noise_spectrum(noise_type: str, bins: int) -> Optional[np.ndarray]:
+    # Amplitude shaping applied to white noise in the frequency domain; None keeps it white
+    S = np.arange(1, bins + 1, dtype=np.float32)
+    if noise_type == "white":
+        return None
+    if noise_type == "pink":
+        return np.sqrt(1 / S)  # 1/f power
+    if noise_type == "brown":
+        return 1 / S  # 1/f² power
+    if noise_type == "blue":
+        return np.sqrt(S) / np.mean(np.sqrt(S))  # f power
+    if noise_type == "violet":
+        return S / np.mean(S)  # f² power
+    raise ValueError(
+        f"Unsupported noise type: {noise_type}. Choose from 'white', 'pink', 'brown', 'blue', 'violet', or 'impulse'")
+
+
+def noise_rows(length: int, conditions: Sequence[Tuple[str, float]], rng: np.random.Generator) -> np.ndarray:
+    # One noise signal per (noise_type, noise_level) row, shape (len(conditions), length), float32
+    noise = rng.standard_normal((len(conditions), length), dtype=np.float32)
+    types = np.array([noise_type for noise_type, _ in conditions])
+    levels = np.array([level for _, level in conditions], dtype=np.float32)[:, np.newaxis]
+
+    # Every coloured row goes through a single FFT pair, each row with its own spectral shape
+    coloured = np.flatnonzero(~np.isin(types, ("white", "impulse")))
+    if len(coloured):
+        bins = length // 2 + 1
+        shapes = np.stack([noise_spectrum(noise_type, bins) for noise_type in types[coloured]])
+        spectra = fft.rfft(noise[coloured], axis=1) * shapes
+        shaped = fft.irfft(spectra, length, axis=1).astype(np.float32)
+        # Same loudness as the white rows: unit standard deviation before scaling by the level
+        noise[coloured] = shaped / np.maximum(shaped.std(axis=1, keepdims=True), 1e-12)
+
+    impulse = np.flatnonzero(types == "impulse")
+    if len(impulse):
+        spikes = rng.random((len(impulse), length), dtype=np.float32) < IMPULSE_DENSITY
+        noise[impulse] = np.where(spikes, rng.uniform(-10, 10, (len(impulse), length)).astype(np.float32), 0)
+
+    return noise * levels
+
+
+def highpass_rows(waveforms: np.ndarray, sample_rate: int, cutoff_freq: float, order: int) -> np.ndarray:
+    # Zero-phase Butterworth high-pass over every row at once; second-order sections stay stable at high orders
+    sos = signal.butter(order, cutoff_freq / (0.5 * sample_rate), btype="high", output="sos")
+    return signal.sosfiltfilt(sos, waveforms, axis=-1).astype(np.float32)
+
+
+def sweep_variants(waveform: np.ndarray, sample_rate: int, noise: List[Tuple[str, float]],
+                   filters: List[Tuple[float, int]], seed: int = 0) -> np.ndarray:
+    # Full grid: (len(noise) + 1) noise rows, each under (len(filters) + 1) filter settings, the clean
+    # recording and the unfiltered rows first. Shape (noise rows, filter columns, samples)
+    waveform = np.asarray(waveform, dtype=np.float32)
+    noisy = np.empty((len(noise) + 1, len(waveform)), dtype=np.float32)
+    noisy[0] = waveform
+    if noise:
+        noisy[1:] = waveform + noise_rows(len(waveform), noise, np.random.default_rng(seed))
+    np.clip(noisy, -1.0, 1.0, out=noisy)
+
+    grid = np.empty((len(noisy), len(filters) + 1, len(waveform)), dtype=np.float32)
+    grid[:, 0] = noisy
+    for column, (cutoff_freq, order) in enumerate(filters, start=1):
+        grid[:, column] = highpass_rows(noisy, sample_rate, cutoff_freq, order)
+    return grid
@@ -0,0 +1,128 @@
+import asyncio
+import io
+import os
+import subprocess
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+import librosa
+import numpy as np
+import soundfile as sf
+
+# The Perch model works on mono audio at 32 kHz
+PCM_SAMPLE_RATE = 32000
+PCM_DTYPE = np.dtype("<f4")
+
+SUPPORTED_FORMATS = {".m4a": "m4a", ".wav": "wav", ".flac": "flac", ".ogg": "ogg", ".mp3": "mp3"}
+
+# Formats libsndfile reads directly, without starting ffmpeg
+SOUNDFILE_FORMATS = {".wav", ".flac", ".ogg"}
+
+# MP4 containers often keep their index at the end of the file, which ffmpeg cannot reach on a pipe
+SEEKABLE_INPUT_FORMATS = {".m4a", ".mp4"}
+
+FFMPEG_BINARY = os.getenv("FFMPEG_BINARY", "ffmpeg")
+DECODE_WORKERS = int(os.getenv("DECODE_WORKERS", "4"))
+DECODE_MAX_PENDING = int(os.getenv("DECODE_MAX_PENDING", "32"))
+
+# Memory-backed scratch space for the rare inputs that need a seekable file
+SCRATCH_DIR = "/dev/shm" if os.path.isdir("/dev/shm") else None
+
+
+class AudioDecodeError(Exception):
+    pass
+
+
+def _ffmpeg_command(input_path: str, sample_rate: int):
+    command = [FFMPEG_BINARY, "-hide_banner", "-loglevel", "error"]
+    if input_path != "pipe:0":
+        command.append("-nostdin")
+    return command + [
+        "-i", input_path,
+        "-vn", "-ac", "1", "-ar", str(sample_rate),
+        "-f", "f32le", "pipe:1",
+    ]
+
+
+def decode_with_soundfile(audio_bytes: bytes, sample_rate: int = PCM_SAMPLE_RATE) -> np.ndarray:
+    data, source_rate = sf.read(io.BytesIO(audio_bytes), dtype="float32", always_2d=True)
+    samples = data.mean(axis=1) if data.shape[1] > 1 else data[:, 0]
+
+    if source_rate != sample_rate:
+        samples = librosa.resample(samples, orig_sr=source_rate, target_sr=sample_rate)
+
+    return np.ascontiguousarray(samples, dtype=PCM_DTYPE)
+
+
+def decode_with_ffmpeg(audio_bytes: bytes, sample_rate: int = PCM_SAMPLE_RATE) -> np.ndarray:
+    # Compressed bytes go in on stdin, raw float32 samples come back on stdout
+    process = subprocess.run(
+        _ffmpeg_command("pipe:0", sample_rate),
+        input=audio_bytes, stdout=subprocess.PIPE, stderr=subprocess.PIPE
+    )
+    if process.returncode != 0:
+        raise AudioDecodeError(process.stderr.decode("utf-8", errors="replace").strip())
+    return np.frombuffer(process.stdout, dtype=PCM_DTYPE)
+
+
+def decode_with_ffmpeg_scratch_file(audio_bytes: bytes, file_extension: str,
+                                    sample_rate: int = PCM_SAMPLE_RATE) -> np.ndarray:
+    with tempfile.NamedTemporaryFile(suffix=file_extension, dir=SCRATCH_DIR) as scratch_file:
+        scratch_file.write(audio_bytes)
+        scratch_file.flush()
+        process = subprocess.run(
+            _ffmpeg_command(scratch_file.name, sample_rate),
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE
+        )
+    if process.returncode != 0:
+        raise AudioDecodeError(process.stderr.decode("utf-8", errors="replace").strip())
+    return np.frombuffer(process.stdout, dtype=PCM_DTYPE)
+
+
+def decode_to_pcm(audio_bytes: bytes, file_extension: str, sample_rate: int = PCM_SAMPLE_RATE) -> np.ndarray:
+    if file_extension in SOUNDFILE_FORMATS:
+        try:
+            return decode_with_soundfile(audio_bytes, sample_rate)
+        except RuntimeError:
+            # libsndfile rejects some encodings (e.g. Opus in older builds); ffmpeg handles them
+            pass
+
+    try:
+        return decode_with_ffmpeg(audio_bytes, sample_rate)
+    except AudioDecodeError:
+        if file_extension not in SEEKABLE_INPUT_FORMATS:
+            raise
+
+    return decode_with_ffmpeg_scratch_file(audio_bytes, file_extension, sample_rate)
+
+
+def encode_mp3(samples: np.ndarray, sample_rate: int = PCM_SAMPLE_RATE) -> bytes:
+    buffer = io.BytesIO()
+    sf.write(buffer, samples, sample_rate, format="mp3")
+    return buffer.getvalue()
+
+
+_executor: Optional[ProcessPoolExecutor] = None
+_pending: Optional[asyncio.Semaphore] = None
+
+
+async def decode_to_pcm_async(audio_bytes: bytes, file_extension: str,
+                              sample_rate: int = PCM_SAMPLE_RATE) -> np.ndarray:
+    global _executor, _pending
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=DECODE_WORKERS)
+        _pending = asyncio.Semaphore(DECODE_MAX_PENDING)
+
+    # Bound the work queued on the pool so a burst of uploads can't pile up in memory
+    async with _pending:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_executor, decode_to_pcm, audio_bytes, file_extension, sample_rate)
+
+
+def shutdown_decoders():
+    global _executor, _pending
+    if _executor is not None:
+        _executor.shutdown(wait=False)
+    _executor = None
+    _pending = None
@@ -0,0 +1,66 @@
+from math import gcd
+
+import numpy as np
+from scipy import signal
+
+
+class StreamResampler:
+    # Chunk-by-chunk equivalent of signal.resample_poly over the whole stream: same filter, but the input
+    # history and the output position carry over between chunks, so there are no transients at chunk
+    # boundaries and the output length never drifts from received * up / down
+    def __init__(self, from_rate: int, to_rate: int):
+        divisor = gcd(from_rate, to_rate)
+        self.up, self.down = to_rate // divisor, from_rate // divisor
+
+        # The filter resample_poly designs, including its padding that centres the output samples
+        max_rate = max(self.up, self.down)
+        half_len = 10 * max_rate
+        taps = signal.firwin(2 * half_len + 1, 1.0 / max_rate, window=("kaiser", 5.0)) * self.up
+        pre_pad = self.down - half_len % self.down
+        self.pre_remove = (half_len + pre_pad) // self.down
+        taps = np.concatenate((np.zeros(pre_pad), taps))
+
+        # One row of coefficients per polyphase branch: phases[p, t] = taps[p + up * t]
+        self.taps_per_phase = -(-len(taps) // self.up)
+        taps = np.concatenate((taps, np.zeros(self.taps_per_phase * self.up - len(taps))))
+        self.phases = taps.reshape(self.taps_per_phase, self.up).T
+
+        # Input samples still needed, starting at global index `offset`; zeros stand in before the stream
+        self.offset = -self.taps_per_phase
+        self.history = np.zeros(self.taps_per_phase)
+        self.received = 0
+        self.emitted = 0
+
+    def process(self, chunk: np.ndarray) -> np.ndarray:
+        self.history = np.concatenate((self.history, chunk))
+        self.received += len(chunk)
+        # Output n reads input up to ((n + pre_remove) * down) // up, which must have arrived
+        ready = (self.received * self.up - 1) // self.down - self.pre_remove + 1
+        return self.emit(ready)
+
+    def flush(self) -> np.ndarray:
+        # The remaining outputs, with silence after the end of the stream as resample_poly assumes
+        total = -(-self.received * self.up // self.down)
+        if total > self.emitted:
+            last_input = ((total - 1 + self.pre_remove) * self.down) // self.up
+            missing = last_input + 1 - (self.offset + len(self.history))
+            if missing > 0:
+                self.history = np.concatenate((self.history, np.zeros(missing)))
+        return self.emit(total)
+
+    def emit(self, until: int) -> np.ndarray:
+        if until <= self.emitted:
+            return np.zeros(0, dtype=np.float32)
+
+        positions = (np.arange(self.emitted, until) + self.pre_remove) * self.down
+        newest = positions // self.up - self.offset
+        indices = newest[:, None] - np.arange(self.taps_per_phase)[None, :]
+        output = np.einsum("nt,nt->n", self.phases[positions % self.up], self.history[indices])
+        self.emitted = until
+
+        # Drop input that no later output reaches back to
+        keep_from = ((until + self.pre_remove) * self.down) // self.up - self.taps_per_phase + 1
+        if keep_from > self.offset:
+            self.history = self.history[keep_from - self.offset:]
+            self.offset = keep_from
+        return output.astype(np.float32)
@@ -0,0 +1,42 @@
+import numpy as np
+
+
+class RingBuffer:
+    # Fixed-size float32 history of the most recent samples; memory never grows with stream length
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.samples = np.zeros(capacity, dtype=np.float32)
+        self.position = 0
+        self.total_written = 0
+
+    def write(self, chunk: np.ndarray):
+        if len(chunk) >= self.capacity:
+            # Only the tail can survive anyway
+            self.samples[:] = chunk[-self.capacity:]
+            self.position = 0
+        else:
+            end = self.position + len(chunk)
+            if end <= self.capacity:
+                self.samples[self.position:end] = chunk
+            else:
+                split = self.capacity - self.position
+                self.samples[self.position:] = chunk[:split]
+                self.samples[:end - self.capacity] = chunk[split:]
+            self.position = end % self.capacity
+        self.total_written += len(chunk)
+
+    def __len__(self):
+        return min(self.total_written, self.capacity)
+
+    def latest(self, count: int) -> np.ndarray:
+        # Copy of the last `count` samples in order, zero-padded in front if less has arrived
+        available = min(count, len(self))
+        window = np.zeros(count, dtype=np.float32)
+        start = (self.position - available) % self.capacity
+        if start + available <= self.capacity:
+            window[count - available:] = self.samples[start:start + available]
+        else:
+            split = self.capacity - start
+            window[count - available:count - available + split] = self.samples[start:]
+            window[count - available + split:] = self.samples[:available - split]
+        return window
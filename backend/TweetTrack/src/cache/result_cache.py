@@ -0,0 +1,172 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+import numpy as np
+from starlette.concurrency import run_in_threadpool
+
+RESULT_CACHE_MAX_BYTES = int(os.getenv("RESULT_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+RESULT_CACHE_DIR = os.getenv("RESULT_CACHE_DIR")
+RESULT_CACHE_DISK_MAX_BYTES = int(os.getenv("RESULT_CACHE_DISK_MAX_BYTES", str(1024 * 1024 * 1024)))
+
+
+def upload_digest(audio_bytes: bytes) -> str:
+    return hashlib.sha256(audio_bytes).hexdigest()
+
+
+def pcm_digest(waveform: np.ndarray) -> str:
+    # Quantize to 16 bits so tiny float differences between decoders still hash the same
+    quantized = np.round(np.clip(waveform, -1.0, 1.0) * 32767).astype("<i2")
+    return hashlib.sha256(quantized.tobytes()).hexdigest()
+
+
+class DiskTier:
+    # Blocking file I/O: only ever called from worker threads, so it has its own lock
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+        # key -> size on disk, oldest first, rebuilt from file times on startup
+        self.entries = OrderedDict()
+        self.total_bytes = 0
+        files = []
+        for name in os.listdir(directory):
+            if name.endswith(".json"):
+                stat = os.stat(os.path.join(directory, name))
+                files.append((stat.st_mtime, name[:-len(".json")], stat.st_size))
+        for _, key, size in sorted(files):
+            self.entries[key] = size
+            self.total_bytes += size
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self.lock:
+            if key not in self.entries:
+                return None
+            try:
+                with open(self._path(key), "rb") as f:
+                    data = f.read()
+                os.utime(self._path(key))
+            except FileNotFoundError:
+                self.total_bytes -= self.entries.pop(key)
+                return None
+            self.entries.move_to_end(key)
+            return data
+
+    def put(self, keys, data: bytes):
+        with self.lock:
+            for key in keys:
+                temp_path = f"{self._path(key)}.tmp"
+                with open(temp_path, "wb") as f:
+                    f.write(data)
+                os.replace(temp_path, self._path(key))
+
+                self.total_bytes += len(data) - self.entries.pop(key, 0)
+                self.entries[key] = len(data)
+            while self.total_bytes > self.max_bytes and len(self.entries) > 1:
+                old_key, size = self.entries.popitem(last=False)
+                self.total_bytes -= size
+                try:
+                    os.remove(self._path(old_key))
+                except FileNotFoundError:
+                    pass
+
+    def stats(self) -> tuple:
+        with self.lock:
+            return len(self.entries), self.total_bytes
+
+
+class ResultCache:
+    def __init__(
+            self,
+            max_bytes: int = RESULT_CACHE_MAX_BYTES,
+            directory: Optional[str] = RESULT_CACHE_DIR,
+            disk_max_bytes: int = RESULT_CACHE_DISK_MAX_BYTES
+    ):
+        self.max_bytes = max_bytes
+        # key -> serialized result, least recently used first
+        self.memory = OrderedDict()
+        self.memory_bytes = 0
+        self.disk = DiskTier(directory, disk_max_bytes) if directory else None
+        self.lock = threading.Lock()
+
+        self.hits = {"upload": 0, "pcm": 0}
+        self.disk_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(kind: str, digest: str, model_version: str, options: dict) -> str:
+        # Same audio under a different model or different options is a different result
+        options_json = json.dumps(options, sort_keys=True, separators=(",", ":"))
+        return hashlib.sha256(f"{kind}:{digest}:{model_version}:{options_json}".encode()).hexdigest()
+
+    async def get(self, kind: str, key: str) -> Optional[dict]:
+        # The memory tier is answered inline; the disk tier is read in a worker thread, off the event loop
+        with self.lock:
+            data = self.memory.get(key)
+            if data is not None:
+                self.memory.move_to_end(key)
+                self.hits[kind] += 1
+                return json.loads(data)
+
+        if self.disk is not None:
+            data = await run_in_threadpool(self.disk.get, key)
+            if data is not None:
+                with self.lock:
+                    self.hits[kind] += 1
+                    self.disk_hits += 1
+                    self._put_memory(key, data)
+                return json.loads(data)
+
+        with self.lock:
+            self.misses += 1
+        return None
+
+    async def put(self, keys, result: dict):
+        data = json.dumps(result, separators=(",", ":")).encode("utf-8")
+        with self.lock:
+            for key in keys:
+                self._put_memory(key, data)
+        if self.disk is not None:
+            await run_in_threadpool(self.disk.put, keys, data)
+
+    def _put_memory(self, key: str, data: bytes):
+        if len(data) > self.max_bytes:
+            return
+        old = self.memory.pop(key, None)
+        if old is not None:
+            self.memory_bytes -= len(old)
+        self.memory[key] = data
+        self.memory_bytes += len(data)
+        while self.memory_bytes > self.max_bytes:
+            _, evicted = self.memory.popitem(last=False)
+            self.memory_bytes -= len(evicted)
+
+    def stats(self) -> dict:
+        disk_entries, disk_bytes = self.disk.stats() if self.disk else (0, 0)
+        with self.lock:
+            hits = sum(self.hits.values())
+            lookups = hits + self.misses
+            return {
+                "lookups": lookups,
+                "hits": hits,
+                "upload_hits": self.hits["upload"],
+                "pcm_hits": self.hits["pcm"],
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": hits / lookups if lookups else 0.0,
+                "memory_entries": len(self.memory),
+                "memory_bytes": self.memory_bytes,
+                "disk_entries": disk_entries,
+                "disk_bytes": disk_bytes,
+            }
+
+
+result_cache = ResultCache()
@@ -0,0 +1,162 @@
+import os
+import threading
+import time
+from contextvars import ContextVar
+from typing import Optional
+
+from sqlalchemy import event, exc
+
+# Pool settings, shared by the sync and the async engine (each gets its own pool of this size)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+# Connections older than this are replaced on checkout; -1 keeps them forever
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+# A cheap round trip before handing out a connection, so a restarted database never yields a dead one
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "1") == "1"
+# Server-side limits per statement and per lock wait, 0 for none (PostgreSQL only)
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "30000"))
+DB_LOCK_TIMEOUT_MS = int(os.getenv("DB_LOCK_TIMEOUT_MS", "10000"))
+# Checkouts that wait longer than this are logged with the route that waited
+DB_SLOW_CHECKOUT_MS = float(os.getenv("DB_SLOW_CHECKOUT_MS", "100"))
+
+# The request being served, set by PoolRouteMiddleware; copied into threadpool calls along with the context
+current_request: ContextVar[Optional[dict]] = ContextVar("current_request", default=None)
+
+
+def pool_options() -> dict:
+    return {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    }
+
+
+def server_settings() -> dict:
+    settings = {}
+    if DB_STATEMENT_TIMEOUT_MS:
+        settings["statement_timeout"] = str(DB_STATEMENT_TIMEOUT_MS)
+    if DB_LOCK_TIMEOUT_MS:
+        settings["lock_timeout"] = str(DB_LOCK_TIMEOUT_MS)
+    return settings
+
+
+def libpq_connect_args() -> dict:
+    options = " ".join(f"-c {name}={value}" for name, value in server_settings().items())
+    return {"options": options} if options else {}
+
+
+def asyncpg_connect_args() -> dict:
+    settings = server_settings()
+    return {"server_settings": settings} if settings else {}
+
+
+def request_route() -> str:
+    scope = current_request.get()
+    if scope is None:
+        return "(no request)"
+    # Routing fills in the matched route, so checkouts group by template rather than by concrete path
+    route = scope.get("route")
+    return f"{scope['method']} {getattr(route, 'path', scope['path'])}"
+
+
+class PoolMetrics:
+    def __init__(self, name: str):
+        self.name = name
+        self.lock = threading.Lock()
+        self.engine = None
+        self.checkouts = 0
+        self.wait_ms_total = 0.0
+        self.wait_ms_max = 0.0
+        self.slow_checkouts = 0
+        self.timeouts = 0
+        self.connects = 0
+        self.invalidations = 0
+
+    def pool_class(self, base):
+        # Bound through the class, so pools recreated by dispose() keep reporting here
+        return type(f"Timed{base.__name__}", (TimedPoolMixin, base), {"metrics": self})
+
+    def attach(self, engine):
+        self.engine = engine
+        event.listen(engine.pool, "connect", self.on_connect)
+        event.listen(engine.pool, "invalidate", self.on_invalidate)
+        event.listen(engine.pool, "soft_invalidate", self.on_invalidate)
+
+    def on_connect(self, dbapi_connection, connection_record):
+        with self.lock:
+            self.connects += 1
+
+    def on_invalidate(self, dbapi_connection, connection_record, exception):
+        with self.lock:
+            self.invalidations += 1
+
+    def record_wait(self, wait_ms: float, timed_out: bool):
+        with self.lock:
+            self.checkouts += not timed_out
+            self.timeouts += timed_out
+            self.wait_ms_total += wait_ms
+            self.wait_ms_max = max(self.wait_ms_max, wait_ms)
+            slow = wait_ms >= DB_SLOW_CHECKOUT_MS
+            self.slow_checkouts += slow
+        if slow:
+            outcome = "timed out" if timed_out else "waited"
+            pool = self.engine.pool
+            print(f"🐢 {request_route()} {outcome} {wait_ms:.0f} ms for a connection from the {self.name} pool "
+                  f"({pool.checkedout()} checked out, overflow {pool.overflow()})")
+
+    def stats(self) -> dict:
+        pool = self.engine.pool
+        with self.lock:
+            attempts = self.checkouts + self.timeouts
+            return {
+                "size": pool.size(),
+                "checked_out": pool.checkedout(),
+                "checked_in": pool.checkedin(),
+                "overflow": pool.overflow(),
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "slow_checkouts": self.slow_checkouts,
+                "wait_ms_avg": self.wait_ms_total / attempts if attempts else 0.0,
+                "wait_ms_max": self.wait_ms_max,
+                "connects": self.connects,
+                "invalidations": self.invalidations,
+            }
+
+
+class TimedPoolMixin:
+    # Times how long each checkout waits for a connection (including opening a new one in the overflow);
+    # the pool's own events only fire once it has one
+    metrics: PoolMetrics
+
+    def _do_get(self):
+        start = time.perf_counter()
+        timed_out = False
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            timed_out = True
+            raise
+        finally:
+            self.metrics.record_wait((time.perf_counter() - start) * 1000, timed_out)
+
+
+class PoolRouteMiddleware:
+    # Plain ASGI middleware, so streaming responses and background tasks pass through untouched
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        token = current_request.set(scope)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            current_request.reset(token)
+
+
+sync_pool_metrics = PoolMetrics("sync")
+async_pool_metrics = PoolMetrics("async")
@@ -8,4 +8,5 @@ from .user import User
 from .user_bird import UserBird
 from .user_bird_image import UserBirdImage
 from .user_bird_sound import UserBirdSound
+from .user_bird_sound_embedding import UserBirdSoundEmbedding
 from .taxonomy import Taxonomy
\ No newline at end of file
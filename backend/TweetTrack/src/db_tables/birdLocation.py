@@ -1,5 +1,5 @@
 import uuid
-from sqlalchemy import Column, Float, ForeignKey
+from sqlalchemy import Column, Float, ForeignKey, Index, func
 from sqlalchemy.dialects.postgresql import UUID
 from . import Base
 
@@ -10,3 +10,9 @@ class BirdLocation(Base):
     bird_id = Column(UUID(as_uuid=True), ForeignKey("bird.id"), nullable=False)
     latitude = Column(Float, nullable=False)
     longitude = Column(Float, nullable=False)
+
+    # Built-in PostgreSQL GiST over point(longitude, latitude): bounding-box queries become index scans,
+    # no PostGIS needed. Queries must use the same expression (see bird_location_repository.area_condition)
+    __table_args__ = (
+        Index("ix_bird_location_point", func.point(longitude, latitude), postgresql_using="gist"),
+    )
@@ -1,5 +1,5 @@
 import uuid
-from sqlalchemy import Column, ForeignKey, Float, TIMESTAMP, String
+from sqlalchemy import Column, ForeignKey, Float, Index, TIMESTAMP, String
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 from . import Base
@@ -7,6 +7,11 @@ from . import Base
 
 class UserBird(Base):
     __tablename__ = "user_bird"
+    # Listing order is (observed_at, id); these let a keyset page start anywhere with an index seek
+    __table_args__ = (
+        Index("ix_user_bird_user_id_observed_at_id", "user_id", "observed_at", "id"),
+        Index("ix_user_bird_observed_at_id", "observed_at", "id"),
+    )
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     user_id = Column(UUID(as_uuid=True), ForeignKey("user.id"), nullable=False)
@@ -1,5 +1,5 @@
 import uuid
-from sqlalchemy import Column, String, ForeignKey, Text
+from sqlalchemy import BigInteger, Column, Integer, String, ForeignKey, Text
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 from . import Base
@@ -10,7 +10,19 @@ class UserBirdImage(Base):
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     user_bird_id = Column(UUID(as_uuid=True), ForeignKey("user_bird.id"), nullable=False)
+    # Legacy inline copy; new images live in the blob store and keep only hash, size and type here
     base64_image = Column(Text)
+    blob_hash = Column(String(64), nullable=True, index=True)
+    blob_size = Column(BigInteger, nullable=True)
+    content_type = Column(String(100), nullable=True)
+    # Re-encoded versions made in the background after upload; null until they exist
+    width = Column(Integer, nullable=True)
+    height = Column(Integer, nullable=True)
+    # Indexed like blob_hash, so the orphan sweep can look blobs up by any of them
+    display_hash = Column(String(64), nullable=True, index=True)
+    medium_hash = Column(String(64), nullable=True, index=True)
+    small_hash = Column(String(64), nullable=True, index=True)
+    preview_base64 = Column(Text, nullable=True)
     caption = Column(String, nullable=True)
 
     user_bird = relationship("UserBird", back_populates="images")
@@ -1,18 +1,26 @@
 import uuid
-from sqlalchemy import Column, String, ForeignKey, Boolean, LargeBinary
+from sqlalchemy import BigInteger, Column, String, ForeignKey, Boolean, Index, LargeBinary
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 from . import Base
 
 class UserBirdSound(Base):
     __tablename__ = "user_bird_sound"
+    # Sounds of one observation next to each other, for lookups and in-order batch scans
+    __table_args__ = (Index("ix_user_bird_sound_user_bird_id_id", "user_bird_id", "id"),)
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     user_bird_id = Column(UUID(as_uuid=True), ForeignKey("user_bird.id"), nullable=False)
-    sound_data = Column(LargeBinary, nullable=False)
+    # Legacy inline copy; new sounds live in the blob store and keep only hash and size here (MIME in file_type)
+    sound_data = Column(LargeBinary, nullable=True)
+    blob_hash = Column(String(64), nullable=True, index=True)
+    blob_size = Column(BigInteger, nullable=True)
     file_name = Column(String(255), nullable=True)
     file_type = Column(String(50), nullable=True)
     file_size = Column(String(20), nullable=True)
     identified = Column(Boolean, nullable=False, default=False)
 
-    user_bird = relationship("UserBird", back_populates="sounds")
\ No newline at end of file
+    user_bird = relationship("UserBird", back_populates="sounds")
+    embedding = relationship(
+        "UserBirdSoundEmbedding", uselist=False, back_populates="sound", cascade="all, delete-orphan"
+    )
\ No newline at end of file
@@ -0,0 +1,20 @@
+from datetime import datetime, timezone
+
+from sqlalchemy import Column, String, ForeignKey, Integer, LargeBinary, TIMESTAMP
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.orm import relationship
+from . import Base
+
+
+class UserBirdSoundEmbedding(Base):
+    __tablename__ = "user_bird_sound_embedding"
+
+    sound_id = Column(UUID(as_uuid=True), ForeignKey("user_bird_sound.id"), primary_key=True)
+    # Embeddings from different models are not comparable
+    model_version = Column(String(64), nullable=False, index=True)
+    dimensions = Column(Integer, nullable=False)
+    # Unit-length float16 vector, little-endian
+    vector = Column(LargeBinary, nullable=False)
+    created_at = Column(TIMESTAMP(timezone=True), nullable=False, default=lambda: datetime.now(timezone.utc))
+
+    sound = relationship("UserBirdSound", back_populates="embedding")
@@ -0,0 +1,75 @@
+import asyncio
+import base64
+import io
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+from PIL import Image, ImageOps
+
+from storage.blob_store import blob_store
+
+# Longest side of each stored version; "display" stands in for the full photo in the app
+RENDITION_SIZES = {
+    "display": int(os.getenv("IMAGE_DISPLAY_PX", "2048")),
+    "medium": int(os.getenv("IMAGE_MEDIUM_PX", "640")),
+    "small": int(os.getenv("IMAGE_SMALL_PX", "200")),
+}
+# Inline placeholder sent in listings before any thumbnail has loaded
+PREVIEW_PX = int(os.getenv("IMAGE_PREVIEW_PX", "24"))
+IMAGE_FORMAT = os.getenv("IMAGE_FORMAT", "WEBP")
+IMAGE_QUALITY = int(os.getenv("IMAGE_QUALITY", "80"))
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", "2"))
+# Decompression-bomb guard: larger pictures are rejected instead of decoded
+Image.MAX_IMAGE_PIXELS = int(os.getenv("IMAGE_MAX_PIXELS", str(64 * 1024 * 1024)))
+
+IMAGE_MEDIA_TYPE = f"image/{IMAGE_FORMAT.lower()}"
+# EXIF orientations 5-8 are rotated by 90°, so width and height swap when the picture is upright
+ORIENTATION_TAG = 0x0112
+
+
+def encode(image: Image.Image, quality: int = IMAGE_QUALITY) -> bytes:
+    buffer = io.BytesIO()
+    image.save(buffer, format=IMAGE_FORMAT, quality=quality, method=4)
+    return buffer.getvalue()
+
+
+def make_renditions(blob_hash: str) -> dict:
+    # Runs in a worker process: decode the original once, then shrink step by step (each size from the one
+    # above it, which is much cheaper than going back to the full photo) and store every version as a blob
+    with blob_store.open(blob_hash) as f:
+        image = Image.open(f)
+        width, height = image.size
+        if image.getexif().get(ORIENTATION_TAG) in (5, 6, 7, 8):
+            width, height = height, width
+        # JPEG can decode straight at a reduced scale, never smaller than the display size
+        image.draft("RGB", (RENDITION_SIZES["display"], RENDITION_SIZES["display"]))
+        image = ImageOps.exif_transpose(image)
+        image = image.convert("RGBA" if image.mode in ("RGBA", "LA", "P") else "RGB")
+
+    result = {"width": width, "height": height}
+    for name, size in sorted(RENDITION_SIZES.items(), key=lambda item: -item[1]):
+        image.thumbnail((size, size), Image.Resampling.LANCZOS, reducing_gap=3.0)
+        result[f"{name}_hash"], _ = blob_store.put(encode(image))
+
+    image.thumbnail((PREVIEW_PX, PREVIEW_PX), Image.Resampling.BILINEAR)
+    result["preview_base64"] = base64.b64encode(encode(image, quality=40)).decode("ascii")
+    return result
+
+
+_executor: Optional[ProcessPoolExecutor] = None
+
+
+async def make_renditions_async(blob_hash: str) -> dict:
+    # Image work stays off the API workers: a small process pool, created on first use
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=IMAGE_WORKERS)
+    return await asyncio.get_running_loop().run_in_executor(_executor, make_renditions, blob_hash)
+
+
+def shutdown_image_workers():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False)
+    _executor = None
@@ -0,0 +1,285 @@
+import asyncio
+import itertools
+import json
+import os
+from typing import Optional
+
+import numpy as np
+
+from inference.protocol import ERROR, REQUEST, ProtocolError, encode_frame, read_frame
+
+AI_HOST = os.getenv("AI_HOST", "model-inference")
+AI_PORT = int(os.getenv("AI_PORT", "9000"))
+AI_MAX_CONNECTIONS = int(os.getenv("AI_MAX_CONNECTIONS", "4"))
+AI_MAX_IN_FLIGHT_PER_CONNECTION = int(os.getenv("AI_MAX_IN_FLIGHT_PER_CONNECTION", "16"))
+AI_REQUEST_TIMEOUT_SECONDS = float(os.getenv("AI_REQUEST_TIMEOUT_SECONDS", "120"))
+AI_CONNECT_TIMEOUT_SECONDS = float(os.getenv("AI_CONNECT_TIMEOUT_SECONDS", "5"))
+# How long a classification waits for a cold AI service to finish warming up
+AI_READY_TIMEOUT_SECONDS = float(os.getenv("AI_READY_TIMEOUT_SECONDS", "60"))
+AI_READY_POLL_SECONDS = float(os.getenv("AI_READY_POLL_SECONDS", "1"))
+# Error the AI service answers with while its model is still loading, e.g. after a restart
+AI_STARTING_UP_ERROR = "still starting up"
+
+
+class AIServiceError(Exception):
+    pass
+
+
+class AIConnection:
+    def __init__(self, reader, writer, on_lost=None):
+        self.reader = reader
+        self.writer = writer
+        self.on_lost = on_lost
+        self.pending = {}
+        self.closed = False
+        self.read_task = asyncio.ensure_future(self._read_responses())
+
+    @property
+    def in_flight(self):
+        return len(self.pending)
+
+    async def request(self, request_id, metadata, payload):
+        future = asyncio.get_running_loop().create_future()
+        self.pending[request_id] = future
+        try:
+            self.writer.writelines(encode_frame(REQUEST, request_id, metadata, payload))
+            await self.writer.drain()
+        except Exception as e:
+            self.pending.pop(request_id, None)
+            self._fail(e)
+            raise AIServiceError(f"Failed to send request to AI service: {e}") from e
+
+        try:
+            return await future
+        finally:
+            self.pending.pop(request_id, None)
+
+    async def _read_responses(self):
+        # Replies can arrive in any order; match them to callers by request id
+        try:
+            while True:
+                message_type, request_id, metadata, payload = await read_frame(self.reader)
+                future = self.pending.pop(request_id, None)
+                if future is None or future.done():
+                    continue
+                if message_type == ERROR:
+                    future.set_exception(AIServiceError(metadata.get("error", "AI service error")))
+                else:
+                    future.set_result((metadata, payload))
+        except (asyncio.IncompleteReadError, ConnectionError, ProtocolError) as e:
+            self._fail(e)
+        except asyncio.CancelledError:
+            self._fail(AIServiceError("Connection closed"))
+            raise
+        except Exception as e:
+            # Anything else (e.g. undecodable metadata) leaves the stream in an unknown state as well
+            self._fail(e)
+
+    def _fail(self, exc):
+        if not self.closed and self.on_lost is not None:
+            self.on_lost(exc)
+        self.closed = True
+        for future in self.pending.values():
+            if not future.done():
+                future.set_exception(AIServiceError(f"Connection to AI service lost: {exc}"))
+        self.pending.clear()
+        self.writer.close()
+
+    async def close(self):
+        self.read_task.cancel()
+        try:
+            await self.read_task
+        except asyncio.CancelledError:
+            pass
+
+
+class AIConnectionPool:
+    def __init__(
+            self,
+            host: str = AI_HOST,
+            port: int = AI_PORT,
+            max_connections: int = AI_MAX_CONNECTIONS,
+            max_in_flight_per_connection: int = AI_MAX_IN_FLIGHT_PER_CONNECTION,
+            request_timeout: float = AI_REQUEST_TIMEOUT_SECONDS
+    ):
+        self.host = host
+        self.port = port
+        self.max_connections = max_connections
+        self.max_in_flight_per_connection = max_in_flight_per_connection
+        self.request_timeout = request_timeout
+        self.connections = []
+        self.request_ids = itertools.count(1)
+        # Called with the error whenever a connection breaks
+        self.on_connection_lost = None
+        # Created lazily so the lock binds to the server's event loop
+        self._lock = None
+
+    async def _connect(self):
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(self.host, self.port),
+            AI_CONNECT_TIMEOUT_SECONDS
+        )
+        return AIConnection(reader, writer, self.on_connection_lost)
+
+    async def _acquire(self):
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+
+        async with self._lock:
+            self.connections = [connection for connection in self.connections if not connection.closed]
+
+            # Multiplex onto existing connections and only open a new one when they are all busy
+            least_busy = min(self.connections, key=lambda c: c.in_flight, default=None)
+            if least_busy is not None and least_busy.in_flight < self.max_in_flight_per_connection:
+                return least_busy
+
+            if len(self.connections) < self.max_connections:
+                connection = await self._connect()
+                self.connections.append(connection)
+                return connection
+
+            return least_busy
+
+    async def request(self, metadata: dict, payload: bytes = b""):
+        connection = await self._acquire()
+        request_id = next(self.request_ids) % (2 ** 32)
+        return await asyncio.wait_for(
+            connection.request(request_id, metadata, payload),
+            self.request_timeout
+        )
+
+    async def close(self):
+        connections, self.connections = self.connections, []
+        for connection in connections:
+            await connection.close()
+
+
+class AIClient:
+    def __init__(self, pool: AIConnectionPool):
+        self.pool = pool
+        # Reported by the AI service with every reply; part of the result cache key
+        self.model_version: Optional[str] = None
+        # No classification is sent until the AI service says its model is warm
+        self.ready = False
+        self.startup: dict = {}
+        # A broken connection may mean the AI service restarted, so readiness is checked again
+        pool.on_connection_lost = self._connection_lost
+
+    def _connection_lost(self, exc):
+        self.ready = False
+
+    def _track_reply(self, metadata: dict, timings: Optional[dict]):
+        if metadata.get("model_version"):
+            self.model_version = metadata["model_version"]
+        # Per-stage milliseconds measured inside the AI service
+        if timings is not None:
+            timings.update({f"ai_{stage}": ms for stage, ms in metadata.get("timings", {}).items()})
+
+    async def model_info(self) -> dict:
+        metadata, payload = await self.pool.request({"op": "model_info"})
+        info = json.loads(payload)
+        self.model_version = info.get("model_version") or self.model_version
+        return info
+
+    async def readiness(self) -> dict:
+        metadata, payload = await self.pool.request({"op": "ready"})
+        info = json.loads(payload)
+        self.ready = bool(info.get("ready"))
+        self.startup = info.get("startup", {})
+        self.model_version = info.get("model_version") or self.model_version
+        return info
+
+    async def wait_until_ready(self, timeout: Optional[float] = AI_READY_TIMEOUT_SECONDS):
+        loop = asyncio.get_running_loop()
+        deadline = None if timeout is None else loop.time() + timeout
+        while not self.ready:
+            try:
+                await self.readiness()
+            except (AIServiceError, OSError, asyncio.TimeoutError):
+                # Not listening yet; the container may still be starting
+                pass
+            if self.ready:
+                print(f"✅ AI service is ready (model {self.model_version})")
+                break
+            if deadline is not None and loop.time() >= deadline:
+                raise AIServiceError("AI service is not ready yet")
+            await asyncio.sleep(AI_READY_POLL_SECONDS)
+
+    async def _classification_request(self, metadata: dict, payload) -> tuple:
+        await self.wait_until_ready()
+        try:
+            return await self.pool.request(metadata, payload)
+        except AIServiceError as e:
+            if AI_STARTING_UP_ERROR not in str(e):
+                raise
+        # Restarted since it was last seen ready: wait for the model again, then retry once
+        self.ready = False
+        await self.wait_until_ready()
+        return await self.pool.request(metadata, payload)
+
+    async def get_model_version(self) -> Optional[str]:
+        if self.model_version is None:
+            await self.model_info()
+        return self.model_version
+
+    async def classify(self, audio_bytes: bytes, content_type: str = "audio/mpeg",
+                       options: Optional[dict] = None, timings: Optional[dict] = None) -> dict:
+        metadata = {"op": "classify", "content_type": content_type, **(options or {})}
+        metadata, payload = await self._classification_request(metadata, audio_bytes)
+        self._track_reply(metadata, timings)
+        return json.loads(payload)
+
+    async def classify_pcm(self, waveform, sample_rate: int, options: Optional[dict] = None,
+                           timings: Optional[dict] = None) -> dict:
+        # Decoded samples go over the wire as-is; the AI service wraps them with np.frombuffer
+        metadata = {
+            "op": "classify",
+            "content_type": "audio/pcm",
+            "dtype": waveform.dtype.str,
+            "sample_rate": sample_rate,
+            "channels": 1,
+            **(options or {}),
+        }
+        metadata, payload = await self._classification_request(metadata, waveform)
+        self._track_reply(metadata, timings)
+        return json.loads(payload)
+
+    async def classify_pcm_batch(self, waveforms, sample_rate: int, options: Optional[dict] = None,
+                                 timings: Optional[dict] = None) -> list:
+        # Several signals classified in a single round trip: equal-length rows as one (rows, samples) array,
+        # or a list of signals of any length, sent back to back with their lengths
+        metadata = {
+            "op": "classify_batch",
+            "content_type": "audio/pcm",
+            "sample_rate": sample_rate,
+            "channels": 1,
+            "rows": len(waveforms),
+            **(options or {}),
+        }
+        if isinstance(waveforms, np.ndarray):
+            payload = np.ascontiguousarray(waveforms)
+        else:
+            metadata["lengths"] = [len(waveform) for waveform in waveforms]
+            payload = np.concatenate(waveforms)
+        metadata["dtype"] = payload.dtype.str
+        metadata, payload = await self._classification_request(metadata, payload)
+        self._track_reply(metadata, timings)
+        return json.loads(payload)
+
+    async def embed_pcm(self, waveform, sample_rate: int) -> np.ndarray:
+        metadata = {
+            "op": "embed",
+            "content_type": "audio/pcm",
+            "dtype": waveform.dtype.str,
+            "sample_rate": sample_rate,
+            "channels": 1,
+        }
+        metadata, payload = await self._classification_request(metadata, waveform)
+        self._track_reply(metadata, None)
+        return np.frombuffer(payload, dtype=metadata["dtype"]).reshape(metadata["shape"])
+
+    async def close(self):
+        await self.pool.close()
+
+
+ai_client = AIClient(AIConnectionPool())
@@ -0,0 +1,53 @@
+import json
+import struct
+
+# Wire format shared with the AI service (backend/AiInference/protocol.py):
+#   magic | version | message type | request id | metadata length | payload length
+#   followed by the JSON metadata and the raw payload bytes.
+MAGIC = b"TWTR"
+VERSION = 1
+
+REQUEST = 1
+RESPONSE = 2
+ERROR = 3
+
+HEADER = struct.Struct("!4sBBIIQ")
+
+MAX_METADATA_BYTES = 64 * 1024
+
+
+class ProtocolError(Exception):
+    pass
+
+
+def encode_frame(message_type, request_id, metadata, payload=b""):
+    # Any buffer works as payload (bytes, bytearray, NumPy arrays) and is sent without copying
+    payload = memoryview(payload).cast("B")
+    metadata_bytes = json.dumps(metadata).encode("utf-8")
+    header = HEADER.pack(MAGIC, VERSION, message_type, request_id, len(metadata_bytes), payload.nbytes)
+    return [header, metadata_bytes, payload]
+
+
+def decode_header(buffer):
+    magic, version, message_type, request_id, metadata_length, payload_length = HEADER.unpack(buffer)
+    if magic != MAGIC:
+        raise ProtocolError(f"Bad frame magic {magic!r}")
+    if version != VERSION:
+        raise ProtocolError(f"Unsupported protocol version {version}")
+    if metadata_length > MAX_METADATA_BYTES:
+        raise ProtocolError(f"Metadata too large: {metadata_length} bytes")
+    return message_type, request_id, metadata_length, payload_length
+
+
+def decode_metadata(buffer):
+    if not buffer:
+        return {}
+    return json.loads(bytes(buffer).decode("utf-8"))
+
+
+async def read_frame(reader):
+    header = await reader.readexactly(HEADER.size)
+    message_type, request_id, metadata_length, payload_length = decode_header(header)
+    metadata = decode_metadata(await reader.readexactly(metadata_length))
+    payload = await reader.readexactly(payload_length)
+    return message_type, request_id, metadata, payload
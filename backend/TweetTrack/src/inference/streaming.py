@@ -0,0 +1,130 @@
+import os
+from typing import Optional
+
+import numpy as np
+
+from audio.decoding import PCM_SAMPLE_RATE
+from audio.resampler import StreamResampler
+from audio.ring_buffer import RingBuffer
+from inference.ai_client import ai_client
+
+STREAM_WINDOW_SECONDS = 5.0
+STREAM_HOP_SECONDS = float(os.getenv("STREAM_HOP_SECONDS", "2.5"))
+# History kept per stream; only the latest window is ever classified
+STREAM_BUFFER_SECONDS = float(os.getenv("STREAM_BUFFER_SECONDS", "10"))
+STREAM_MAX_SECONDS = float(os.getenv("STREAM_MAX_SECONDS", "600"))
+STREAM_MAX_CHUNK_BYTES = int(os.getenv("STREAM_MAX_CHUNK_BYTES", str(512 * 1024)))
+# Labels remembered in the running ranking of a stream
+STREAM_MAX_TRACKED_LABELS = int(os.getenv("STREAM_MAX_TRACKED_LABELS", "50"))
+# A tail shorter than this after the last window is not worth one more inference at stop
+STREAM_MIN_TAIL_SECONDS = float(os.getenv("STREAM_MIN_TAIL_SECONDS", "0.5"))
+
+STREAM_DTYPES = {"<f4", "<i2"}
+
+
+class StreamError(Exception):
+    pass
+
+
+class ClassificationStream:
+    def __init__(self, sample_rate: int = PCM_SAMPLE_RATE, dtype: str = "<f4", top_k: int = 5,
+                 hop_seconds: Optional[float] = None, min_score: float = 0.0):
+        if dtype not in STREAM_DTYPES:
+            raise StreamError(f"Unsupported dtype: {dtype}. Choose from {sorted(STREAM_DTYPES)}")
+
+        self.sample_rate = sample_rate
+        self.dtype = np.dtype(dtype)
+        self.options = {"top_k": top_k, "min_score": min_score, "windowed": False}
+        self.window_samples = int(STREAM_WINDOW_SECONDS * PCM_SAMPLE_RATE)
+        self.hop_samples = int((hop_seconds or STREAM_HOP_SECONDS) * PCM_SAMPLE_RATE)
+        self.buffer = RingBuffer(max(self.window_samples, int(STREAM_BUFFER_SECONDS * PCM_SAMPLE_RATE)))
+
+        # Chunks at other rates are resampled to 32 kHz on arrival, as one continuous signal
+        self.resampler = StreamResampler(sample_rate, PCM_SAMPLE_RATE) if sample_rate != PCM_SAMPLE_RATE else None
+        self.leftover = b""
+
+        # Sample count (since the start) at the end of the last classified window
+        self.classified_until = 0
+        self.windows_classified = 0
+        # Label -> best probability in any window so far, i.e. max pooling over the stream
+        self.best = {}
+        self.latest_result = None
+
+    @property
+    def seconds_received(self) -> float:
+        return self.buffer.total_written / PCM_SAMPLE_RATE
+
+    def feed(self, data: bytes):
+        if len(data) > STREAM_MAX_CHUNK_BYTES:
+            raise StreamError(f"Chunk too large: {len(data)} bytes")
+
+        # Keep a partial sample for the next chunk instead of dropping it
+        data = self.leftover + data
+        usable = len(data) - len(data) % self.dtype.itemsize
+        data, self.leftover = data[:usable], data[usable:]
+
+        chunk = np.frombuffer(data, dtype=self.dtype)
+        if self.dtype.kind == "i":
+            chunk = chunk.astype(np.float32) / 32768.0
+        if self.resampler is not None:
+            chunk = self.resampler.process(chunk)
+
+        self.buffer.write(chunk)
+        if self.seconds_received > STREAM_MAX_SECONDS:
+            raise StreamError(f"Stream longer than {STREAM_MAX_SECONDS:.0f} s")
+
+    def finish(self):
+        # The resampler holds back the last few samples until it knows the stream has ended
+        if self.resampler is not None:
+            self.buffer.write(self.resampler.flush())
+
+    def window_due(self) -> bool:
+        # First window once 5 s have arrived, then one per hop of new audio
+        total = self.buffer.total_written
+        if self.windows_classified == 0:
+            return total >= self.window_samples
+        return total - self.classified_until >= self.hop_samples
+
+    def tail_pending(self) -> bool:
+        return self.buffer.total_written - self.classified_until >= STREAM_MIN_TAIL_SECONDS * PCM_SAMPLE_RATE
+
+    async def classify_latest(self) -> dict:
+        # Always the newest window: if inference falls behind, stale windows are skipped, not queued
+        end = self.buffer.total_written
+        window = self.buffer.latest(self.window_samples)
+        result = await ai_client.classify_pcm(window, PCM_SAMPLE_RATE, self.options)
+
+        self.classified_until = end
+        self.windows_classified += 1
+        self.latest_result = result
+        self.track(result)
+        return {
+            "type": "prediction",
+            "start": round(max(0, end - self.window_samples) / PCM_SAMPLE_RATE, 3),
+            "end": round(end / PCM_SAMPLE_RATE, 3),
+            "window": result,
+            "overall": self.overall(),
+        }
+
+    def track(self, result: dict):
+        for entry in result.get("top_k", {}).get("species", []):
+            if entry["probability"] > self.best.get(entry["label"], 0.0):
+                self.best[entry["label"]] = entry["probability"]
+
+        if len(self.best) > STREAM_MAX_TRACKED_LABELS:
+            kept = sorted(self.best.items(), key=lambda item: item[1], reverse=True)
+            self.best = dict(kept[:STREAM_MAX_TRACKED_LABELS])
+
+    def overall(self) -> list:
+        ranked = sorted(self.best.items(), key=lambda item: item[1], reverse=True)
+        return [{"label": label, "probability": probability}
+                for label, probability in ranked[:self.options["top_k"]]]
+
+    def final(self) -> dict:
+        return {
+            "type": "final",
+            "seconds": round(self.seconds_received, 3),
+            "windows": self.windows_classified,
+            "overall": self.overall(),
+            "last_window": self.latest_result,
+        }
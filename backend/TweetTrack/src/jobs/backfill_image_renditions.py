@@ -0,0 +1,55 @@
+"""Make the display version, thumbnails and inline preview for images uploaded before they existed.
+
+Run from backend/TweetTrack (or /app in the container) after jobs.migrate_blobs has moved the images out of
+the database:
+
+    PYTHONPATH=src python -m jobs.backfill_image_renditions --workers 4
+
+New uploads get their renditions in the background; this only covers older rows. Images that fail to
+decode are reported and skipped, so they are retried on the next run.
+"""
+import argparse
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from db import SessionLocal
+from imaging.renditions import make_renditions
+from repositories.bird_image_repository import BirdImageRepository
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Make renditions for images that have none yet")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--batch-size", type=int, default=100)
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    repo = BirdImageRepository(db)
+    done = failed = 0
+    after = None
+    start = time.monotonic()
+    try:
+        with ProcessPoolExecutor(max_workers=args.workers) as executor:
+            while True:
+                rows = repo.get_images_without_renditions(args.batch_size, after)
+                if not rows:
+                    break
+                after = rows[-1].id
+
+                futures = [(row.id, executor.submit(make_renditions, row.blob_hash)) for row in rows]
+                for image_id, future in futures:
+                    try:
+                        repo.set_renditions(image_id, future.result())
+                        done += 1
+                    except Exception as e:
+                        failed += 1
+                        print(f"❌ Image {image_id}: {e}")
+                print(f"🖼️ {done} images done, {failed} failed, {done / max(time.monotonic() - start, 1e-9):.1f} images/s")
+    finally:
+        db.close()
+
+    print(f"✅ Renditions made for {done} images ({failed} failed)")
+
+
+if __name__ == "__main__":
+    main()
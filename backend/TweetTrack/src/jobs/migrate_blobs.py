@@ -0,0 +1,120 @@
+"""Move images and sounds stored inside PostgreSQL into the blob store.
+
+Run from backend/TweetTrack (or /app in the container) after create_tables.py has added the blob columns:
+
+    PYTHONPATH=src python -m jobs.migrate_blobs --batch-size 200
+    PYTHONPATH=src python -m jobs.migrate_blobs --only sounds --dry-run
+    PYTHONPATH=src python -m jobs.migrate_blobs --sweep-orphans --dry-run
+
+Each batch is written to the store first and committed afterwards, so an interrupted run leaves at most
+some unreferenced blobs behind and simply continues on the next run. The freed table space is only
+returned to the OS by VACUUM FULL (or pg_repack) once everything is moved.
+
+Uploads do the same: the blob is committed before its row is inserted, so a failed insert (or a failed
+rendition run) leaves an unreferenced blob. --sweep-orphans deletes blobs that no image or sound row
+points at, skipping any younger than --min-age-hours so an upload between the two steps is never hit.
+"""
+import argparse
+import base64
+import itertools
+import time
+
+from db import SessionLocal
+from repositories.bird_image_repository import BirdImageRepository
+from repositories.bird_sound_repository import BirdSoundRepository
+from storage.blob_store import blob_store
+from storage.uploads import sniff_image_type
+
+
+def migrate(kind, fetch, move, to_blob, batch_size, dry_run):
+    moved = stored_bytes = 0
+    digests = set()
+    after = None
+    start = time.monotonic()
+
+    while True:
+        rows = fetch(batch_size, after)
+        if not rows:
+            break
+        after = rows[-1].id
+
+        blobs = []
+        for row in rows:
+            data, extra = to_blob(row)
+            if dry_run:
+                blobs.append({"id": row.id, "blob_size": len(data)})
+                continue
+            blob_hash, blob_size = blob_store.put(data)
+            digests.add(blob_hash)
+            blobs.append({"id": row.id, "blob_hash": blob_hash, "blob_size": blob_size, **extra})
+
+        if not dry_run:
+            move(blobs)
+        moved += len(blobs)
+        stored_bytes += sum(blob["blob_size"] for blob in blobs)
+        print(f"📦 {kind}: {moved} moved, {stored_bytes / 1024 / 1024:.1f} MB, "
+              f"{moved / max(time.monotonic() - start, 1e-9):.0f} rows/s")
+
+    distinct = f" into {len(digests)} distinct blobs" if not dry_run else ""
+    print(f"✅ {kind}: {moved} rows {'would be ' if dry_run else ''}moved{distinct}")
+
+
+def sweep_orphans(image_repo, sound_repo, min_age_hours, batch_size, dry_run):
+    checked = deleted = 0
+    cutoff = time.time() - min_age_hours * 3600
+    candidates = (digest for digest, modified in blob_store.iter_blobs() if modified < cutoff)
+
+    while True:
+        digests = list(itertools.islice(candidates, batch_size))
+        if not digests:
+            break
+        referenced = image_repo.referenced_blobs(digests) | sound_repo.referenced_blobs(digests)
+        orphans = [digest for digest in digests if digest not in referenced]
+        if not dry_run:
+            for digest in orphans:
+                blob_store.delete(digest)
+        checked += len(digests)
+        deleted += len(orphans)
+        print(f"🧹 {checked} blobs checked, {deleted} unreferenced")
+
+    print(f"✅ {deleted} of {checked} blobs older than {min_age_hours:g} h {'would be ' if dry_run else ''}deleted")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Move inline images and sounds into the blob store")
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--only", choices=("images", "sounds"))
+    parser.add_argument("--dry-run", action="store_true", help="count what would move without writing")
+    parser.add_argument("--sweep-orphans", action="store_true",
+                        help="instead of migrating, delete blobs that no row references")
+    parser.add_argument("--min-age-hours", type=float, default=24, help="only sweep blobs older than this")
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        if args.sweep_orphans:
+            sweep_orphans(BirdImageRepository(db), BirdSoundRepository(db), args.min_age_hours,
+                          args.batch_size, args.dry_run)
+            return
+
+        if args.only in (None, "sounds"):
+            sound_repo = BirdSoundRepository(db)
+            migrate("sounds", sound_repo.get_inline_sounds, sound_repo.move_sounds_to_blobs,
+                    lambda row: (bytes(row.sound_data), {}), args.batch_size, args.dry_run)
+
+        if args.only in (None, "images"):
+            image_repo = BirdImageRepository(db)
+
+            def image_blob(row):
+                data = base64.b64decode(row.base64_image)
+                # The legacy rows never stored a type, so it is sniffed from the first bytes
+                return data, {"content_type": sniff_image_type(data[:16]) or "application/octet-stream"}
+
+            migrate("images", image_repo.get_inline_images, image_repo.move_images_to_blobs,
+                    image_blob, args.batch_size, args.dry_run)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,253 @@
+"""Re-classify every stored sound with the current model and fill the taxonomy table.
+
+Run from backend/TweetTrack (or /app in the container) with the AI service up:
+
+    PYTHONPATH=src python -m jobs.reclassify_sounds --workers 4 --in-flight 32 --request-rows 16
+    PYTHONPATH=src python -m jobs.reclassify_sounds --restart      # ignore the checkpoint
+
+Decoded sounds go to the AI service in classify_batch requests of up to --request-rows recordings (and
+--request-seconds of audio), so the model sees large batches regardless of timing. Each observation gets
+the best-scoring prediction over all its sounds. Progress is checkpointed per completed batch of
+observations, so an interrupted run picks up where it stopped.
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+
+from audio.decoding import PCM_SAMPLE_RATE, decode_to_pcm
+from db import SessionLocal
+from inference.ai_client import ai_client
+from repositories.bird_sound_repository import BirdSoundRepository
+from repositories.taxonomy_repository import TaxonomyRepository
+from storage.blob_store import blob_store
+
+CHECKPOINT_PATH = "reclassify_checkpoint.json"
+
+
+def load_checkpoint(path):
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def save_checkpoint(path, checkpoint):
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "w") as f:
+        json.dump(checkpoint, f, indent=2)
+    os.replace(temp_path, path)
+
+
+def taxonomy_row(user_bird_id, bird_data):
+    # Species info can be missing from the catalog; fall back to the eBird code rather than skip the row
+    label = bird_data.get("label", "")
+    return {
+        "id": user_bird_id,
+        "scientific_name": bird_data.get("scientific_name") or label,
+        "common_name": bird_data.get("common_name") or label,
+        "genus": bird_data["genus"],
+        "family": bird_data["family"],
+        "order": bird_data["order"],
+    }
+
+
+class Reclassifier:
+    def __init__(self, workers, in_flight, batch_size, checkpoint_path, request_rows, request_seconds, gate):
+        self.decoders = ProcessPoolExecutor(max_workers=workers)
+        self.slots = asyncio.Semaphore(in_flight)
+        self.batch_size = batch_size
+        self.checkpoint_path = checkpoint_path
+        self.request_rows = request_rows
+        self.request_samples = int(request_seconds * PCM_SAMPLE_RATE)
+        # Same gating as a single classification; the batch op leaves it off unless asked
+        self.options = {"gate": gate, "lookup": True}
+
+        self.sounds_done = 0
+        self.sounds_failed = 0
+        self.previous_done = 0
+        self.observations_written = 0
+        self.decode_seconds = 0.0
+        self.classify_seconds = 0.0
+        self.requests_sent = 0
+        self.largest_request = 0
+
+    async def decode_sound(self, row):
+        loop = asyncio.get_running_loop()
+        file_extension = os.path.splitext(row.file_name or "")[1].lower()
+        try:
+            async with self.slots:
+                start = time.perf_counter()
+                audio_bytes = row.sound_data
+                if audio_bytes is None:
+                    audio_bytes = await asyncio.to_thread(blob_store.read, row.blob_hash)
+                waveform = await loop.run_in_executor(self.decoders, decode_to_pcm, audio_bytes, file_extension)
+                self.decode_seconds += time.perf_counter() - start
+                return waveform
+        except Exception as e:
+            print(f"❌ Sound {row.id}: {e}")
+            return None
+
+    async def classify_group(self, rows):
+        # Decodes one group of sounds, then classifies them in as few requests as the size limits allow
+        waveforms = await asyncio.gather(*(self.decode_sound(row) for row in rows))
+        results = [None] * len(rows)
+        decoded = [index for index, waveform in enumerate(waveforms) if waveform is not None and len(waveform)]
+
+        requests, current, samples = [], [], 0
+        for index in decoded:
+            if current and samples + len(waveforms[index]) > self.request_samples:
+                requests.append(current)
+                current, samples = [], 0
+            current.append(index)
+            samples += len(waveforms[index])
+        if current:
+            requests.append(current)
+
+        for indices in requests:
+            start = time.perf_counter()
+            try:
+                batch = await ai_client.classify_pcm_batch(
+                    [waveforms[index] for index in indices], PCM_SAMPLE_RATE, self.options
+                )
+            except Exception as e:
+                print(f"❌ Batch of {len(indices)} sounds: {e}")
+                continue
+            self.classify_seconds += time.perf_counter() - start
+            self.requests_sent += 1
+            self.largest_request = max(self.largest_request, len(indices))
+            for index, bird_data in zip(indices, batch):
+                results[index] = bird_data
+
+        self.sounds_done += sum(result is not None for result in results)
+        self.sounds_failed += sum(result is None for result in results)
+        return results
+
+    async def classify_rows(self, rows):
+        # Groups run concurrently, so one group is classified while the next is still decoding
+        groups = [rows[start:start + self.request_rows] for start in range(0, len(rows), self.request_rows)]
+        results = await asyncio.gather(*(self.classify_group(group) for group in groups))
+        return [bird_data for group in results for bird_data in group]
+
+    async def run(self, checkpoint, limit=None):
+        self.previous_done = checkpoint.get("sounds_done", 0)
+        read_db, write_db = SessionLocal(), SessionLocal()
+        try:
+            after = checkpoint.get("last_user_bird_id")
+            batches = BirdSoundRepository(read_db).stream_sounds(
+                uuid.UUID(after) if after else None, self.batch_size
+            )
+            taxonomy_repo = TaxonomyRepository(write_db)
+
+            # Best prediction per observation; the last observation of a batch may continue in the next one
+            best = {}
+            stopped_early = False
+            start = time.monotonic()
+            next_batch = asyncio.ensure_future(asyncio.to_thread(next, batches, None))
+
+            while True:
+                rows = await next_batch
+                if not rows:
+                    break
+                # Fetch the next batch from the cursor while this one decodes and classifies
+                next_batch = asyncio.ensure_future(asyncio.to_thread(next, batches, None))
+
+                results = await self.classify_rows(rows)
+                for row, bird_data in zip(rows, results):
+                    if bird_data is None or "genus" not in bird_data:
+                        continue
+                    current = best.get(row.user_bird_id)
+                    if current is None or bird_data["probability"] > current["probability"]:
+                        best[row.user_bird_id] = bird_data
+
+                # Everything before the last observation in this batch is complete
+                last_user_bird_id = rows[-1].user_bird_id
+                complete = {key: value for key, value in best.items() if key != last_user_bird_id}
+                best = {key: value for key, value in best.items() if key == last_user_bird_id}
+                completed_until = max((row.user_bird_id for row in rows if row.user_bird_id != last_user_bird_id),
+                                      default=None)
+
+                await asyncio.to_thread(self.flush, taxonomy_repo, complete, checkpoint, completed_until)
+                self.report(start)
+
+                if limit and self.sounds_done + self.sounds_failed >= limit:
+                    stopped_early = True
+                    break
+
+            next_batch.cancel()
+            if stopped_early:
+                # The last observation may have sounds beyond this batch; the next run classifies it again
+                print(f"Stopped at --limit; observation {last_user_bird_id} is left for the next run")
+            elif best:
+                await asyncio.to_thread(self.flush, taxonomy_repo, best, checkpoint, max(best))
+            self.report(start, final=True)
+        finally:
+            read_db.close()
+            write_db.close()
+            self.decoders.shutdown()
+            await ai_client.close()
+
+    def flush(self, taxonomy_repo, results, checkpoint, completed_until):
+        rows = [taxonomy_row(user_bird_id, bird_data) for user_bird_id, bird_data in results.items()]
+        self.observations_written += taxonomy_repo.upsert_taxonomies(rows)
+
+        if completed_until is not None:
+            checkpoint.update(
+                last_user_bird_id=str(completed_until),
+                model_version=ai_client.model_version,
+                sounds_done=self.previous_done + self.sounds_done,
+                observations_done=checkpoint.get("observations_done", 0) + len(rows),
+            )
+            save_checkpoint(self.checkpoint_path, checkpoint)
+
+    def report(self, start, final=False):
+        elapsed = max(time.monotonic() - start, 1e-9)
+        processed = self.sounds_done + self.sounds_failed
+        print(
+            f"{'✅ Done:' if final else '📈'} {processed} sounds ({self.sounds_failed} failed), "
+            f"{self.observations_written} observations written, {processed / elapsed:.1f} rows/s "
+            f"(decode {self.decode_seconds / max(processed, 1) * 1000:.0f} ms per sound, "
+            f"{self.requests_sent} batch requests of {self.sounds_done / max(self.requests_sent, 1):.1f} sounds "
+            f"on average, at most {self.largest_request}, "
+            f"{self.classify_seconds / max(self.requests_sent, 1) * 1000:.0f} ms each)"
+        )
+
+
+async def main_async(args):
+    checkpoint = {} if args.restart else load_checkpoint(args.checkpoint)
+
+    await ai_client.wait_until_ready()
+    if checkpoint.get("model_version") and checkpoint["model_version"] != ai_client.model_version:
+        print(f"Model changed since the checkpoint ({checkpoint['model_version']}), starting over")
+        checkpoint = {}
+    if checkpoint.get("last_user_bird_id"):
+        print(f"Resuming after observation {checkpoint['last_user_bird_id']}")
+
+    reclassifier = Reclassifier(args.workers, args.in_flight, args.batch_size, args.checkpoint,
+                                args.request_rows, args.request_seconds, args.gate)
+    await reclassifier.run(checkpoint, args.limit)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-classify stored sounds into the taxonomy table")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 4, help="decode processes")
+    parser.add_argument("--in-flight", type=int, default=32, help="sounds decoding at once")
+    parser.add_argument("--batch-size", type=int, default=64, help="rows fetched from the cursor at a time")
+    parser.add_argument("--request-rows", type=int, default=16,
+                        help="sounds per classify_batch request; at least the AI service's BATCH_MAX_SIZE")
+    parser.add_argument("--request-seconds", type=float, default=600,
+                        help="audio per request at most, which keeps requests below MAX_PAYLOAD_BYTES")
+    parser.add_argument("--gate", action=argparse.BooleanOptionalAction, default=True,
+                        help="skip silent and noise-only windows, as single classifications do")
+    parser.add_argument("--checkpoint", default=CHECKPOINT_PATH)
+    parser.add_argument("--restart", action="store_true", help="ignore the checkpoint and start from the beginning")
+    parser.add_argument("--limit", type=int, help="stop after about this many sounds")
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,4 @@
+from typing import List, Optional
 from uuid import UUID
 from pydantic import BaseModel
 
@@ -5,4 +6,11 @@ class BirdLocationDTO(BaseModel):
     id: UUID
     birdId: UUID
     latitude: float
-    longitude: float
\ No newline at end of file
+    longitude: float
+
+class BirdLocationAreaDTO(BaseModel):
+    locations: List[BirdLocationDTO]
+    # More locations lie in the area than the limit; none are returned then, zoom in to see them
+    truncated: bool
+    # Locations in the area, or null when truncated (only "more than the limit" is known)
+    count: Optional[int]
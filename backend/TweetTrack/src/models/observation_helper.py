@@ -1,5 +1,6 @@
-from typing import Optional
+from typing import Optional, Tuple
 
+import base64
 import uuid
 from pydantic import BaseModel, Field
 from datetime import datetime
@@ -26,3 +27,16 @@ class BirdObservationResponse(BaseModel):
 
     class Config:
         from_attributes = True
+
+
+def encode_observation_cursor(observed_at: datetime, observation_id: uuid.UUID) -> str:
+    # Opaque to clients: the (observed_at, id) of the last row on the page
+    raw = f"{observed_at.isoformat()}|{observation_id}".encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_observation_cursor(cursor: str) -> Tuple[datetime, uuid.UUID]:
+    # Raises ValueError for anything encode_observation_cursor did not produce
+    raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode("utf-8")
+    observed_at, observation_id = raw.split("|")
+    return datetime.fromisoformat(observed_at), uuid.UUID(observation_id)
@@ -1,8 +1,9 @@
-from sqlalchemy.orm import Session
-from typing import List, Type
+from sqlalchemy import func, select, update
+from sqlalchemy.orm import Session, defer
+from typing import List, Optional, Type
 import uuid
 
-from db_tables import UserBirdImage
+from db_tables import UserBird, UserBirdImage
 
 
 class BirdImageRepository:
@@ -15,8 +16,63 @@ class BirdImageRepository:
         self.db.refresh(bird_image)
         return bird_image
 
-    def get_images_by_user_bird_ids(self, user_bird_ids: List[uuid.UUID]) -> list[Type[UserBirdImage]]:
-        return self.db.query(UserBirdImage).filter(
-            UserBirdImage.user_bird_id.in_(user_bird_ids)
-        ).all()
+    def get_images_for_bird(self, ebird_id: str, limit: int = 50,
+                            after: Optional[uuid.UUID] = None) -> list[Type[UserBirdImage]]:
+        # One page in image id order, without the legacy inline image data
+        query = (
+            self.db.query(UserBirdImage)
+            .options(defer(UserBirdImage.base64_image))
+            .join(UserBird, UserBird.id == UserBirdImage.user_bird_id)
+            .filter(UserBird.ebird_id == ebird_id)
+        )
+        if after is not None:
+            query = query.filter(UserBirdImage.id > after)
+        return query.order_by(UserBirdImage.id).limit(limit).all()
 
+    def count_images_for_bird(self, ebird_id: str) -> int:
+        return (
+            self.db.query(func.count(UserBirdImage.id))
+            .join(UserBird, UserBird.id == UserBirdImage.user_bird_id)
+            .filter(UserBird.ebird_id == ebird_id)
+            .scalar()
+        )
+
+    def get_image(self, image_id: uuid.UUID) -> Optional[UserBirdImage]:
+        return self.db.query(UserBirdImage).filter(UserBirdImage.id == image_id).first()
+
+    def set_renditions(self, image_id: uuid.UUID, renditions: dict):
+        self.db.execute(update(UserBirdImage).where(UserBirdImage.id == image_id).values(**renditions))
+        self.db.commit()
+
+    def get_images_without_renditions(self, limit: int, after: Optional[uuid.UUID] = None) -> list:
+        query = select(UserBirdImage.id, UserBirdImage.blob_hash).where(
+            UserBirdImage.blob_hash.is_not(None), UserBirdImage.small_hash.is_(None)
+        )
+        if after is not None:
+            query = query.where(UserBirdImage.id > after)
+        return self.db.execute(query.order_by(UserBirdImage.id).limit(limit)).all()
+
+    def get_inline_images(self, limit: int, after: Optional[uuid.UUID] = None) -> list:
+        # Images still stored as base64 in the table, in id order, for moving them to the blob store
+        query = select(UserBirdImage.id, UserBirdImage.base64_image).where(
+            UserBirdImage.blob_hash.is_(None), UserBirdImage.base64_image.is_not(None)
+        )
+        if after is not None:
+            query = query.where(UserBirdImage.id > after)
+        return self.db.execute(query.order_by(UserBirdImage.id).limit(limit)).all()
+
+    def referenced_blobs(self, digests: List[str]) -> set:
+        # Which of these digests an image row points at, as its original or as a rendition
+        found = set()
+        for column in (UserBirdImage.blob_hash, UserBirdImage.display_hash,
+                       UserBirdImage.medium_hash, UserBirdImage.small_hash):
+            found.update(self.db.scalars(select(column).where(column.in_(digests)).distinct()))
+        return found
+
+    def move_images_to_blobs(self, blobs: List[dict]):
+        # blobs: {"id", "blob_hash", "blob_size", "content_type"} per image
+        self.db.execute(
+            update(UserBirdImage),
+            [{**blob, "base64_image": None} for blob in blobs]
+        )
+        self.db.commit()
@@ -1,9 +1,24 @@
+from sqlalchemy import func, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from typing import List, Optional
 import uuid
 from db_tables import BirdLocation
 
 
+def area_condition(min_lat: float, max_lat: float, min_lng: float, max_lng: float):
+    # point <@ box matches the GiST index on bird_location; box edges count as inside
+    def inside(west: float, east: float):
+        return func.point(BirdLocation.longitude, BirdLocation.latitude).op("<@")(
+            func.box(func.point(west, min_lat), func.point(east, max_lat))
+        )
+
+    if min_lng <= max_lng:
+        return inside(min_lng, max_lng)
+    # A box across the antimeridian (west edge east of the east edge) is two boxes
+    return or_(inside(min_lng, 180.0), inside(-180.0, max_lng))
+
+
 class BirdLocationRepository:
     def __init__(self, db: Session):
         self.db = db
@@ -24,13 +39,44 @@ class BirdLocationRepository:
         return bird_location
 
     def get_locations_in_area(self, min_lat: float, max_lat: float,
-                              min_lng: float, max_lng: float) -> List[BirdLocation]:
+                              min_lng: float, max_lng: float, limit: int) -> List[BirdLocation]:
+        # Unordered, so the cap bounds the work: sorting would visit every match in the box first
         return self.db.query(BirdLocation).filter(
-            BirdLocation.latitude >= min_lat,
-            BirdLocation.latitude <= max_lat,
-            BirdLocation.longitude >= min_lng,
-            BirdLocation.longitude <= max_lng
-        ).all()
+            area_condition(min_lat, max_lat, min_lng, max_lng)
+        ).limit(limit).all()
 
     def rollback(self):
-        self.db.rollback()
\ No newline at end of file
+        self.db.rollback()
+
+
+class AsyncBirdLocationRepository:
+    # Same queries on an AsyncSession, for the async routes
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def get_all_locations(self, limit: int = 100, offset: int = 0) -> List[BirdLocation]:
+        result = await self.db.scalars(select(BirdLocation).offset(offset).limit(limit))
+        return list(result)
+
+    async def get_locations_by_bird_id(self, bird_id: uuid.UUID) -> List[BirdLocation]:
+        result = await self.db.scalars(select(BirdLocation).where(BirdLocation.bird_id == bird_id))
+        return list(result)
+
+    async def get_location_by_id(self, location_id: uuid.UUID) -> Optional[BirdLocation]:
+        return await self.db.get(BirdLocation, location_id)
+
+    async def create_location(self, bird_location: BirdLocation) -> BirdLocation:
+        self.db.add(bird_location)
+        await self.db.commit()
+        await self.db.refresh(bird_location)
+        return bird_location
+
+    async def get_locations_in_area(self, min_lat: float, max_lat: float,
+                                    min_lng: float, max_lng: float, limit: int) -> List[BirdLocation]:
+        result = await self.db.scalars(
+            select(BirdLocation).where(area_condition(min_lat, max_lat, min_lng, max_lng)).limit(limit)
+        )
+        return list(result)
+
+    async def rollback(self):
+        await self.db.rollback()
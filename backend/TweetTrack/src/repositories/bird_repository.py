@@ -1,5 +1,7 @@
-from sqlalchemy.orm import Session, joinedload
-from typing import List, Optional, Type
+from sqlalchemy import func, literal, tuple_
+from sqlalchemy.orm import Query, Session, joinedload
+from typing import List, Optional, Tuple, Type
+from datetime import datetime
 import uuid
 
 from db_tables import UserBird, Bird, BirdLocation
@@ -15,13 +17,32 @@ class BirdRepository:
     def get_bird_by_ebird_id(self, ebird_id: str) -> Optional[Bird]:
         return self.db.query(Bird).filter(Bird.ebird_id == ebird_id).first()
 
-    def get_user_observations(self, skip: int = 0, limit: int = 100, user_id: uuid.UUID = None):
+    def _observation_page(self, query: Query, skip: int, limit: int,
+                          after: Optional[Tuple[datetime, uuid.UUID]]) -> list[Type[UserBird]]:
+        # Newest first with id as the tie-breaker, so pages are stable. With a cursor the page starts with an
+        # index seek past the last row already seen, and deep pages cost the same as the first one
+        if after:
+            observed_at, user_bird_id = after
+            query = query.filter(tuple_(UserBird.observed_at, UserBird.id) < tuple_(
+                literal(observed_at, UserBird.observed_at.type), literal(user_bird_id, UserBird.id.type)
+            ))
+
+        return (
+            query.order_by(UserBird.observed_at.desc(), UserBird.id.desc())
+            .offset(skip)
+            .limit(limit)
+            .all()
+        )
+
+    def get_user_observations(self, skip: int = 0, limit: int = 100, user_id: uuid.UUID = None,
+                              after: Optional[Tuple[datetime, uuid.UUID]] = None):
         query = self.db.query(UserBird).options(joinedload(UserBird.bird))
 
         if user_id:
             query = query.filter(UserBird.user_id == user_id)
 
-        return query.offset(skip).limit(limit).all()
+        return self._observation_page(query, skip, limit, after)
+
     def create_user_bird_observation(self, user_bird: UserBird) -> UserBird:
         self.db.add(user_bird)
         self.db.commit()
@@ -47,14 +68,10 @@ class BirdRepository:
 
         return user_bird
 
-    def get_user_bird_observations(self, skip: int = 0, limit: int = 100) -> list[Type[UserBird]]:
-        return (
-            self.db.query(UserBird)
-            .options(joinedload(UserBird.bird))
-            .offset(skip)
-            .limit(limit)
-            .all()
-        )
+    def get_user_bird_observations(self, skip: int = 0, limit: int = 100,
+                                   after: Optional[Tuple[datetime, uuid.UUID]] = None) -> list[Type[UserBird]]:
+        query = self.db.query(UserBird).options(joinedload(UserBird.bird))
+        return self._observation_page(query, skip, limit, after)
 
     def get_user_bird_observation_by_id(self, user_bird_id: uuid.UUID, user_id: int) -> Optional[UserBird]:
         return (
@@ -73,6 +90,12 @@ class BirdRepository:
             UserBird.user_id == user_id
         ).first()
 
+    def count_user_birds_by_ebird_id(self, ebird_id: str) -> int:
+        return self.db.query(func.count(UserBird.id)).filter(UserBird.ebird_id == ebird_id).scalar()
+
+    def get_user_birds_by_ids(self, user_bird_ids: List[uuid.UUID]) -> list[Type[UserBird]]:
+        return self.db.query(UserBird).filter(UserBird.id.in_(user_bird_ids)).all()
+
     def get_user_birds_by_ebird_id(self, ebird_id: str) -> list[Type[UserBird]]:
         return self.db.query(UserBird).filter(
             UserBird.ebird_id == ebird_id
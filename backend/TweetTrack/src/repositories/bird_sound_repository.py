@@ -1,8 +1,15 @@
-from sqlalchemy.orm import Session
-from typing import List, Type
+from sqlalchemy import func, select, update
+from sqlalchemy.orm import Session, load_only
+from typing import List, Optional, Tuple, Type
 import uuid
 
-from db_tables import UserBirdSound
+from db_tables import UserBird, UserBirdSound
+
+# Everything a listing shows; the audio column stays in the database
+SOUND_METADATA = (
+    UserBirdSound.id, UserBirdSound.user_bird_id, UserBirdSound.file_name,
+    UserBirdSound.file_type, UserBirdSound.file_size, UserBirdSound.identified
+)
 
 
 class BirdSoundRepository:
@@ -20,7 +27,83 @@ class BirdSoundRepository:
             UserBirdSound.user_bird_id == user_bird_id
         ).all()
 
+    def get_sound_metadata_by_user_bird_id(self, user_bird_id: uuid.UUID) -> list[Type[UserBirdSound]]:
+        return self.db.query(UserBirdSound).options(load_only(*SOUND_METADATA)).filter(
+            UserBirdSound.user_bird_id == user_bird_id
+        ).all()
+
+    def get_sound_metadata_for_bird(self, ebird_id: str, limit: int = 100,
+                                    after: Optional[uuid.UUID] = None) -> list[Type[UserBirdSound]]:
+        # One page in sound id order; after is the last id of the previous page
+        query = (
+            self.db.query(UserBirdSound)
+            .options(load_only(*SOUND_METADATA))
+            .join(UserBird, UserBird.id == UserBirdSound.user_bird_id)
+            .filter(UserBird.ebird_id == ebird_id)
+        )
+        if after is not None:
+            query = query.filter(UserBirdSound.id > after)
+        return query.order_by(UserBirdSound.id).limit(limit).all()
+
+    def count_sounds_for_bird(self, ebird_id: str) -> int:
+        return (
+            self.db.query(func.count(UserBirdSound.id))
+            .join(UserBird, UserBird.id == UserBirdSound.user_bird_id)
+            .filter(UserBird.ebird_id == ebird_id)
+            .scalar()
+        )
+
+    def get_sound_file_info(self, sound_id: uuid.UUID) -> Optional[Tuple[str, str, Optional[str], int]]:
+        # (file name, content type, blob hash, size in bytes) without reading the audio
+        return self.db.query(
+            UserBirdSound.file_name, UserBirdSound.file_type, UserBirdSound.blob_hash,
+            func.coalesce(UserBirdSound.blob_size, func.length(UserBirdSound.sound_data))
+        ).filter(UserBirdSound.id == sound_id).first()
+
+    def read_sound_chunk(self, sound_id: uuid.UUID, offset: int, length: int) -> bytes:
+        # substring runs in PostgreSQL, so only this slice of the blob crosses the wire
+        chunk = self.db.query(
+            func.substring(UserBirdSound.sound_data, offset + 1, length)
+        ).filter(UserBirdSound.id == sound_id).scalar()
+        return bytes(chunk or b"")
+
     def get_sounds_by_user_bird_ids(self, user_bird_ids: List[uuid.UUID]) -> list[Type[UserBirdSound]]:
         return self.db.query(UserBirdSound).filter(
             UserBirdSound.user_bird_id.in_(user_bird_ids)
-        ).all()
\ No newline at end of file
+        ).all()
+
+    def stream_sounds(self, after_user_bird_id: Optional[uuid.UUID] = None, batch_size: int = 64):
+        # Server-side cursor in (user_bird_id, id) order: memory stays at one batch of audio however big the table
+        query = select(
+            UserBirdSound.id, UserBirdSound.user_bird_id, UserBirdSound.file_name, UserBirdSound.sound_data,
+            UserBirdSound.blob_hash
+        ).order_by(UserBirdSound.user_bird_id, UserBirdSound.id)
+
+        if after_user_bird_id is not None:
+            query = query.where(UserBirdSound.user_bird_id > after_user_bird_id)
+
+        result = self.db.execute(query.execution_options(stream_results=True, yield_per=batch_size))
+        return result.partitions(batch_size)
+
+
+    def get_inline_sounds(self, limit: int, after: Optional[uuid.UUID] = None) -> list:
+        # Sounds still stored in the table, in id order, for moving them to the blob store
+        query = select(UserBirdSound.id, UserBirdSound.sound_data).where(
+            UserBirdSound.blob_hash.is_(None), UserBirdSound.sound_data.is_not(None)
+        )
+        if after is not None:
+            query = query.where(UserBirdSound.id > after)
+        return self.db.execute(query.order_by(UserBirdSound.id).limit(limit)).all()
+
+    def referenced_blobs(self, digests: List[str]) -> set:
+        return set(self.db.scalars(
+            select(UserBirdSound.blob_hash).where(UserBirdSound.blob_hash.in_(digests)).distinct()
+        ))
+
+    def move_sounds_to_blobs(self, blobs: List[dict]):
+        # blobs: {"id", "blob_hash", "blob_size"} per sound; the inline copy is dropped in the same commit
+        self.db.execute(
+            update(UserBirdSound),
+            [{**blob, "sound_data": None} for blob in blobs]
+        )
+        self.db.commit()
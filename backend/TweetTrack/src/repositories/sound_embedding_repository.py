@@ -0,0 +1,48 @@
+from sqlalchemy import func
+from sqlalchemy.orm import Session, joinedload, load_only
+from typing import List, Optional, Type
+import uuid
+
+from db_tables import UserBird, UserBirdSound, UserBirdSoundEmbedding
+
+
+class SoundEmbeddingRepository:
+    def __init__(self, db: Session):
+        self.db = db
+
+    def create_embedding(self, embedding: UserBirdSoundEmbedding) -> UserBirdSoundEmbedding:
+        self.db.merge(embedding)
+        self.db.commit()
+        return embedding
+
+    def latest_model_version(self) -> Optional[str]:
+        return self.db.query(UserBirdSoundEmbedding.model_version).order_by(
+            UserBirdSoundEmbedding.created_at.desc()
+        ).limit(1).scalar()
+
+    def count_embeddings(self, model_version: str) -> int:
+        return self.db.query(func.count(UserBirdSoundEmbedding.sound_id)).filter(
+            UserBirdSoundEmbedding.model_version == model_version
+        ).scalar()
+
+    def get_embeddings(self, model_version: str) -> list:
+        return self.db.query(
+            UserBirdSoundEmbedding.sound_id,
+            UserBirdSoundEmbedding.dimensions,
+            UserBirdSoundEmbedding.vector
+        ).filter(
+            UserBirdSoundEmbedding.model_version == model_version
+        ).order_by(UserBirdSoundEmbedding.created_at).all()
+
+    def get_sounds_with_observations(self, sound_ids: List[uuid.UUID]) -> list[Type[UserBirdSound]]:
+        # Metadata only: the audio column stays in the database
+        return (
+            self.db.query(UserBirdSound)
+            .options(
+                load_only(UserBirdSound.id, UserBirdSound.user_bird_id, UserBirdSound.file_name,
+                          UserBirdSound.file_type, UserBirdSound.identified),
+                joinedload(UserBirdSound.user_bird).joinedload(UserBird.bird)
+            )
+            .filter(UserBirdSound.id.in_(sound_ids))
+            .all()
+        )
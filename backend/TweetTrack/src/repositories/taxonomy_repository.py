@@ -0,0 +1,30 @@
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+from typing import List
+
+from db_tables import Taxonomy
+
+
+class TaxonomyRepository:
+    def __init__(self, db: Session):
+        self.db = db
+
+    def upsert_taxonomies(self, rows: List[dict]) -> int:
+        if not rows:
+            return 0
+
+        # One INSERT ... ON CONFLICT for the whole batch instead of a merge per observation
+        statement = insert(Taxonomy).values(rows)
+        statement = statement.on_conflict_do_update(
+            index_elements=[Taxonomy.id],
+            set_={
+                "scientific_name": statement.excluded.scientific_name,
+                "common_name": statement.excluded.common_name,
+                "genus": statement.excluded.genus,
+                "family": statement.excluded.family,
+                "order": statement.excluded.order,
+            }
+        )
+        self.db.execute(statement)
+        self.db.commit()
+        return len(rows)
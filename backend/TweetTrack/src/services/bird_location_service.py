@@ -1,32 +1,48 @@
 from typing import List
+import os
 import uuid
 
-from models.birdLocationDTO import BirdLocationDTO
-from repositories.bird_location_repository import BirdLocationRepository
+from models.birdLocationDTO import BirdLocationAreaDTO, BirdLocationDTO
+from repositories.bird_location_repository import AsyncBirdLocationRepository
+
+# Upper bound on the locations one map area request returns
+LOCATION_AREA_MAX_RESULTS = int(os.getenv("LOCATION_AREA_MAX_RESULTS", "5000"))
 
 
 class BirdLocationService:
-    def __init__(self, location_repo: BirdLocationRepository):
+    def __init__(self, location_repo: AsyncBirdLocationRepository):
         self.location_repo = location_repo
 
-    def get_all_locations(self, limit: int = 100, offset: int = 0) -> List[BirdLocationDTO]:
-        locations = self.location_repo.get_all_locations(limit=limit, offset=offset)
+    async def get_all_locations(self, limit: int = 100, offset: int = 0) -> List[BirdLocationDTO]:
+        locations = await self.location_repo.get_all_locations(limit=limit, offset=offset)
         return [self.to_birdLocationDto(location) for location in locations]
 
-    def get_locations_by_bird_id(self, bird_id: uuid.UUID) -> List[BirdLocationDTO]:
-        locations = self.location_repo.get_locations_by_bird_id(bird_id)
+    async def get_locations_by_bird_id(self, bird_id: uuid.UUID) -> List[BirdLocationDTO]:
+        locations = await self.location_repo.get_locations_by_bird_id(bird_id)
         return [self.to_birdLocationDto(location) for location in locations]
 
-    def get_location_by_id(self, location_id: uuid.UUID) -> BirdLocationDTO:
-        location = self.location_repo.get_location_by_id(location_id)
+    async def get_location_by_id(self, location_id: uuid.UUID) -> BirdLocationDTO:
+        location = await self.location_repo.get_location_by_id(location_id)
         if not location:
             raise ValueError(f"Location with ID {location_id} not found")
         return self.to_birdLocationDto(location)
 
-    def get_locations_in_area(self, min_lat: float, max_lat: float,
-                              min_lng: float, max_lng: float) -> List[BirdLocationDTO]:
-        locations = self.location_repo.get_locations_in_area(min_lat, max_lat, min_lng, max_lng)
-        return [self.to_birdLocationDto(location) for location in locations]
+    async def get_locations_in_area(self, min_lat: float, max_lat: float, min_lng: float, max_lng: float,
+                                    limit: int = LOCATION_AREA_MAX_RESULTS) -> BirdLocationAreaDTO:
+        if min_lat > max_lat:
+            raise ValueError("min_lat must not be greater than max_lat")
+        # One extra row tells whether the area holds more than the limit
+        locations = await self.location_repo.get_locations_in_area(min_lat, max_lat, min_lng, max_lng, limit + 1)
+        if len(locations) > limit:
+            # Which rows an unordered capped scan returns can change between requests, so none are sent
+            return BirdLocationAreaDTO(locations=[], truncated=True, count=None)
+        # The complete set, in a fixed order
+        locations.sort(key=lambda location: location.id)
+        return BirdLocationAreaDTO(
+            locations=[self.to_birdLocationDto(location) for location in locations],
+            truncated=False,
+            count=len(locations)
+        )
 
     def to_birdLocationDto(self, location) -> BirdLocationDTO:
         return BirdLocationDTO(
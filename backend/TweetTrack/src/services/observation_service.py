@@ -1,13 +1,30 @@
+import asyncio
 import base64
-from typing import List, Optional
+import os
+from typing import List, Optional, Tuple
 import uuid
-from fastapi import HTTPException, status, UploadFile
+from fastapi import BackgroundTasks, HTTPException, Request, status
+from fastapi.responses import FileResponse, Response, StreamingResponse
 
 from db_tables import UserBird, User, UserBirdImage, UserBirdSound
-from models.observation_helper import BirdObservationResponse, BirdObservationCreate
+from models.observation_helper import (
+    BirdObservationResponse, BirdObservationCreate, decode_observation_cursor, encode_observation_cursor,
+)
 from repositories.bird_image_repository import BirdImageRepository
 from repositories.bird_repository import BirdRepository
 from repositories.bird_sound_repository import BirdSoundRepository
+from db import SessionLocal
+from imaging.renditions import IMAGE_MEDIA_TYPE, make_renditions_async
+from services.similarity_service import index_sound_embedding
+from starlette.concurrency import run_in_threadpool
+from storage.blob_store import blob_store
+from storage.uploads import (
+    IMAGE_UPLOAD_TYPES, MAX_IMAGE_UPLOAD_BYTES, MAX_SOUND_UPLOAD_BYTES, SOUND_UPLOAD_TYPES,
+    receive_upload, sniff_audio_type, sniff_image_type
+)
+
+# Audio is read from the database this many bytes at a time while it streams
+SOUND_CHUNK_BYTES = int(os.getenv("SOUND_CHUNK_BYTES", str(256 * 1024)))
 
 
 class BirdObservationService:
@@ -64,27 +81,26 @@ class BirdObservationService:
                 detail="Failed to create bird observation"
             )
 
-    def get_user_bird_observations(self, skip: int = 0, limit: int = 100) -> List[BirdObservationResponse]:
-        observations = self.bird_repo.get_user_bird_observations(skip, limit)
-
-        return [
-            BirdObservationResponse(
-                id=obs.id,
-                user_id=obs.user_id,
-                ebird_id=obs.ebird_id,
-                latitude=obs.latitude,
-                longitude=obs.longitude,
-                observed_at=obs.observed_at,
-                notes=obs.notes,
-                bird_name=obs.bird.name if obs.bird else None,
-                bird_scientific_name=obs.bird.scientific_name if obs.bird else None
+    @staticmethod
+    def _parse_cursor(cursor: Optional[str]):
+        if not cursor:
+            return None
+        try:
+            return decode_observation_cursor(cursor)
+        except ValueError:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Invalid cursor"
             )
-            for obs in observations
-        ]
 
-    def get_user_observations(self, skip: int = 0, limit: int = 100, current_user: User = None) -> List[
-        BirdObservationResponse]:
-        observations = self.bird_repo.get_user_observations(skip, limit, current_user.id if current_user else None)
+    @staticmethod
+    def _observation_page(observations, limit: int) -> Tuple[List[BirdObservationResponse], Optional[str]]:
+        # One extra row is fetched to tell whether another page exists
+        next_cursor = None
+        if len(observations) > limit:
+            observations = observations[:limit]
+            last = observations[-1]
+            next_cursor = encode_observation_cursor(last.observed_at, last.id)
 
         return [
             BirdObservationResponse(
@@ -99,7 +115,19 @@ class BirdObservationService:
                 bird_scientific_name=obs.bird.scientific_name if obs.bird else None
             )
             for obs in observations
-        ]
+        ], next_cursor
+
+    def get_user_bird_observations(self, skip: int = 0, limit: int = 100, cursor: Optional[str] = None) -> Tuple[
+        List[BirdObservationResponse], Optional[str]]:
+        observations = self.bird_repo.get_user_bird_observations(skip, limit + 1, self._parse_cursor(cursor))
+        return self._observation_page(observations, limit)
+
+    def get_user_observations(self, skip: int = 0, limit: int = 100, current_user: User = None,
+                              cursor: Optional[str] = None) -> Tuple[List[BirdObservationResponse], Optional[str]]:
+        observations = self.bird_repo.get_user_observations(
+            skip, limit + 1, current_user.id if current_user else None, self._parse_cursor(cursor)
+        )
+        return self._observation_page(observations, limit)
 
     def get_bird_observation_by_id(
             self,
@@ -154,48 +182,68 @@ class BirdImageService:
         self.bird_repo = bird_repo
         self.image_repo = image_repo
 
-    def upload_image_for_observation(
+    async def upload_image_for_observation(
             self,
             user_bird_id: uuid.UUID,
-            file: UploadFile,
+            request: Request,
             caption: Optional[str],
-            current_user: User
+            current_user: User,
+            background_tasks: Optional[BackgroundTasks] = None
     ) -> dict:
-        user_bird = self.bird_repo.get_user_bird_by_id_and_user(user_bird_id, current_user.id)
+        # Checked before any of the body is read
+        user_bird = await run_in_threadpool(self.bird_repo.get_user_bird_by_id_and_user, user_bird_id, current_user.id)
         if not user_bird:
             raise HTTPException(status_code=404, detail="Observation not found")
 
-        try:
-            contents = file.file.read()
-            base64_str = base64.b64encode(contents).decode("utf-8")
-        finally:
-            file.file.close()
-
+        upload = await receive_upload(request, MAX_IMAGE_UPLOAD_BYTES, IMAGE_UPLOAD_TYPES, sniff_image_type)
         new_image = UserBirdImage(
             user_bird_id=user_bird.id,
-            base64_image=base64_str,
-            caption=caption
+            blob_hash=upload.blob_hash,
+            blob_size=upload.size,
+            content_type=upload.detected_type,
+            # The app sends the caption as a form field, older clients as a query parameter
+            caption=caption or upload.fields.get("caption") or None
         )
 
-        self.image_repo.create_bird_image(new_image)
-        return {"message": "Image uploaded successfully"}
+        created_image = await run_in_threadpool(self.image_repo.create_bird_image, new_image)
+        if background_tasks is not None:
+            background_tasks.add_task(generate_image_renditions, created_image.id, upload.blob_hash)
+        return {"message": "Image uploaded successfully", "image_id": str(created_image.id)}
 
-    def list_images_for_bird(self, ebird_id: str) -> dict:
-        user_birds = self.bird_repo.get_user_birds_by_ebird_id(ebird_id)
-        if not user_birds:
+    def list_images_for_bird(self, ebird_id: str, limit: int = 50, cursor: Optional[str] = None) -> dict:
+        total_observations = self.bird_repo.count_user_birds_by_ebird_id(ebird_id)
+        if not total_observations:
             raise HTTPException(status_code=404, detail="No observations found for this bird")
 
-        user_bird_ids = [user_bird.id for user_bird in user_birds]
-        images = self.image_repo.get_images_by_user_bird_ids(user_bird_ids)
+        try:
+            after = uuid.UUID(cursor) if cursor else None
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+
+        images = self.image_repo.get_images_for_bird(ebird_id, limit + 1, after)
+        next_cursor = str(images[limit - 1].id) if len(images) > limit else None
+        images = images[:limit]
+
+        user_birds = {
+            user_bird.id: user_bird
+            for user_bird in self.bird_repo.get_user_birds_by_ids(list({image.user_bird_id for image in images}))
+        }
 
         result = []
         for image in images:
-            user_bird = next(ub for ub in user_birds if ub.id == image.user_bird_id)
-
+            user_bird = user_birds[image.user_bird_id]
             result.append({
                 "image_id": str(image.id),
                 "observation_id": str(user_bird.id),
-                "base64_image": image.base64_image,
+                "image_url": image_file_url(image.id),
+                "medium_url": image_file_url(image.id, "medium") if image.medium_hash else None,
+                "thumbnail_url": image_file_url(image.id, "small") if image.small_hash else None,
+                "preview_base64": image.preview_base64,
+                "width": image.width,
+                "height": image.height,
+                # Kept for the mobile app, which reads base64_image: only the tiny preview, larger sizes come
+                # from medium_url / thumbnail_url on demand
+                "base64_image": image.preview_base64 or "",
                 "caption": image.caption,
                 "observed_at": user_bird.observed_at.isoformat(),
                 "latitude": user_bird.latitude,
@@ -205,11 +253,28 @@ class BirdImageService:
 
         return {
             "ebird_id": ebird_id,
-            "total_observations": len(user_birds),
-            "total_images": len(images),
+            "total_observations": total_observations,
+            "total_images": self.image_repo.count_images_for_bird(ebird_id),
+            "next_cursor": next_cursor,
             "images": result
         }
 
+    def serve_image(self, image_id: uuid.UUID, size: Optional[str] = None) -> Response:
+        image = self.image_repo.get_image(image_id)
+        if not image:
+            raise HTTPException(status_code=404, detail="Image not found")
+
+        if image.blob_hash is None:
+            # Not migrated yet
+            return Response(base64.b64decode(image.base64_image), media_type="application/octet-stream")
+
+        if size != "original":
+            # Falls back to the original while the renditions are still being made
+            rendition_hash = getattr(image, f"{size or 'display'}_hash")
+            if rendition_hash is not None:
+                return blob_response(rendition_hash, IMAGE_MEDIA_TYPE)
+        return blob_response(image.blob_hash, image.content_type or "application/octet-stream")
+
 
 class BirdSoundService:
     def __init__(
@@ -220,44 +285,34 @@ class BirdSoundService:
         self.bird_repo = bird_repo
         self.sound_repo = sound_repo
 
-    def upload_sound_for_observation(
+    async def upload_sound_for_observation(
             self,
             user_bird_id: uuid.UUID,
-            file: UploadFile,
-            identified: bool,
-            current_user: User
+            request: Request,
+            current_user: User,
+            background_tasks: Optional[BackgroundTasks] = None
     ) -> dict:
-        allowed_audio_types = [
-            "audio/mp3", "audio/wav", "audio/ogg",
-            "audio/m4a", "audio/mp4"
-        ]
-
-        if file.content_type not in allowed_audio_types:
-            raise HTTPException(
-                status_code=400,
-                detail=f"Invalid file type. Allowed types: {', '.join(allowed_audio_types)}"
-            )
-
-        user_bird = self.bird_repo.get_user_bird_by_id_and_user(user_bird_id, current_user.id)
+        # Checked before any of the body is read
+        user_bird = await run_in_threadpool(self.bird_repo.get_user_bird_by_id_and_user, user_bird_id, current_user.id)
         if not user_bird:
             raise HTTPException(status_code=404, detail="Observation not found")
 
-        try:
-            contents = file.file.read()
-            file_size_str = f"{len(contents)} bytes"
-        finally:
-            file.file.close()
-
+        upload = await receive_upload(request, MAX_SOUND_UPLOAD_BYTES, SOUND_UPLOAD_TYPES, sniff_audio_type)
         new_sound = UserBirdSound(
             user_bird_id=user_bird.id,
-            sound_data=contents,
-            file_name=file.filename,
-            file_type=file.content_type,
-            file_size=file_size_str,
-            identified=identified
+            blob_hash=upload.blob_hash,
+            blob_size=upload.size,
+            file_name=upload.filename,
+            file_type=upload.content_type,
+            file_size=f"{upload.size} bytes",
+            identified=upload.fields.get("identified", "").strip().lower() in ("true", "1", "yes", "on")
         )
 
-        created_sound = self.sound_repo.create_bird_sound(new_sound)
+        created_sound = await run_in_threadpool(self.sound_repo.create_bird_sound, new_sound)
+
+        # The embedding for "similar recordings" is computed after the response goes out
+        if background_tasks is not None:
+            background_tasks.add_task(index_sound_embedding, created_sound.id, upload.blob_hash, created_sound.file_name)
 
         return {
             "message": "Sound uploaded successfully",
@@ -278,7 +333,7 @@ class BirdSoundService:
         if not user_bird:
             raise HTTPException(status_code=404, detail="Observation not found")
 
-        sounds = self.sound_repo.get_sounds_by_user_bird_id(user_bird_id)
+        sounds = self.sound_repo.get_sound_metadata_by_user_bird_id(user_bird_id)
 
         return [
             {
@@ -286,28 +341,39 @@ class BirdSoundService:
                 "file_name": sound.file_name,
                 "file_type": sound.file_type,
                 "file_size": sound.file_size,
-                "identified": sound.identified
+                "identified": sound.identified,
+                "audio_url": sound_audio_url(sound.id)
             }
             for sound in sounds
         ]
 
-    def list_sounds_for_bird(self, ebird_id: str) -> dict:
-        user_birds = self.bird_repo.get_user_birds_by_ebird_id(ebird_id)
-        if not user_birds:
+    def list_sounds_for_bird(self, ebird_id: str, limit: int = 50, cursor: Optional[str] = None) -> dict:
+        total_observations = self.bird_repo.count_user_birds_by_ebird_id(ebird_id)
+        if not total_observations:
             raise HTTPException(status_code=404, detail="No observations found for this bird")
 
-        user_bird_ids = [user_bird.id for user_bird in user_birds]
-        sounds = self.sound_repo.get_sounds_by_user_bird_ids(user_bird_ids)
+        try:
+            after = uuid.UUID(cursor) if cursor else None
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+
+        # Metadata only, one page at a time; the audio itself comes from audio_url
+        sounds = self.sound_repo.get_sound_metadata_for_bird(ebird_id, limit + 1, after)
+        next_cursor = str(sounds[limit - 1].id) if len(sounds) > limit else None
+        sounds = sounds[:limit]
+
+        user_birds = {
+            user_bird.id: user_bird
+            for user_bird in self.bird_repo.get_user_birds_by_ids(list({sound.user_bird_id for sound in sounds}))
+        }
 
         result = []
         for sound in sounds:
-            user_bird = next(ub for ub in user_birds if ub.id == sound.user_bird_id)
-            sound_data_b64 = base64.b64encode(sound.sound_data).decode('utf-8')
-
+            user_bird = user_birds[sound.user_bird_id]
             result.append({
                 "sound_id": str(sound.id),
                 "observation_id": str(user_bird.id),
-                "sound_data_b64": sound_data_b64,
+                "audio_url": sound_audio_url(sound.id),
                 "file_name": sound.file_name,
                 "file_type": sound.file_type,
                 "file_size": sound.file_size,
@@ -320,7 +386,125 @@ class BirdSoundService:
 
         return {
             "ebird_id": ebird_id,
-            "total_observations": len(user_birds),
-            "total_sounds": len(sounds),
+            "total_observations": total_observations,
+            "total_sounds": self.sound_repo.count_sounds_for_bird(ebird_id),
+            "next_cursor": next_cursor,
             "sounds": result
-        }
\ No newline at end of file
+        }
+
+    def stream_sound(self, sound_id: uuid.UUID, range_header: Optional[str]) -> StreamingResponse:
+        info = self.sound_repo.get_sound_file_info(sound_id)
+        if not info:
+            raise HTTPException(status_code=404, detail="Sound not found")
+        file_name, file_type, blob_hash, size = info
+
+        headers = {
+            "Accept-Ranges": "bytes",
+            "Content-Disposition": f'inline; filename="{file_name}"'
+        }
+        byte_range = parse_byte_range(range_header, size)
+        if blob_hash is not None and byte_range is None:
+            return blob_response(blob_hash, file_type or "application/octet-stream", headers)
+        if byte_range is None:
+            start, end, status_code = 0, size - 1, 200
+        else:
+            start, end = byte_range
+            status_code = 206
+            headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+        headers["Content-Length"] = str(end - start + 1)
+
+        chunks = read_blob_chunks(blob_hash, start, end) if blob_hash else read_sound_chunks(sound_id, start, end)
+        return StreamingResponse(
+            chunks,
+            status_code=status_code,
+            media_type=file_type or "application/octet-stream",
+            headers=headers
+        )
+
+
+def sound_audio_url(sound_id: uuid.UUID) -> str:
+    return f"/sounds/{sound_id}/audio"
+
+
+def image_file_url(image_id: uuid.UUID, size: Optional[str] = None) -> str:
+    url = f"/images/{image_id}/file"
+    return f"{url}?size={size}" if size else url
+
+
+def store_renditions(image_id: uuid.UUID, renditions: dict):
+    db = SessionLocal()
+    try:
+        BirdImageRepository(db).set_renditions(image_id, renditions)
+    finally:
+        db.close()
+
+
+async def generate_image_renditions(image_id: uuid.UUID, blob_hash: str):
+    # Runs after the upload response is sent; the decoding and resizing happen in the image worker pool
+    try:
+        renditions = await make_renditions_async(blob_hash)
+        await asyncio.to_thread(store_renditions, image_id, renditions)
+    except Exception as e:
+        print(f"❌ Failed to make renditions for image {image_id}: {e}")
+
+
+def blob_response(blob_hash: str, media_type: str, headers: Optional[dict] = None) -> Response:
+    path = blob_store.local_path(blob_hash)
+    if path is not None:
+        # Served straight from the file: sendfile where the server supports it, never loaded into memory
+        return FileResponse(path, media_type=media_type, headers=headers)
+    return StreamingResponse(read_blob_chunks(blob_hash, 0, None), media_type=media_type, headers=headers)
+
+
+def parse_byte_range(range_header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    # Single "bytes=" ranges only (start-end, start- or -suffix); anything else gets the whole file
+    if not range_header or not range_header.startswith("bytes=") or "," in range_header:
+        return None
+    first, _, last = range_header[len("bytes="):].strip().partition("-")
+    try:
+        if first:
+            start = int(first)
+            end = int(last) if last else size - 1
+        else:
+            start = size - int(last)
+            end = size - 1
+    except ValueError:
+        return None
+
+    start, end = max(start, 0), min(end, size - 1)
+    if start > end or start >= size:
+        raise HTTPException(
+            status_code=416,
+            detail="Requested range not satisfiable",
+            headers={"Content-Range": f"bytes */{size}"}
+        )
+    return start, end
+
+
+def read_blob_chunks(blob_hash: str, start: int, end: Optional[int]):
+    with blob_store.open(blob_hash) as f:
+        f.seek(start)
+        remaining = None if end is None else end - start + 1
+        while remaining is None or remaining > 0:
+            chunk = f.read(SOUND_CHUNK_BYTES if remaining is None else min(SOUND_CHUNK_BYTES, remaining))
+            if not chunk:
+                break
+            yield chunk
+            if remaining is not None:
+                remaining -= len(chunk)
+
+
+def read_sound_chunks(sound_id: uuid.UUID, start: int, end: int):
+    # Own session: the request's session is closed before a streamed body is sent
+    db = SessionLocal()
+    try:
+        sound_repo = BirdSoundRepository(db)
+        offset = start
+        while offset <= end:
+            chunk = sound_repo.read_sound_chunk(sound_id, offset, min(SOUND_CHUNK_BYTES, end - offset + 1))
+            if not chunk:
+                break
+            yield chunk
+            offset += len(chunk)
+    finally:
+        db.close()
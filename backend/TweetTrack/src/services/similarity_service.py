@@ -0,0 +1,127 @@
+import asyncio
+import os
+import time
+import uuid
+from typing import List
+
+import numpy as np
+from fastapi import HTTPException
+
+from audio.decoding import PCM_SAMPLE_RATE, decode_to_pcm_async
+from db import SessionLocal
+from db_tables import UserBirdSoundEmbedding
+from inference.ai_client import ai_client
+from repositories.sound_embedding_repository import SoundEmbeddingRepository
+from similarity.embedding_index import EMBEDDING_DTYPE, EmbeddingIndex, sound_index
+from storage.blob_store import blob_store
+
+# How often a search checks the index against the database (uploads are added right away regardless)
+INDEX_SYNC_INTERVAL_SECONDS = float(os.getenv("EMBEDDING_INDEX_SYNC_SECONDS", "60"))
+
+
+class SoundSimilarityService:
+    last_sync = 0.0
+
+    def __init__(self, embedding_repo: SoundEmbeddingRepository, index: EmbeddingIndex = sound_index):
+        self.embedding_repo = embedding_repo
+        self.index = index
+
+    def sync_index(self, force: bool = False):
+        if not self.index.loaded:
+            self.index.load()
+            force = True
+        if not force and time.monotonic() - SoundSimilarityService.last_sync < INDEX_SYNC_INTERVAL_SECONDS:
+            return
+        SoundSimilarityService.last_sync = time.monotonic()
+
+        model_version = self.embedding_repo.latest_model_version()
+        if model_version is None:
+            return
+        if model_version == self.index.model_version and \
+                len(self.index) == self.embedding_repo.count_embeddings(model_version):
+            return
+
+        rows = self.embedding_repo.get_embeddings(model_version)
+        dimensions = rows[0].dimensions
+        vectors = np.frombuffer(b"".join(row.vector for row in rows), dtype=EMBEDDING_DTYPE)
+        self.index.rebuild([row.sound_id for row in rows], vectors, model_version, dimensions)
+        print(f"🔎 Rebuilt the sound index with {len(rows)} recordings (model {model_version})")
+
+    def similar_to_sound(self, sound_id: uuid.UUID, k: int = 10) -> dict:
+        self.sync_index()
+        vector = self.index.vector(sound_id)
+        if vector is None:
+            raise HTTPException(status_code=404, detail="No embedding for this sound yet")
+
+        start = time.perf_counter()
+        matches = self.index.search(vector, k, exclude=sound_id)
+        return self._describe(matches, start, sound_id=str(sound_id))
+
+    def similar_to_vector(self, vector: np.ndarray, k: int = 10) -> dict:
+        self.sync_index()
+        start = time.perf_counter()
+        matches = self.index.search(vector, k)
+        return self._describe(matches, start)
+
+    def _describe(self, matches: List[tuple], start: float, **extra) -> dict:
+        search_ms = (time.perf_counter() - start) * 1000
+        sounds = {sound.id: sound for sound in self.embedding_repo.get_sounds_with_observations(
+            [sound_id for sound_id, _ in matches]
+        )}
+
+        results = []
+        for sound_id, score in matches:
+            sound = sounds.get(sound_id)
+            if sound is None:
+                continue
+            user_bird = sound.user_bird
+            results.append({
+                "sound_id": str(sound.id),
+                "similarity": round(score, 4),
+                "observation_id": str(user_bird.id),
+                "ebird_id": user_bird.ebird_id,
+                "bird_name": user_bird.bird.name if user_bird.bird else None,
+                "file_name": sound.file_name,
+                "file_type": sound.file_type,
+                "identified": sound.identified,
+                "observed_at": user_bird.observed_at.isoformat(),
+                "latitude": user_bird.latitude,
+                "longitude": user_bird.longitude
+            })
+
+        return {
+            **extra,
+            "indexed_sounds": len(self.index),
+            "search_ms": round(search_ms, 2),
+            "results": results
+        }
+
+
+def store_embedding(sound_id: uuid.UUID, embedding: np.ndarray, model_version: str):
+    db = SessionLocal()
+    try:
+        SoundEmbeddingRepository(db).create_embedding(UserBirdSoundEmbedding(
+            sound_id=sound_id,
+            model_version=model_version,
+            dimensions=len(embedding),
+            vector=np.ascontiguousarray(embedding, dtype=EMBEDDING_DTYPE).tobytes()
+        ))
+    finally:
+        db.close()
+    sound_index.add(sound_id, embedding, model_version)
+
+
+async def embed_recording(audio_bytes: bytes, file_name: str) -> np.ndarray:
+    file_extension = os.path.splitext(file_name or "")[1].lower()
+    waveform = await decode_to_pcm_async(audio_bytes, file_extension)
+    return await ai_client.embed_pcm(waveform, PCM_SAMPLE_RATE)
+
+
+async def index_sound_embedding(sound_id: uuid.UUID, blob_hash: str, file_name: str):
+    # Runs after the upload response is sent, so uploads never wait for the model
+    try:
+        audio_bytes = await asyncio.to_thread(blob_store.read, blob_hash)
+        embedding = await embed_recording(audio_bytes, file_name)
+        await asyncio.to_thread(store_embedding, sound_id, embedding, ai_client.model_version)
+    except Exception as e:
+        print(f"❌ Failed to index sound {sound_id}: {e}")
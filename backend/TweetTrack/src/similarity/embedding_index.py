@@ -0,0 +1,181 @@
+import json
+import os
+import threading
+import uuid
+from typing import List, Optional
+
+import numpy as np
+
+EMBEDDING_INDEX_DIR = os.getenv("EMBEDDING_INDEX_DIR", "embedding_index")
+EMBEDDING_DTYPE = np.dtype("<f2")
+# Float32 copy kept in RAM while it fits; NumPy has no fast float16 matmul, so converting on every search
+# would dominate the latency
+EMBEDDING_INDEX_RAM_MB = float(os.getenv("EMBEDDING_INDEX_RAM_MB", "256"))
+# Past the RAM budget, rows are converted from the memory map this many at a time per search
+SEARCH_BLOCK_ROWS = int(os.getenv("EMBEDDING_SEARCH_BLOCK_ROWS", "8192"))
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms > 0, norms, 1.0)
+
+
+class EmbeddingIndex:
+    # Exact cosine search over unit-length float16 vectors in an append-only, memory-mapped file.
+    # Brute force is a single matmul, which is fast enough for a community-sized collection.
+    def __init__(self, directory: str = EMBEDDING_INDEX_DIR):
+        self.directory = directory
+        self.vectors_path = os.path.join(directory, "vectors.f16")
+        self.ids_path = os.path.join(directory, "ids.bin")
+        self.meta_path = os.path.join(directory, "meta.json")
+
+        self.lock = threading.Lock()
+        self.loaded = False
+        self.model_version = None
+        self.dimensions = None
+        self.ids: List[uuid.UUID] = []
+        self.rows = {}
+        self.vectors = None
+        self.dense = None
+
+    def __len__(self):
+        return len(self.ids)
+
+    def load(self):
+        with self.lock:
+            self._load()
+        return self
+
+    def _load(self):
+        self.loaded = True
+        if not os.path.exists(self.meta_path):
+            return
+
+        with open(self.meta_path, "r") as f:
+            meta = json.load(f)
+        self.model_version = meta["model_version"]
+        self.dimensions = meta["dimensions"]
+
+        # A crash between the two appends leaves one file longer; trust the shorter one
+        id_bytes = np.fromfile(self.ids_path, dtype="S16") if os.path.exists(self.ids_path) else []
+        vector_rows = os.path.getsize(self.vectors_path) // (self.dimensions * EMBEDDING_DTYPE.itemsize) \
+            if os.path.exists(self.vectors_path) else 0
+        count = min(len(id_bytes), vector_rows)
+
+        self.ids = [uuid.UUID(bytes=bytes(raw).ljust(16, b"\0")) for raw in id_bytes[:count]]
+        self.rows = {sound_id: row for row, sound_id in enumerate(self.ids)}
+        self._map(count)
+        self._densify()
+
+    def _map(self, count):
+        if count == 0:
+            self.vectors = None
+            return
+        self.vectors = np.memmap(self.vectors_path, dtype=EMBEDDING_DTYPE, mode="r", shape=(count, self.dimensions))
+
+    def _densify(self):
+        count = len(self.ids)
+        max_rows = int(EMBEDDING_INDEX_RAM_MB * 1024 * 1024 // (self.dimensions * 4)) if self.dimensions else 0
+        self.dense = None
+        if count == 0 or count > max_rows:
+            return
+        # Spare capacity so appends don't reallocate every time
+        capacity = min(max(count * 2, 1024), max_rows)
+        self.dense = np.empty((capacity, self.dimensions), dtype=np.float32)
+        for start in range(0, count, SEARCH_BLOCK_ROWS):
+            end = min(start + SEARCH_BLOCK_ROWS, count)
+            self.dense[start:end] = self.vectors[start:end]
+
+    def _append_dense(self, vector):
+        row = len(self.ids) - 1
+        if self.dense is not None and row < len(self.dense):
+            self.dense[row] = vector
+        else:
+            # Out of spare capacity: copy again with room to grow, or drop the copy past the RAM budget
+            self._densify()
+
+    def _write_meta(self):
+        temp_path = f"{self.meta_path}.tmp"
+        with open(temp_path, "w") as f:
+            json.dump({"model_version": self.model_version, "dimensions": self.dimensions}, f)
+        os.replace(temp_path, self.meta_path)
+
+    def rebuild(self, ids: List[uuid.UUID], vectors: np.ndarray, model_version: str, dimensions: int):
+        # Full rewrite, e.g. after a model change; files are swapped in atomically
+        os.makedirs(self.directory, exist_ok=True)
+        vectors = normalize(np.asarray(vectors).reshape(len(ids), dimensions)).astype(EMBEDDING_DTYPE)
+        with self.lock:
+            vectors.tofile(f"{self.vectors_path}.tmp")
+            np.array([sound_id.bytes for sound_id in ids], dtype="S16").tofile(f"{self.ids_path}.tmp")
+            os.replace(f"{self.vectors_path}.tmp", self.vectors_path)
+            os.replace(f"{self.ids_path}.tmp", self.ids_path)
+
+            self.model_version = model_version
+            self.dimensions = dimensions
+            self._write_meta()
+            self.ids = list(ids)
+            self.rows = {sound_id: row for row, sound_id in enumerate(self.ids)}
+            self._map(len(self.ids))
+            self._densify()
+            self.loaded = True
+
+    def add(self, sound_id: uuid.UUID, vector: np.ndarray, model_version: str):
+        # Incremental: one row appended to each file, then the map is widened
+        vector = normalize(np.ravel(vector)).astype(EMBEDDING_DTYPE)
+        with self.lock:
+            if not self.loaded:
+                self._load()
+            if sound_id in self.rows:
+                return
+            if self.model_version is not None and self.model_version != model_version:
+                raise ValueError(f"Index holds model {self.model_version}, not {model_version}")
+            if self.dimensions is not None and self.dimensions != len(vector):
+                raise ValueError(f"Index holds {self.dimensions}-d vectors, not {len(vector)}-d")
+
+            if self.model_version is None:
+                os.makedirs(self.directory, exist_ok=True)
+                self.model_version = model_version
+                self.dimensions = len(vector)
+                self._write_meta()
+
+            with open(self.vectors_path, "ab") as f:
+                f.write(vector.tobytes())
+            with open(self.ids_path, "ab") as f:
+                f.write(sound_id.bytes)
+
+            self.rows[sound_id] = len(self.ids)
+            self.ids.append(sound_id)
+            self._map(len(self.ids))
+            self._append_dense(vector)
+
+    def vector(self, sound_id: uuid.UUID) -> Optional[np.ndarray]:
+        with self.lock:
+            row = self.rows.get(sound_id)
+            return None if row is None else np.array(self.vectors[row], dtype=np.float32)
+
+    def search(self, query: np.ndarray, k: int = 10, exclude: Optional[uuid.UUID] = None) -> List[tuple]:
+        with self.lock:
+            vectors, dense, ids = self.vectors, self.dense, self.ids
+        if vectors is None:
+            return []
+
+        query = normalize(np.ravel(query))
+        if dense is not None:
+            scores = dense[:len(vectors)] @ query
+        else:
+            scores = np.empty(len(vectors), dtype=np.float32)
+            for start in range(0, len(vectors), SEARCH_BLOCK_ROWS):
+                block = np.asarray(vectors[start:start + SEARCH_BLOCK_ROWS], dtype=np.float32)
+                scores[start:start + len(block)] = block @ query
+
+        if exclude is not None and exclude in self.rows:
+            scores[self.rows[exclude]] = -np.inf
+
+        k = min(k, len(scores))
+        best = np.argpartition(-scores, k - 1)[:k]
+        best = best[np.argsort(-scores[best])]
+        return [(ids[row], float(scores[row])) for row in best if np.isfinite(scores[row])]
+
+
+sound_index = EmbeddingIndex()
@@ -0,0 +1,168 @@
+import hashlib
+import os
+import tempfile
+from abc import ABC, abstractmethod
+from typing import BinaryIO, Iterable, Iterator, Optional, Tuple
+
+# "local" is the only backend so far; others plug in through create_blob_store()
+BLOB_STORE = os.getenv("BLOB_STORE", "local")
+BLOB_STORE_DIR = os.getenv("BLOB_STORE_DIR", "blobs")
+
+
+class BlobNotFoundError(Exception):
+    pass
+
+
+class BlobWriter(ABC):
+    # Incremental put: bytes are hashed as they are written, the blob only appears once committed
+    @abstractmethod
+    def write(self, chunk: bytes):
+        ...
+
+    @abstractmethod
+    def commit(self) -> Tuple[str, int]:
+        # Returns (sha256 hex digest, size in bytes)
+        ...
+
+    @abstractmethod
+    def abort(self):
+        ...
+
+
+class BlobStore(ABC):
+    # Content-addressed storage: a blob's key is the SHA-256 of its bytes, so identical uploads are stored once
+    def put(self, data: bytes) -> Tuple[str, int]:
+        return self.put_chunks([data])
+
+    def put_chunks(self, chunks: Iterable[bytes]) -> Tuple[str, int]:
+        writer = self.writer()
+        try:
+            for chunk in chunks:
+                writer.write(chunk)
+            return writer.commit()
+        except BaseException:
+            writer.abort()
+            raise
+
+    @abstractmethod
+    def writer(self) -> BlobWriter:
+        ...
+
+    @abstractmethod
+    def open(self, digest: str) -> BinaryIO:
+        ...
+
+    @abstractmethod
+    def exists(self, digest: str) -> bool:
+        ...
+
+    @abstractmethod
+    def delete(self, digest: str):
+        ...
+
+    @abstractmethod
+    def iter_blobs(self) -> Iterator[Tuple[str, float]]:
+        # Every stored blob as (digest, last modified as a Unix timestamp), in no particular order
+        ...
+
+    def local_path(self, digest: str) -> Optional[str]:
+        # Backends on the local disk return a path so reads can be served with sendfile
+        return None
+
+    def read(self, digest: str) -> bytes:
+        with self.open(digest) as f:
+            return f.read()
+
+
+class LocalBlobStore(BlobStore):
+    def __init__(self, root: str = BLOB_STORE_DIR):
+        self.root = root
+        self.temp_dir = os.path.join(root, "tmp")
+
+    def path(self, digest: str) -> str:
+        # Two levels of fan-out keep directories small: ab/cd/abcd...
+        if len(digest) != 64 or not all(c in "0123456789abcdef" for c in digest):
+            raise ValueError(f"Not a SHA-256 digest: {digest!r}")
+        return os.path.join(self.root, digest[:2], digest[2:4], digest)
+
+    def writer(self) -> BlobWriter:
+        return LocalBlobWriter(self)
+
+    def open(self, digest: str) -> BinaryIO:
+        try:
+            return open(self.path(digest), "rb")
+        except FileNotFoundError:
+            raise BlobNotFoundError(digest)
+
+    def exists(self, digest: str) -> bool:
+        return os.path.exists(self.path(digest))
+
+    def delete(self, digest: str):
+        try:
+            os.unlink(self.path(digest))
+        except FileNotFoundError:
+            pass
+
+    def iter_blobs(self) -> Iterator[Tuple[str, float]]:
+        for first in sorted(os.listdir(self.root)) if os.path.isdir(self.root) else []:
+            if len(first) != 2:
+                # tmp/ holds writes in progress
+                continue
+            for second in sorted(os.listdir(os.path.join(self.root, first))):
+                directory = os.path.join(self.root, first, second)
+                for digest in sorted(os.listdir(directory)):
+                    try:
+                        yield digest, os.stat(os.path.join(directory, digest)).st_mtime
+                    except FileNotFoundError:
+                        pass
+
+    def local_path(self, digest: str) -> Optional[str]:
+        return self.path(digest)
+
+
+class LocalBlobWriter(BlobWriter):
+    def __init__(self, store: LocalBlobStore):
+        self.store = store
+        self.digest = hashlib.sha256()
+        self.size = 0
+        # Written to a temp file on the same filesystem, then renamed into place atomically
+        os.makedirs(store.temp_dir, exist_ok=True)
+        fd, self.temp_path = tempfile.mkstemp(dir=store.temp_dir)
+        self.file = os.fdopen(fd, "wb")
+
+    def write(self, chunk: bytes):
+        self.digest.update(chunk)
+        self.size += len(chunk)
+        self.file.write(chunk)
+
+    def commit(self) -> Tuple[str, int]:
+        try:
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            self.file.close()
+
+            hex_digest = self.digest.hexdigest()
+            path = self.store.path(hex_digest)
+            if os.path.exists(path):
+                os.unlink(self.temp_path)
+            else:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.replace(self.temp_path, path)
+            return hex_digest, self.size
+        except BaseException:
+            self.abort()
+            raise
+
+    def abort(self):
+        self.file.close()
+        if os.path.exists(self.temp_path):
+            os.unlink(self.temp_path)
+
+
+def create_blob_store(kind: str = BLOB_STORE) -> BlobStore:
+    if kind == "local":
+        return LocalBlobStore()
+    raise ValueError(f"Unsupported blob store: {kind}")
+
+
+blob_store = create_blob_store()
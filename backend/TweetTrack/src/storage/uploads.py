@@ -0,0 +1,196 @@
+import os
+from typing import Callable, Dict, Optional, Sequence
+
+from fastapi import HTTPException, Request
+from multipart.exceptions import FormParserError
+from multipart.multipart import MultipartParser, parse_options_header
+from starlette.concurrency import run_in_threadpool
+
+from storage.blob_store import BlobWriter, blob_store
+
+# File data goes to the blob store in blocks of this size, which bounds what one upload holds in memory
+UPLOAD_CHUNK_BYTES = int(os.getenv("UPLOAD_CHUNK_BYTES", str(1024 * 1024)))
+MAX_IMAGE_UPLOAD_BYTES = int(os.getenv("MAX_IMAGE_UPLOAD_BYTES", str(25 * 1024 * 1024)))
+MAX_SOUND_UPLOAD_BYTES = int(os.getenv("MAX_SOUND_UPLOAD_BYTES", str(200 * 1024 * 1024)))
+# Text fields next to the file (caption, identified) are short
+MAX_FORM_FIELD_BYTES = 64 * 1024
+# Boundaries and part headers around the file, allowed on top of the file limit in Content-Length
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+# Enough of the start of a file to recognise every format below
+SNIFF_BYTES = 16
+
+IMAGE_UPLOAD_TYPES = ["image/jpeg", "image/png", "image/webp", "image/heic", "image/heif", "application/octet-stream"]
+SOUND_UPLOAD_TYPES = ["audio/mp3", "audio/wav", "audio/ogg", "audio/m4a", "audio/mp4"]
+
+
+def sniff_image_type(head: bytes) -> Optional[str]:
+    if head.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg"
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    if head[4:12] in (b"ftypheic", b"ftypheix", b"ftypmif1"):
+        return "image/heic"
+    return None
+
+
+def sniff_audio_type(head: bytes) -> Optional[str]:
+    if head.startswith(b"ID3") or (len(head) > 1 and head[0] == 0xFF and head[1] & 0xE0 == 0xE0):
+        return "audio/mp3"
+    if head[:4] == b"RIFF" and head[8:12] == b"WAVE":
+        return "audio/wav"
+    if head.startswith(b"OggS"):
+        return "audio/ogg"
+    if head[4:8] == b"ftyp":
+        return "audio/mp4"
+    return None
+
+
+class StoredUpload:
+    def __init__(self, blob_hash: str, size: int, filename: Optional[str], content_type: Optional[str],
+                 detected_type: str, fields: Dict[str, str]):
+        self.blob_hash = blob_hash
+        self.size = size
+        self.filename = filename
+        # As declared by the client, and as recognised from the file's first bytes
+        self.content_type = content_type
+        self.detected_type = detected_type
+        self.fields = fields
+
+
+def multipart_body_schema(fields: Dict[str, str]) -> dict:
+    # The upload routes read the request stream themselves, so the form is described for the docs by hand
+    properties = {"file": {"type": "string", "format": "binary"}}
+    properties.update({name: {"type": field_type} for name, field_type in fields.items()})
+    return {"requestBody": {"required": True, "content": {"multipart/form-data": {
+        "schema": {"type": "object", "properties": properties, "required": ["file"]}
+    }}}}
+
+
+def too_large(max_bytes: int) -> HTTPException:
+    return HTTPException(status_code=413, detail=f"File too large. Maximum size is {max_bytes // (1024 * 1024)} MB")
+
+
+async def receive_upload(
+        request: Request,
+        max_bytes: int,
+        allowed_types: Sequence[str],
+        sniff: Callable[[bytes], Optional[str]],
+        file_field: str = "file"
+) -> StoredUpload:
+    # Parses the multipart body as it arrives and streams the file part into the blob store, hashing it on
+    # the way. Oversized, mistyped or unrecognisable files are refused before their data is stored.
+    content_type, params = parse_options_header(request.headers.get("content-type", ""))
+    if content_type != b"multipart/form-data" or b"boundary" not in params:
+        raise HTTPException(status_code=400, detail="Expected a multipart/form-data upload")
+
+    content_length = request.headers.get("content-length", "")
+    if content_length.isdigit() and int(content_length) > max_bytes + MULTIPART_OVERHEAD_BYTES:
+        raise too_large(max_bytes)
+
+    events = []
+    header = {"field": b"", "value": b""}
+    headers = {}
+
+    def on_header_field(data, start, end):
+        header["field"] += data[start:end]
+
+    def on_header_value(data, start, end):
+        header["value"] += data[start:end]
+
+    def on_header_end():
+        headers[header["field"].lower()] = header["value"]
+        header["field"] = header["value"] = b""
+
+    def on_headers_finished():
+        events.append(("headers", dict(headers)))
+        headers.clear()
+
+    parser = MultipartParser(params[b"boundary"], {
+        "on_header_field": on_header_field,
+        "on_header_value": on_header_value,
+        "on_header_end": on_header_end,
+        "on_headers_finished": on_headers_finished,
+        "on_part_data": lambda data, start, end: events.append(("data", data[start:end])),
+        "on_part_end": lambda: events.append(("end", None)),
+    })
+
+    fields = {}
+    writer: Optional[BlobWriter] = None
+    file_info = None
+    detected_type = None
+    size = 0
+    pending = bytearray()
+    in_file = False
+    part = None
+
+    async def flush():
+        nonlocal writer
+        if writer is None:
+            writer = await run_in_threadpool(blob_store.writer)
+        await run_in_threadpool(writer.write, bytes(pending))
+        pending.clear()
+
+    def detect():
+        nonlocal detected_type
+        detected_type = sniff(bytes(pending[:SNIFF_BYTES]))
+        if detected_type is None:
+            raise HTTPException(status_code=400, detail="File content does not match any supported format")
+
+    try:
+        async for chunk in request.stream():
+            parser.write(chunk)
+            for event, value in events:
+                if event == "headers":
+                    _, options = parse_options_header(value.get(b"content-disposition", b""))
+                    name = options.get(b"name", b"").decode("utf-8", errors="replace")
+                    if name == file_field and b"filename" in options:
+                        if file_info is not None:
+                            raise HTTPException(status_code=400, detail="Only one file can be uploaded")
+                        part_type = value.get(b"content-type", b"").decode("latin-1")
+                        if part_type not in allowed_types:
+                            raise HTTPException(
+                                status_code=400,
+                                detail=f"Invalid file type. Allowed types: {', '.join(allowed_types)}"
+                            )
+                        file_info = (options[b"filename"].decode("utf-8", errors="replace"), part_type)
+                        in_file, part = True, None
+                    else:
+                        in_file, part = False, name
+                        fields[name] = bytearray()
+                elif event == "data" and in_file:
+                    size += len(value)
+                    if size > max_bytes:
+                        raise too_large(max_bytes)
+                    pending += value
+                    if detected_type is None and len(pending) >= SNIFF_BYTES:
+                        detect()
+                    if len(pending) >= UPLOAD_CHUNK_BYTES:
+                        await flush()
+                elif event == "data":
+                    fields[part] += value
+                    if len(fields[part]) > MAX_FORM_FIELD_BYTES:
+                        raise HTTPException(status_code=400, detail=f"Form field '{part}' is too long")
+                elif event == "end" and in_file:
+                    if detected_type is None:
+                        detect()
+                    await flush()
+                    in_file = False
+            events.clear()
+        parser.finalize()
+
+        if writer is None:
+            raise HTTPException(status_code=400, detail=f"No file uploaded in field '{file_field}'")
+        # Committed before the caller inserts its row; if that insert fails the blob is left unreferenced
+        # until `jobs.migrate_blobs --sweep-orphans` removes it
+        blob_hash, blob_size = await run_in_threadpool(writer.commit)
+    except BaseException as e:
+        if writer is not None:
+            writer.abort()
+        if isinstance(e, FormParserError):
+            raise HTTPException(status_code=400, detail="Invalid multipart data") from e
+        raise
+
+    return StoredUpload(blob_hash, blob_size, file_info[0], file_info[1], detected_type,
+                        {name: value.decode("utf-8", errors="replace") for name, value in fields.items()})
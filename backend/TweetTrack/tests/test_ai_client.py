@@ -0,0 +1,77 @@
+import asyncio
+import json
+
+import pytest
+
+from inference.ai_client import AIClient, AIConnectionPool, AIServiceError
+from inference.protocol import ERROR, HEADER, MAGIC, RESPONSE, VERSION, encode_frame, read_frame
+
+
+async def serve(handler):
+    # A fake AI service answering each request frame with handler(metadata) -> list of frame parts
+    async def on_connection(reader, writer):
+        try:
+            while True:
+                message_type, request_id, metadata, payload = await read_frame(reader)
+                writer.writelines(handler(request_id, metadata))
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            writer.close()
+
+    server = await asyncio.start_server(on_connection, "127.0.0.1", 0)
+    return server, server.sockets[0].getsockname()[1]
+
+
+def ready_reply(request_id, ready=True):
+    return encode_frame(RESPONSE, request_id, {}, json.dumps({"ready": ready}).encode())
+
+
+def test_corrupt_metadata_fails_pending_requests_at_once():
+    async def scenario():
+        def handler(request_id, metadata):
+            corrupt = b"\xff\xfe not json"
+            return [HEADER.pack(MAGIC, VERSION, RESPONSE, request_id, len(corrupt), 0), corrupt]
+
+        server, port = await serve(handler)
+        pool = AIConnectionPool("127.0.0.1", port, request_timeout=10)
+        try:
+            with pytest.raises(AIServiceError, match="lost"):
+                await asyncio.wait_for(pool.request({"op": "model_info"}), 2)
+            assert all(connection.closed for connection in pool.connections)
+        finally:
+            await pool.close()
+            server.close()
+
+    asyncio.run(scenario())
+
+
+def test_restarted_service_is_waited_for_again():
+    async def scenario():
+        seen = []
+
+        def handler(request_id, metadata):
+            seen.append(metadata["op"])
+            if metadata["op"] == "ready":
+                return ready_reply(request_id)
+            if seen.count("classify") == 1:
+                # Restarted between the readiness check and this request
+                return encode_frame(ERROR, request_id, {"status": "error", "error": "AI service is still starting up"})
+            return encode_frame(RESPONSE, request_id, {}, b'{"species": []}')
+
+        server, port = await serve(handler)
+        client = AIClient(AIConnectionPool("127.0.0.1", port, request_timeout=10))
+        try:
+            assert await client.classify(b"audio") == {"species": []}
+            assert seen == ["ready", "classify", "ready", "classify"]
+            assert client.ready
+
+            # A broken connection also sends the next classification through the readiness check
+            client.pool.connections[0]._fail(ConnectionResetError())
+            assert not client.ready
+            await client.classify(b"audio")
+            assert seen[-2:] == ["ready", "classify"]
+        finally:
+            await client.close()
+            server.close()
+
+    asyncio.run(scenario())
@@ -0,0 +1,26 @@
+import numpy as np
+from scipy import signal
+
+from inference.streaming import ClassificationStream
+
+
+def test_chunked_48k_stream_matches_resampling_in_one_call():
+    rate = 48000
+    seconds = np.arange(3 * rate) / rate
+    sine = (0.5 * np.sin(2 * np.pi * 1000 * seconds)).astype("<f4")
+
+    stream = ClassificationStream(sample_rate=rate, dtype="<f4")
+    data = sine.tobytes()
+    rng = np.random.default_rng(0)
+    position = 0
+    while position < len(data):
+        # Odd sizes split samples across chunks too
+        size = int(rng.integers(1, 4000))
+        stream.feed(data[position:position + size])
+        position += size
+    stream.finish()
+
+    expected = signal.resample_poly(sine, 2, 3)
+    assert stream.buffer.total_written == len(expected) == 2 * rate
+    assert stream.seconds_received == 3.0
+    np.testing.assert_allclose(stream.buffer.latest(len(expected)), expected, atol=1e-5)